@@ -1,14 +1,34 @@
-from flask import Flask, request, jsonify
+import time
+BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
 import os
 import re
-from typing import List, Dict, Any
-import time
-import requests
-import google.generativeai as genai
+import json
+import threading
+import functools
+import numpy as np
+from typing import List, Dict, Any, Union
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+# faiss, sentence_transformers (torch) and google.generativeai are imported lazily
+from startup import LazyResource, WARMUP_MODE, record_timing, startup_timings
+from http_client import http_client
+from cache import TTLCache, normalize_text
+from onnx_emotion import OnnxEmotionClassifier
+from batching import MicroBatcher
+from index_store import DATA_DIR, LiveIndex, available_shards, index_paths, search_snapshot, shard_dir
+from semantic_cache import SemanticCache
+from bm25 import BM25Index
+from retrieval_server import RETRIEVAL_SOCKET, RetrievalClient
+from fusion import dedupe_by_prefix, reciprocal_rank_fusion, weighted_mean
+from routing import Route, RetrievalDecision, retrieval_decision, route_message
+from metrics import REGISTRY, Counter, Gauge, LabeledHistogram, Trace
+from resilience import CircuitOpen, DeepCheck, hedged_call, upstream, upstream_snapshot
+from rate_limiter import (GEMINI_QUEUE_MAX_WAIT, GeminiRateLimiter, RateLimited, estimate_tokens,
+                          PRIORITY_BATCH, PRIORITY_CRISIS, PRIORITY_NORMAL)
+from language import identify_language, identify_languages
+from recommendations import RecommendationEngine
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -19,182 +39,782 @@ CORS(app, resources={
     }
 })
 
+# Per-stage latency, fallbacks and upstream errors, exported at /metrics
+STAGE_SECONDS = LabeledHistogram("chat_stage_seconds", ["stage"], help="Chat pipeline stage latency in seconds")
+REQUEST_SECONDS = LabeledHistogram("chat_request_seconds", ["endpoint", "response_type"],
+                                   help="End-to-end chat request latency in seconds")
+FALLBACKS = Counter("chat_fallbacks_total", ["stage", "cause"], help="Stages that fell back to a default result")
+UPSTREAM_ERRORS = Counter("upstream_errors_total", ["upstream", "cause"], help="Errors from models and remote APIs")
+# Always include per-stage `debug_timings` in chat responses (else only on request)
+CHAT_DEBUG_TIMINGS = os.environ.get("CHAT_DEBUG_TIMINGS", "0") == "1"
+
 # Google Gemini API configuration (load from environment variable)
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     print("⚠️ WARNING: GEMINI_API_KEY not set in environment variables!")
-    genai.configure(api_key="dummy_key")  # Placeholder to prevent crashes
-    gemini_model = None
-else:
+
+def load_gemini():
+    """Import and configure the Gemini SDK; returns (genai module, model or None)."""
+    import google.generativeai as genai
+    if not GEMINI_API_KEY:
+        genai.configure(api_key="dummy_key")  # Placeholder to prevent crashes
+        return genai, None
     genai.configure(api_key=GEMINI_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-2.0-flash')
     print("✓ Gemini API configured")
+    return genai, genai.GenerativeModel('gemini-2.0-flash')
+
+gemini = LazyResource("gemini", load_gemini)
 
-# Configure emotion detection to use Hugging Face Inference API (no local model load)
-print("Configuring emotion detection (Hugging Face Inference API)...")
+# Configure emotion detection backend:
+#   "hf_api" - Hugging Face Inference API (default, no local model load)
+#   "onnx"   - local int8 ONNX model (see onnx_emotion.py), HF API as fallback
+#   "none"   - always neutral
+EMOTION_BACKEND = os.environ.get("EMOTION_BACKEND", "hf_api").lower()
+print(f"Configuring emotion detection (backend: {EMOTION_BACKEND})...")
 HF_MODEL = os.environ.get("HF_MODEL", "zainabkhan9118/RomanUrduEmotions")
 HF_TOKEN = os.environ.get("HF_TOKEN")
+# Upper bound for an HF call; the actual timeout adapts to observed latency (resilience.py)
+HF_TIMEOUT = float(os.environ.get("HF_TIMEOUT_SECONDS", "30"))
 if HF_TOKEN:
     print(f"✓ Using Hugging Face model: {HF_MODEL} (via Inference API)")
-else:
+elif EMOTION_BACKEND == "hf_api":
     print("⚠️ HF_TOKEN not set. Inference API will be disabled; detect_emotions will return neutral.")
 
+ONNX_EMOTION_MODEL_DIR = os.environ.get("ONNX_EMOTION_MODEL_DIR", "models/emotion-onnx")
+# Loaded lazily on the first classified message
+onnx_classifier = OnnxEmotionClassifier(ONNX_EMOTION_MODEL_DIR) if EMOTION_BACKEND == "onnx" else None
+# Concurrent messages share one batched ONNX forward pass
+emotion_batcher = MicroBatcher("emotion", lambda texts: onnx_classifier.classify(texts))
+
+# Embedding models by name: shards built with the same model share one instance
+_embedding_models: Dict[str, Any] = {}
+_embedding_models_lock = threading.Lock()
+
+def load_embedding_model(name: str):
+    with _embedding_models_lock:
+        if name not in _embedding_models:
+            from sentence_transformers import SentenceTransformer
+            _embedding_models[name] = SentenceTransformer(name)
+        return _embedding_models[name]
+
+# Out-of-process retrieval (see retrieval_server.py): with RETRIEVAL_SOCKET set, this
+# worker loads neither the embedding model nor the default index and asks the server
+retrieval_client = RetrievalClient(RETRIEVAL_SOCKET) if RETRIEVAL_SOCKET else None
+
+def call_retrieval_server(fn, *args, default=None):
+    """fn(*args) against the retrieval server, behind its circuit breaker; `default` on failure."""
+    status = upstream("retrieval_server")
+    if not status.allow():
+        return default
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+    except Exception as e:
+        print(f"Retrieval server error: {e}")
+        UPSTREAM_ERRORS.inc("retrieval_server", type(e).__name__)
+        status.failure(e)
+        return default
+    status.success(time.perf_counter() - started)
+    return result
+
 # Load FAISS index and documents (optional - graceful fallback if not present)
-def load_resources():
-    index = None
-    documents = []
+def load_resources(data_dir: str = DATA_DIR, label: str = ""):
+    if retrieval_client is not None and data_dir == DATA_DIR:
+        print(f"✓ Retrieval served by {RETRIEVAL_SOCKET} (no model or index loaded in this worker)")
+        return LiveIndex(data_dir), None
+
+    # LiveIndex hot-swaps to a new version published by `build_index.py --incremental`
+    live_index = LiveIndex(data_dir)
     model = None
+    paths = index_paths(data_dir)
     
-    if os.path.exists("data/mind_index.faiss") and os.path.exists("data/mind_docs.txt"):
+    if os.path.exists(paths["index"]) and os.path.exists(paths["docs"]):
         try:
-            index = faiss.read_index("data/mind_index.faiss")
-            with open("data/mind_docs.txt", "r") as f:
-                documents = [line.strip() for line in f.readlines()]
-            model = SentenceTransformer("all-MiniLM-L6-v2")
-            print(f"✓ FAISS index loaded with {len(documents)} documents")
+            # Index type (flat / IVF / HNSW) and its search params come from the sidecar
+            started = time.perf_counter()
+            snapshot = live_index.load()
+            record_timing(f"faiss_index{label}", started)
+            started = time.perf_counter()
+            model = load_embedding_model(snapshot.meta["model"])
+            record_timing(f"embedding_model{label}", started)
+            print(f"✓ FAISS {snapshot.meta['index_type']} index{label} loaded with {len(snapshot.documents)} documents")
         except Exception as e:
-            print(f"⚠️ Failed to load FAISS resources: {e}")
+            print(f"⚠️ Failed to load FAISS resources{label}: {e}")
             print("   RAG functionality will be disabled, but app will continue.")
     else:
         print("⚠️ FAISS index not found. RAG functionality disabled (app will use Gemini without RAG context).")
     
-    return index, documents, model
+    return live_index, model
+
+# (live_index, SentenceTransformer or None), loaded on first use / warm-up
+retrieval = LazyResource("retrieval", load_resources)
+
+# Per-language shards built with `build_index.py --language` (data/shards/<language>/).
+# Each loads on the first message in its language, so a worker that only sees
+# English never holds the multilingual model.
+SHARDED_RETRIEVAL = os.environ.get("SHARDED_RETRIEVAL", "1") == "1"
+shards = {
+    language: LazyResource(f"retrieval_{language}", functools.partial(load_resources, shard_dir(language), f" [{language}]"))
+    for language in (available_shards(DATA_DIR) if SHARDED_RETRIEVAL else [])
+}
+if shards:
+    print(f"✓ Retrieval shards found: {', '.join(shards)} (loaded on first use)")
+
+def retrieval_source(shard: str = None) -> LazyResource:
+    return shards[shard] if shard else retrieval
 
-index, documents, model = load_resources()
+def ready_shard(language: str):
+    """`language` if its shard is loaded with a model; None (and a background load) otherwise."""
+    if language not in shards:
+        return None
+    loaded = shards[language].get(wait=False)
+    return language if loaded is not None and loaded[1] is not None else None
 
-def search_faiss(query: str, k: int = 3) -> List[str]:
-    """Search FAISS for relevant mental health techniques (returns empty list if FAISS not available)."""
-    if index is None or model is None or not documents:
+# Caches in front of the two per-message model calls (sizes/TTLs configurable via env)
+emotion_cache = TTLCache.from_env("emotion", "EMOTION", max_entries=2048, ttl=6 * 3600)
+retrieval_cache = TTLCache.from_env("retrieval", "RETRIEVAL", max_entries=1024, ttl=3600)
+# MiniLM query embeddings, computed once per distinct text and shared by FAISS,
+# the semantic cache and the batch endpoint
+embedding_cache = TTLCache.from_env("embedding", "EMBEDDING", max_entries=2048, ttl=3600, max_bytes=16 * 1024 * 1024)
+
+# Gemini replies reused for paraphrased prompts (same language + emotion)
+semantic_cache = SemanticCache()
+# How long a semantic-cache lookup waits for the emotion stage before giving up
+SEMANTIC_CACHE_EMOTION_WAIT = float(os.environ.get("SEMANTIC_CACHE_EMOTION_WAIT", "0.25"))
+
+# Concurrent requests share one batched MiniLM encode (see batching.py)
+embedding_batcher = MicroBatcher(
+    "embedding",
+    lambda texts: retrieval.get()[1].encode(texts, convert_to_tensor=False)
+)
+shard_batchers = {
+    language: MicroBatcher(f"embedding_{language}",
+                           lambda texts, r=resource: r.get()[1].encode(texts, convert_to_tensor=False))
+    for language, resource in shards.items()
+}
+
+def embed_batch(texts: List[str], wait: bool = True, shard: str = None) -> List[Any]:
+    """MiniLM embeddings for several texts; only cache misses are encoded, and they
+    go to the micro-batcher together so they share one forward pass.
+
+    `shard` encodes with that language shard's model instead. Nones while the
+    model is not loaded (`wait=False`) or unavailable.
+    """
+    remote = retrieval_client is not None and shard is None
+    loaded = None if remote else retrieval_source(shard).get(wait=wait)
+    if not texts or (not remote and (loaded is None or loaded[1] is None)):
+        return [None] * len(texts)
+    batcher = shard_batchers[shard] if shard else embedding_batcher
+    # Each model embeds into its own space, so entries are keyed by model
+    if remote:
+        model_name = f"remote:{RETRIEVAL_SOCKET}"
+    else:
+        snapshot = loaded[0].current()
+        model_name = snapshot.meta.get("model") if snapshot else shard
+    keys = [(model_name, normalize_text(text)) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    missing = {key: text for key, text, embedding in zip(keys, texts, embeddings) if embedding is None}
+    if missing:
+        computed = {}
+        if remote:
+            # One pipelined request; the server batches it with other workers' encodes
+            vectors = call_retrieval_server(retrieval_client.embed, list(missing.values()))
+            if vectors is not None:
+                computed = {key: np.array(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+        else:
+            futures = {key: batcher.submit(text) for key, text in missing.items()}
+            for key, future in futures.items():
+                try:
+                    computed[key] = np.array(future.result(), dtype=np.float32)
+                except Exception as e:
+                    print(f"Embedding error: {e}")
+                    UPSTREAM_ERRORS.inc("embedding", type(e).__name__)
+        for key, embedding in computed.items():
+            embedding_cache.set(key, embedding)
+        embeddings = [embedding if embedding is not None else computed.get(key)
+                      for key, embedding in zip(keys, embeddings)]
+    return embeddings
+
+def search_faiss(query: str, k: int = 3, embedding=None, shard: str = None) -> List[str]:
+    """Search FAISS for relevant mental health techniques (returns empty list if FAISS not available).
+
+    Pass `embedding` when the query was already encoded to skip a second encode,
+    and `shard` to search a language shard (with an embedding from its model).
+    """
+    if retrieval_client is not None and shard is None:
+        return search_remote(query, k, embedding)
+    # Never block a chat on a cold start: skip RAG until the warm-up has finished
+    loaded = retrieval_source(shard).get(wait=False)
+    if loaded is None:
+        return []
+    live_index, model = loaded
+    snapshot = live_index.current()
+    if snapshot is None or model is None or not snapshot.documents:
         return []
     
+    # Keyed on the index version so a hot-swap never serves stale documents
+    cache_key = (normalize_text(query), k, snapshot.version, shard)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    
     try:
-        query_embedding = model.encode([query], convert_to_tensor=False)
-        distances, indices = index.search(np.array(query_embedding), k)
-        
-        results = []
-        for idx in indices[0]:
-            if idx < len(documents):
-                results.append(documents[idx])
-        return results[:k]
+        query_embedding = embedding if embedding is not None else (shard_batchers[shard] if shard else embedding_batcher)(query)
+        results = search_snapshot(snapshot, query_embedding, k)
+        retrieval_cache.set(cache_key, tuple(results))
+        return results
     except Exception as e:
         print(f"FAISS search error: {e}")
+        UPSTREAM_ERRORS.inc("faiss", type(e).__name__)
+        return []
+
+def search_remote(query: str, k: int, embedding=None) -> List[str]:
+    """search_faiss through the retrieval server (the server encodes when `embedding` is None)."""
+    cache_key = (normalize_text(query), k, retrieval_client.index_version, None)
+    cached = retrieval_cache.get(cache_key)
+    if cached is not None:
+        return list(cached)
+    results = call_retrieval_server(retrieval_client.search, query, k, embedding)
+    if results is None:
         return []
+    retrieval_cache.set((normalize_text(query), k, retrieval_client.index_version, None), tuple(results))
+    return results
+
+# "0" retrieves for every message, as before retrieval gating
+RAG_GATING = os.environ.get("RAG_GATING", "1") == "1"
+RETRIEVAL_GATE = Counter("retrieval_gate_total", ["decision", "reason"], help="Retrieval gating decisions")
+
+# Conversation-window retrieval: "mean" searches once with the weighted mean of the
+# turn embeddings, "rrf" searches per turn and fuses the rankings, "off" uses the
+# current message only
+RAG_CONTEXT_MODE = os.environ.get("RAG_CONTEXT_MODE", "mean").lower()
+RAG_CONTEXT_TURNS = int(os.environ.get("RAG_CONTEXT_TURNS", "4"))
+# Weight of a turn n messages back: RAG_CONTEXT_DECAY ** n (halved for Emma's turns)
+RAG_CONTEXT_DECAY = float(os.environ.get("RAG_CONTEXT_DECAY", "0.5"))
+
+def context_window(message: str, conversation_history) -> List[tuple]:
+    """(text, weight) for the current message and the recent turns, newest first."""
+    window = [(message, 1.0)]
+    if RAG_CONTEXT_MODE == "off" or not conversation_history or RAG_CONTEXT_TURNS <= 0:
+        return window
+    for distance, msg in enumerate(reversed(conversation_history[-RAG_CONTEXT_TURNS:]), start=1):
+        content = msg.get("content") if isinstance(msg, dict) else None
+        if not isinstance(content, str) or not content.strip():
+            continue
+        weight = RAG_CONTEXT_DECAY ** distance * (1.0 if msg.get("role") == "user" else 0.5)
+        window.append((content.strip(), weight))
+    return window
+
+def retrieval_gate(message: str, route: Route, conversation_history=None) -> RetrievalDecision:
+    if not RAG_GATING:
+        decision = RetrievalDecision(True, "gating_disabled")
+    else:
+        context = [text for text, _ in context_window(message, conversation_history)[1:]]
+        decision = retrieval_decision(message, route, context)
+    RETRIEVAL_GATE.inc("retrieve" if decision.retrieve else "skip", decision.reason)
+    return decision
+
+# Hybrid retrieval (see bm25.py): "hybrid" fuses FAISS with BM25 over the same
+# documents, "dense" is FAISS only, "sparse" is BM25 only (no MiniLM encode)
+RAG_RETRIEVER = os.environ.get("RAG_RETRIEVER", "hybrid").lower()
+# MiniLM is English-only: messages in these languages use BM25 alone and skip the encode
+RAG_SPARSE_LANGUAGES = {lang.strip() for lang in os.environ.get("RAG_SPARSE_LANGUAGES", "hinglish,urdu").split(",")
+                        if lang.strip()}
+RETRIEVAL_PATH = Counter("retrieval_path_total", ["path", "shard"],
+                         help="Retrieval requests by path (dense, sparse, hybrid) and index shard")
+
+_sparse_lock = threading.Lock()
+# shard (None = default index) -> (snapshot version, BM25Index)
+_sparse_indexes: Dict[Any, tuple] = {}
+
+def sparse_index(shard: str = None):
+    """(BM25Index, documents) for the current FAISS snapshot, rebuilt when a new version is published."""
+    loaded = retrieval_source(shard).get(wait=False)
+    snapshot = loaded[0].current() if loaded else None
+    if snapshot is None or not snapshot.documents:
+        return None, None
+    version, index = _sparse_indexes.get(shard, (None, None))
+    if version != snapshot.version or index is None:
+        with _sparse_lock:
+            version, index = _sparse_indexes.get(shard, (None, None))
+            if version != snapshot.version or index is None:
+                started = time.perf_counter()
+                index = BM25Index(snapshot.documents)
+                _sparse_indexes[shard] = (snapshot.version, index)
+                print(f"✓ BM25 index built for {shard or 'default'} version {snapshot.version} "
+                      f"({index.vocabulary_size} terms, {time.perf_counter() - started:.3f}s)")
+    return index, snapshot.documents
+
+def uses_dense_retrieval(language: str) -> bool:
+    return RAG_RETRIEVER == "dense" or (RAG_RETRIEVER == "hybrid" and language not in RAG_SPARSE_LANGUAGES)
+
+def search_sparse(window: List[tuple], k: int, language: str, shard: str = None) -> List[str]:
+    """BM25 over the conversation window; per-turn rankings fused like the dense "rrf" mode."""
+    roman_urdu = language == "hinglish"
+    if retrieval_client is not None and shard is None:
+        ranked = call_retrieval_server(retrieval_client.sparse_many, [text for text, _ in window], k, roman_urdu)
+        if ranked is None:
+            return []
+        return dedupe_by_prefix(reciprocal_rank_fusion(list(zip((w for _, w in window), ranked)), limit=k))
+    index, documents = sparse_index(shard)
+    if index is None:
+        return []
+    rankings = [(weight, [documents[hit.doc_id] for hit in index.search(text, k, roman_urdu)]) for text, weight in window]
+    return dedupe_by_prefix(reciprocal_rank_fusion(rankings, limit=k))
+
+def retrieve_context(message: str, k: int = 2, decision: RetrievalDecision = None, conversation_history=None,
+                     language: str = None):
+    """Retrieval stage: (documents, query embedding of the message itself).
+
+    Gated-out messages skip both the encode and the search. Otherwise every turn
+    in the conversation window is embedded once (cached by text, so earlier turns
+    are never re-encoded) and combined per RAG_CONTEXT_MODE. With RAG_RETRIEVER
+    "hybrid" the FAISS ranking is fused with BM25.
+
+    A message in a language with its own shard searches that shard with the
+    shard's model. Without one (or while it loads), Urdu and Roman Urdu messages
+    use BM25 alone over the default documents and return no embedding.
+    """
+    if decision is not None and not decision.retrieve:
+        return [], None
+    language = language or identify_language(message).language
+    shard = ready_shard(language)
+    window = context_window(message, conversation_history)
+    if shard is None and not uses_dense_retrieval(language):
+        RETRIEVAL_PATH.inc("sparse", "default")
+        return search_sparse(window, k, language), None
+    
+    embeddings = embed_batch([text for text, _ in window], wait=False, shard=shard)
+    message_embedding = embeddings[0]
+    turns = [(text, weight, embedding) for (text, weight), embedding in zip(window, embeddings) if embedding is not None]
+    # Fusion needs candidates beyond the top k from each side
+    fetch = k * 2 if RAG_RETRIEVER == "hybrid" else k
+    if message_embedding is None or len(turns) == 1:
+        dense = search_faiss(message, k=fetch, embedding=message_embedding, shard=shard)
+    elif RAG_CONTEXT_MODE == "rrf":
+        # Per-turn searches hit the retrieval cache for every turn seen before
+        rankings = [(weight, search_faiss(text, k=k * 2, embedding=embedding, shard=shard))
+                    for text, weight, embedding in turns]
+        dense = reciprocal_rank_fusion(rankings, limit=fetch)
+    else:
+        combined = weighted_mean([embedding for _, _, embedding in turns], [weight for _, weight, _ in turns])
+        window_key = "\n".join(text for text, _, _ in turns)
+        dense = search_faiss(window_key, k=fetch, embedding=combined, shard=shard)
+    if RAG_RETRIEVER != "hybrid":
+        RETRIEVAL_PATH.inc("dense", shard or "default")
+        return dense[:k], message_embedding
+    
+    sparse = search_sparse(window, fetch, language, shard)
+    RETRIEVAL_PATH.inc("hybrid" if dense and sparse else "sparse" if sparse else "dense", shard or "default")
+    return dedupe_by_prefix(reciprocal_rank_fusion([(1.0, dense), (1.0, sparse)], limit=k * 2))[:k], message_embedding
+
+def semantic_scope(language: str, sentiment: Dict[str, Any]):
+    emotions = sentiment.get("emotions") or []
+    return (language, emotions[0].lower() if emotions else sentiment.get("sentiment", "neutral"))
+
+def semantic_cacheable(conversation_history, route: Route) -> bool:
+    """Whether this turn's reply may be looked up in / shared through the semantic cache.
+
+    The cache is shared by every user, and a prompt with history carries that
+    user's recent turns, so only opening messages qualify. Crisis messages
+    always get a fresh reply.
+    """
+    return semantic_cache.enabled and not conversation_history and route.intent != "crisis"
 
 # ============================================================================
 # EMOTION DETECTION (Simple and Clean)
 # ============================================================================
 
-def call_hf_inference(text: str, timeout: int = 30):
-    """Call the Hugging Face Inference API and return the parsed JSON result."""
+# Backup requests for HEDGE_UPSTREAMS (see resilience.hedged_call)
+hedge_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+
+def hf_request(text: Union[str, List[str]], timeout: float = None):
+    """(status, url, headers, payload, timeout) for an HF Inference API call.
+
+    Raises CircuitOpen while the HF breaker is open (shared with asgi.py).
+    """
     if not HF_TOKEN:
         raise RuntimeError("HF_TOKEN not set")
+    status = upstream("hf_api")
+    if not status.allow():
+        raise CircuitOpen("HF Inference API circuit is open")
     url = f"https://api-inference.huggingface.co/models/{HF_MODEL}"
     headers = {"Authorization": f"Bearer {HF_TOKEN}"}
     payload = {"inputs": text, "options": {"wait_for_model": True}}
-    resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
-    resp.raise_for_status()
-    return resp.json()
+    return status, url, headers, payload, timeout or status.timeout(HF_TIMEOUT)
+
+def call_hf_inference(text: Union[str, List[str]], timeout: float = None):
+    """Call the Hugging Face Inference API and return the parsed JSON result.
+
+    `text` may be a list of messages, classified in one request. Raises
+    CircuitOpen without calling out while the HF breaker is open.
+    """
+    status, url, headers, payload, timeout = hf_request(text, timeout)
+    
+    def post():
+        resp = http_client.post(url, headers=headers, json=payload, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+    
+    started = time.perf_counter()
+    try:
+        if status.hedge:
+            result = hedged_call(hedge_executor, status.latency.percentile(0.95), post)
+        else:
+            result = post()
+    except Exception as e:
+        status.failure(e)
+        raise
+    status.success(time.perf_counter() - started)
+    return result
+
+
+def hf_scores(resp) -> List[Dict[str, Any]]:
+    """Flat [{label, score}, ...] list from an HF Inference API response for one input."""
+    if isinstance(resp, dict) and resp.get("error"):
+        raise RuntimeError(resp["error"])
+    # A single input usually comes back nested: [[{"label":..., "score":...}, ...]]
+    results = resp if isinstance(resp, list) else []
+    if results and isinstance(results[0], list):
+        results = results[0]
+    return results
+
+
+def hf_emotion_scores(text: str) -> List[Dict[str, Any]]:
+    """Label scores from the HF Inference API as a flat [{label, score}, ...] list."""
+    return hf_scores(call_hf_inference(text))
+
+
+def hf_emotion_scores_batch(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """Label scores for several messages from one HF Inference API request."""
+    resp = call_hf_inference(texts)
+    if isinstance(resp, dict) and resp.get("error"):
+        raise RuntimeError(resp["error"])
+    if not isinstance(resp, list) or len(resp) != len(texts):
+        raise RuntimeError(f"HF API returned {len(resp) if isinstance(resp, list) else 'no'} results for {len(texts)} inputs")
+    return resp
+
+
+def emotion_scores(text: str) -> List[Dict[str, Any]]:
+    """Label scores from the configured backend (ONNX first when enabled, then HF API)."""
+    if onnx_classifier is not None and onnx_classifier.available:
+        return emotion_batcher(text)
+    if HF_TOKEN:
+        return hf_emotion_scores(text)
+    return []
+
+
+def sentiment_from_scores(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Map classifier label scores to {sentiment, emotions, confidence}."""
+    if not results:
+        return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+
+    sorted_emotions = sorted(results, key=lambda x: x.get("score", 0), reverse=True)
+    top = sorted_emotions[0]
+    top_emotion = top.get("label", "")
+    top_score = float(top.get("score", 0.0))
+
+    le = top_emotion.lower()
+    if any(k in le for k in ["sad", "anger", "fear"]):
+        sentiment = "negative"
+    elif any(k in le for k in ["joy", "love", "happy"]):
+        sentiment = "positive"
+    else:
+        sentiment = "neutral"
+
+    return {"sentiment": sentiment, "emotions": [top_emotion], "confidence": round(top_score, 2)}
 
 
 def detect_emotions(text: str) -> Dict[str, Any]:
-    """Detect emotions using HF Inference API (fallback to neutral).
+    """Detect emotions with the configured backend (fallback to neutral).
 
     Returns the same shape as previous implementation: {sentiment, emotions, confidence}
     """
     if len(text.split()) < 3:
         return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
 
-    if HF_TOKEN:
-        try:
-            resp = call_hf_inference(text)
-            # resp is usually a list of dicts like [{"label":..., "score":...}]
-            if isinstance(resp, dict) and resp.get("error"):
-                return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
-
-            results = resp if isinstance(resp, list) else resp[0] if resp else []
-            if not results:
-                return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
-
-            sorted_emotions = sorted(results, key=lambda x: x.get("score", 0), reverse=True)
-            top = sorted_emotions[0]
-            top_emotion = top.get("label", "")
-            top_score = float(top.get("score", 0.0))
-
-            le = top_emotion.lower()
-            if any(k in le for k in ["sad", "anger", "fear"]):
-                sentiment = "negative"
-            elif any(k in le for k in ["joy", "love", "happy"]):
-                sentiment = "positive"
-            else:
-                sentiment = "neutral"
-
-            return {"sentiment": sentiment, "emotions": [top_emotion], "confidence": round(top_score, 2)}
-        except Exception as e:
-            print("HF inference error:", e)
-            return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+    if EMOTION_BACKEND == "none":
+        return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+
+    cache_key = normalize_text(text)
+    cached = emotion_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        results = emotion_scores(text)
+    except CircuitOpen:
+        FALLBACKS.inc("emotion", "circuit_open")
+        return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+    except Exception as e:
+        print(f"Emotion detection error ({EMOTION_BACKEND}):", e)
+        UPSTREAM_ERRORS.inc(EMOTION_BACKEND, type(e).__name__)
+        FALLBACKS.inc("emotion", "error")
+        return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+
+    if not results:
+        # No backend available (no ONNX model, no HF_TOKEN)
+        return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+
+    result = sentiment_from_scores(results)
+    # Only real classifications are cached, never the neutral fallbacks
+    emotion_cache.set(cache_key, result)
+    return result
+
 
-    # No HF_TOKEN configured: return neutral to avoid loading local model on Render
-    return {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+def detect_emotions_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    """detect_emotions for many messages: cache hits first, then one classifier
+    call (ONNX forward pass or HF API request) for all distinct misses."""
+    results: List[Dict[str, Any]] = [dict(NEUTRAL_SENTIMENT) for _ in texts]
+    if EMOTION_BACKEND == "none":
+        return results
+
+    pending: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        if len(text.split()) < 3:
+            continue
+        cache_key = normalize_text(text)
+        cached = emotion_cache.get(cache_key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(cache_key, []).append(i)
+    if not pending:
+        return results
+
+    keys = list(pending)
+    batch = [texts[pending[key][0]] for key in keys]
+    try:
+        if onnx_classifier is not None and onnx_classifier.available:
+            scores = onnx_classifier.classify(batch)
+        elif HF_TOKEN:
+            scores = hf_emotion_scores_batch(batch)
+        else:
+            return results
+    except CircuitOpen:
+        FALLBACKS.inc("emotion", "circuit_open", amount=len(keys))
+        return results
+    except Exception as e:
+        print(f"Batch emotion detection error ({EMOTION_BACKEND}):", e)
+        UPSTREAM_ERRORS.inc(EMOTION_BACKEND, type(e).__name__)
+        FALLBACKS.inc("emotion", "error", amount=len(keys))
+        return results
+
+    for key, item_scores in zip(keys, scores):
+        if not item_scores:
+            continue
+        result = sentiment_from_scores(item_scores)
+        emotion_cache.set(key, result)
+        for i in pending[key]:
+            results[i] = result
+    return results
 
 # ============================================================================
 # LANGUAGE DETECTION
 # ============================================================================
 
 def detect_language(text: str) -> str:
-    """Detect if user is speaking Urdu/Hinglish or English."""
-    # Check for Urdu/Hindi script
-    urdu_chars = sum(1 for char in text if '\u0600' <= char <= '\u06FF' or '\u0900' <= char <= '\u097F')
-    
-    # Check for Hinglish words
-    hinglish_words = ['yaar', 'yr', 'hai', 'kya', 'acha', 'theek', 'dekho', 'suno', 'mujhe', 'tumhe']
-    has_hinglish = any(word in text.lower() for word in hinglish_words)
-    
-    if urdu_chars > len(text) * 0.3:
-        return "urdu"
-    elif has_hinglish or urdu_chars > 0:
-        return "hinglish"
-    else:
-        return "english"
+    """Detect if user is speaking Urdu/Hinglish or English (see language.py)."""
+    return identify_language(text).language
 
 # ============================================================================
 # GEMINI API
 # ============================================================================
 
-def query_gemini(prompt: str, system_prompt: str, max_tokens: int = 200) -> str:
-    """Query Gemini API."""
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+# 15 RPM / 1M TPM / 200 RPD shared by all workers on the host (see rate_limiter.py)
+gemini_limiter = GeminiRateLimiter()
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return type(error).__name__ == "ResourceExhausted" or "429" in str(error)
+
+def gemini_admit(prompt: str, system_prompt: str, max_tokens: int, timeout: float = None,
+                 priority: int = PRIORITY_NORMAL, trace: Trace = None):
+    """Breaker check and quota queue in front of a Gemini call (shared with asgi.py).
+
+    Returns (model, full prompt, generate_content keyword arguments), or None
+    if Gemini is unavailable. Raises CircuitOpen while the Gemini breaker is
+    open, and RateLimited when the quota queue cannot send the request in time
+    for an answer within `timeout` (normal priority queues at most
+    GEMINI_QUEUE_MAX_WAIT). The request timeout shrinks to what recent calls
+    needed (resilience.py). The queue wait is recorded as `quota_wait` on `trace`.
+    """
+    genai, gemini_model = gemini.get() or (None, None)
     if not gemini_model:
         print("Gemini model not available (API key not set)")
-        return ""
+        return None
+    status = upstream("gemini")
+    if not status.allow():
+        raise CircuitOpen("Gemini circuit is open")
+    
+    full_prompt = f"{system_prompt}\n\n{prompt}"
     
+    # Queue for quota, leaving room for a typical call to finish before the deadline
+    timeout = timeout or LLM_DEADLINE
+    queued = time.monotonic()
+    wait_budget = max(0.0, timeout - (status.latency.percentile(0.5) or 1.0))
+    if priority == PRIORITY_NORMAL:
+        wait_budget = min(wait_budget, GEMINI_QUEUE_MAX_WAIT)
+    admitted = gemini_limiter.acquire(estimate_tokens(full_prompt, max_tokens), priority, wait_budget)
+    if trace is not None:
+        trace.record("quota_wait", time.monotonic() - queued)
+    if not admitted:
+        status.breaker.release()
+        raise RateLimited("Gemini quota queue could not serve the request before its deadline")
+    timeout = status.timeout(min(LLM_DEADLINE, max(1.0, timeout - (time.monotonic() - queued))))
+    
+    generation_config = genai.types.GenerationConfig(
+        temperature=0.8,
+        max_output_tokens=max_tokens,
+        top_p=0.9,
+    )
+    return gemini_model, full_prompt, {
+        "generation_config": generation_config,
+        "safety_settings": SAFETY_SETTINGS,
+        "request_options": {"timeout": timeout},
+    }
+
+def gemini_request(prompt: str, system_prompt: str, max_tokens: int, timeout: float = None, stream: bool = False,
+                   priority: int = PRIORITY_NORMAL, trace: Trace = None):
+    """Issue a generate_content call with the shared settings (None if Gemini is unavailable).
+
+    Raises CircuitOpen / RateLimited as gemini_admit does.
+    """
+    admitted = gemini_admit(prompt, system_prompt, max_tokens, timeout, priority, trace)
+    if admitted is None:
+        return None
+    gemini_model, full_prompt, options = admitted
+    sent = time.perf_counter()
+    response = gemini_model.generate_content(full_prompt, stream=stream, **options)
+    if not stream:
+        # Call latency only (excludes the quota queue), feeds the adaptive timeout
+        upstream("gemini").latency.observe(time.perf_counter() - sent)
+    return response
+
+def gemini_failed(error: Exception) -> None:
+    UPSTREAM_ERRORS.inc("gemini", type(error).__name__)
+    upstream("gemini").failure(error)
+    if is_rate_limit_error(error):
+        gemini_limiter.penalize()
+
+def query_gemini(prompt: str, system_prompt: str, max_tokens: int = 200, timeout: float = None,
+                 priority: int = PRIORITY_NORMAL, trace: Trace = None) -> str:
+    """Query Gemini API (optionally bounded by a request timeout in seconds)."""
     try:
-        full_prompt = f"{system_prompt}\n\n{prompt}"
-        
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.8,
-            max_output_tokens=max_tokens,
-            top_p=0.9,
-        )
-        
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-        ]
-        
-        response = gemini_model.generate_content(
-            full_prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
-        
-        if response and response.text:
-            return response.text.strip()
+        response = gemini_request(prompt, system_prompt, max_tokens, timeout, priority=priority, trace=trace)
+        if response is None:
+            return ""
+        text = response.text.strip() if response.text else ""
+        upstream("gemini").success()
+        return text
+    except CircuitOpen:
+        # Fail fast: the caller answers with its fallback reply
+        return ""
+    except RateLimited as e:
+        print(f"Gemini request shed: {e}")
+        FALLBACKS.inc("llm", "rate_limited")
         return ""
     except Exception as e:
         print(f"Gemini error: {e}")
+        gemini_failed(e)
         return ""
 
+def query_gemini_stream(prompt: str, system_prompt: str, max_tokens: int = 200, timeout: float = None,
+                        priority: int = PRIORITY_NORMAL, trace: Trace = None):
+    """Yield text chunks as Gemini generates them (yields nothing on error)."""
+    try:
+        response = gemini_request(prompt, system_prompt, max_tokens, timeout, stream=True, priority=priority,
+                                  trace=trace)
+        if response is None:
+            return
+        succeeded = False
+        for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                # Counted at the first chunk (the client may disconnect mid-stream)
+                if not succeeded:
+                    upstream("gemini").success()
+                    succeeded = True
+                yield text
+        if not succeeded:
+            upstream("gemini").success()
+    except CircuitOpen:
+        return
+    except RateLimited as e:
+        print(f"Gemini request shed: {e}")
+        FALLBACKS.inc("llm", "rate_limited")
+    except Exception as e:
+        print(f"Gemini stream error: {e}")
+        gemini_failed(e)
+
+# ============================================================================
+# CONCURRENT CHAT PIPELINE
+# ============================================================================
+
+# "concurrent" fans out emotion detection next to retrieval + Gemini;
+# "sequential" keeps the original one-after-another behaviour.
+CHAT_PIPELINE_MODE = os.environ.get("CHAT_PIPELINE_MODE", "concurrent").lower()
+CHAT_PIPELINE_WORKERS = int(os.environ.get("CHAT_PIPELINE_WORKERS", "8"))
+
+# Per-stage deadlines, in seconds, measured from the start of the request
+EMOTION_DEADLINE = float(os.environ.get("EMOTION_DEADLINE_SECONDS", "3.0"))
+RETRIEVAL_DEADLINE = float(os.environ.get("RETRIEVAL_DEADLINE_SECONDS", "1.0"))
+LLM_DEADLINE = float(os.environ.get("LLM_DEADLINE_SECONDS", "20.0"))
+
+NEUTRAL_SENTIMENT = {"sentiment": "neutral", "emotions": [], "confidence": 0.0}
+
+pipeline_executor = ThreadPoolExecutor(
+    max_workers=CHAT_PIPELINE_WORKERS,
+    thread_name_prefix="chat-stage"
+)
+
+class _CompletedStage:
+    """Future-like wrapper for a stage that already ran inline (sequential mode)."""
+
+    def __init__(self, fn, *args, **kwargs):
+        self._error = None
+        self._value = None
+        try:
+            self._value = fn(*args, **kwargs)
+        except Exception as e:
+            self._error = e
+
+    def result(self, timeout=None):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+def start_stage(fn, *args, **kwargs):
+    """Start a pipeline stage; returns a future-like object."""
+    if CHAT_PIPELINE_MODE == "sequential":
+        return _CompletedStage(fn, *args, **kwargs)
+    return pipeline_executor.submit(fn, *args, **kwargs)
+
+def stage_result(stage, name: str, deadline: float, start_time: float, default, log_timeout: bool = True):
+    """Wait for a stage until its deadline (relative to request start); fall back to default."""
+    remaining = max(0.0, deadline - (time.time() - start_time))
+    try:
+        return stage.result(timeout=remaining)
+    except FutureTimeout:
+        if log_timeout:
+            print(f"{name} stage missed its {deadline}s deadline, using fallback")
+            FALLBACKS.inc(name, "timeout")
+        return default
+    except Exception as e:
+        print(f"{name} stage error: {e}")
+        FALLBACKS.inc(name, "error")
+        return default
+
+def llm_seconds(trace: Trace, started: float) -> float:
+    """Time since `started` minus the Gemini quota queue, which is its own `quota_wait` span."""
+    return max(0.0, time.perf_counter() - started - trace.timings.get("quota_wait", 0.0))
+
 # ============================================================================
 # SIMPLE TEMPLATES (for greetings only)
 # ============================================================================
@@ -212,70 +832,19 @@ GREETING_TEMPLATES = {
     ]
 }
 
-def is_simple_greeting(text: str) -> bool:
-    """Check if it's a simple greeting."""
-    greetings = ['hi', 'hello', 'hey', 'kaise ho', 'kaisay ho', 'kessay ho', 'good morning', 'good evening']
-    text_lower = text.lower().strip()
-    
-    # Must be short and contain a greeting word
-    if len(text.split()) <= 5:
-        return any(greeting in text_lower for greeting in greetings)
-    return False
+def is_simple_greeting(text: str, route: Route = None) -> bool:
+    """Check if it's a simple greeting (short, and not outranked by e.g. a crisis phrase)."""
+    route = route or route_message(text)
+    return route.intent == "greeting"
 
 # ============================================================================
 # MAIN CHAT ENDPOINT
 # ============================================================================
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    """Clean, simple chat endpoint."""
-    start_time = time.time()
-    
-    data = request.json
-    if not data or 'message' not in data:
-        return jsonify({"error": "Message is required"}), 400
-    
-    user_message = data['message'].strip()
-    conversation_history = data.get('conversation_history', [])
-    
-    # Detect language
-    user_language = detect_language(user_message)
-    
-    # Detect emotions
-    sentiment_analysis = detect_emotions(user_message)
-    
-    # LEVEL 1: Simple greetings (use templates)
-    if is_simple_greeting(user_message):
-        import random
-        lang_key = "hinglish" if user_language in ["hinglish", "urdu"] else "english"
-        response = random.choice(GREETING_TEMPLATES[lang_key])
-        
-        return jsonify({
-            "response": response,
-            "sentiment": sentiment_analysis,
-            "processing_time": round(time.time() - start_time, 3),
-            "response_type": "greeting"
-        })
-    
-    # LEVEL 2: Complex queries (use Gemini + RAG)
-    
-    # Build conversation context
-    conversation_context = ""
-    if conversation_history:
-        recent_msgs = conversation_history[-4:]
-        formatted_history = []
-        for msg in recent_msgs:
-            role = "User" if msg.get("role") == "user" else "Emma"
-            formatted_history.append(f"{role}: {msg.get('content')}")
-        conversation_context = "\n".join(formatted_history)
-    
-    # Get RAG context for mental health queries
-    relevant_docs = search_faiss(user_message, k=2)
-    context = "\n".join(relevant_docs) if relevant_docs else ""
-    
-    # Build system prompt based on language
+def build_system_prompt(user_language: str) -> str:
+    """System prompt based on language."""
     if user_language == "hinglish":
-        system_prompt = """You are Emma, a friendly mental wellness companion.
+        return """You are Emma, a friendly mental wellness companion.
 
 LANGUAGE: User speaks Roman Urdu/Hinglish. Reply in Roman Urdu/Hinglish.
 Use words: yaar, kya, hai, theek, dekho, suno, mujhe, tumhe, etc.
@@ -286,19 +855,29 @@ Examples:
 
 Be warm, supportive, and natural. 2-3 sentences max."""
     elif user_language == "urdu":
-        system_prompt = """You are Emma, a friendly mental wellness companion.
+        return """You are Emma, a friendly mental wellness companion.
 
 LANGUAGE: Respond in Urdu script. Be warm and supportive."""
     else:
-        system_prompt = """You are Emma, a warm mental wellness companion.
+        return """You are Emma, a warm mental wellness companion.
 - Be conversational and supportive
 - Respond in 2-3 sentences
 - Use emojis occasionally 💙
 - Ask follow-up questions
 - For serious issues, suggest professional help"""
+
+def build_prompt(user_message: str, conversation_history: List[Dict[str, Any]], context: str) -> str:
+    # Build conversation context
+    conversation_context = ""
+    if conversation_history:
+        recent_msgs = conversation_history[-4:]
+        formatted_history = []
+        for msg in recent_msgs:
+            role = "User" if msg.get("role") == "user" else "Emma"
+            formatted_history.append(f"{role}: {msg.get('content')}")
+        conversation_context = "\n".join(formatted_history)
     
-    # Build prompt
-    prompt = f"""Previous conversation:
+    return f"""Previous conversation:
 {conversation_context}
 
 User: {user_message}
@@ -307,47 +886,535 @@ Helpful techniques:
 {context}
 
 Respond with empathy and support (2-3 sentences):"""
+
+def greeting_reply(user_language: str) -> str:
+    import random
+    lang_key = "hinglish" if user_language in ["hinglish", "urdu"] else "english"
+    return random.choice(GREETING_TEMPLATES[lang_key])
+
+def fallback_reply(user_language: str) -> str:
+    """Reply used when Gemini fails."""
+    if user_language in ["hinglish", "urdu"]:
+        return "Yaar, I'm having trouble right now. Can you say that again? 💙"
+    return "I'm here to listen. Could you tell me more? 💙"
+
+def prepare_reply(user_message: str, conversation_history, user_language: str, emotion_stage, start_time: float,
+                  trace: Trace, route: Route):
+    """LEVEL 2 setup shared by /api/chat and /api/chat/stream: RAG context, prompts and
+    a semantic-cache hit if there is one."""
+    # Get RAG context for mental health queries (small talk skips it entirely)
+    with trace.span("retrieval_gate"):
+        decision = retrieval_gate(user_message, route, conversation_history)
+    retrieval_stage = start_stage(trace.wrap("retrieval", retrieve_context), user_message, 2, decision,
+                                  conversation_history, user_language)
+    relevant_docs, query_embedding = stage_result(
+        retrieval_stage, "retrieval", RETRIEVAL_DEADLINE, start_time, ([], None)
+    )
+    context = "\n".join(relevant_docs) if relevant_docs else ""
+    
+    # Semantic cache: only consulted when the emotion result is (almost) ready,
+    # so a slow emotion call never sits on the critical path
+    cached_reply = ""
+    cacheable = semantic_cacheable(conversation_history, route)
+    if cacheable and query_embedding is not None:
+        early_deadline = (time.time() - start_time) + SEMANTIC_CACHE_EMOTION_WAIT
+        early_sentiment = stage_result(emotion_stage, "emotion", min(EMOTION_DEADLINE, early_deadline), start_time, None,
+                                       log_timeout=False)
+        if early_sentiment is not None:
+            with trace.span("semantic_cache"):
+                cached_reply = semantic_cache.lookup(query_embedding, semantic_scope(user_language, early_sentiment)) or ""
+    
+    with trace.span("prompt_build"):
+        system_prompt = build_system_prompt(user_language)
+        prompt = build_prompt(user_message, conversation_history, context)
+    
+    return {
+        "system_prompt": system_prompt,
+        "prompt": prompt,
+        "query_embedding": query_embedding,
+        "cached_reply": cached_reply,
+        "cacheable": cacheable,
+    }
+
+def parse_chat_request():
+    """(user_message, conversation_history) from the JSON body, or None if invalid."""
+    data = request.json
+    if not data or 'message' not in data:
+        return None
+    return data['message'].strip(), data.get('conversation_history', [])
+
+def wants_debug_timings() -> bool:
+    """Per-stage timings in the response: CHAT_DEBUG_TIMINGS=1, or "debug_timings": true / ?debug_timings=1."""
+    if CHAT_DEBUG_TIMINGS or request.args.get("debug_timings") == "1":
+        return True
+    data = request.get_json(silent=True)
+    return isinstance(data, dict) and bool(data.get("debug_timings"))
+
+def finish_chat(payload: Dict[str, Any], endpoint: str, trace: Trace, debug: bool) -> Dict[str, Any]:
+    """Record the request latency and attach debug_timings when asked for."""
+    REQUEST_SECONDS.observe(trace.elapsed(), endpoint, payload["response_type"])
+    if debug:
+        payload["debug_timings"] = dict(trace.timings, total=round(trace.elapsed(), 4))
+    return payload
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    """Clean, simple chat endpoint."""
+    start_time = time.time()
+    
+    parsed = parse_chat_request()
+    if parsed is None:
+        return jsonify({"error": "Message is required"}), 400
+    user_message, conversation_history = parsed
+    trace = Trace(STAGE_SECONDS)
+    debug = wants_debug_timings()
+    
+    # Route the message (intent) in one pass, then detect language
+    with trace.span("routing"):
+        route = route_message(user_message)
+    with trace.span("language"):
+        user_language = detect_language(user_message)
+    
+    # Detect emotions (off the critical path: the reply does not depend on it)
+    emotion_stage = start_stage(trace.wrap("emotion", detect_emotions), user_message)
+    
+    # LEVEL 1: Simple greetings (use templates)
+    if is_simple_greeting(user_message, route):
+        response = greeting_reply(user_language)
+        sentiment_analysis = stage_result(emotion_stage, "emotion", EMOTION_DEADLINE, start_time, NEUTRAL_SENTIMENT)
+        
+        return jsonify(finish_chat({
+            "response": response,
+            "sentiment": sentiment_analysis,
+            "processing_time": round(time.time() - start_time, 3),
+            "response_type": "greeting"
+        }, "chat", trace, debug))
+    
+    # LEVEL 2: Complex queries (use Gemini + RAG)
+    turn = prepare_reply(user_message, conversation_history, user_language, emotion_stage, start_time, trace, route)
     
     # Get response from Gemini
-    ai_response = query_gemini(prompt, system_prompt, max_tokens=200)
+    ai_response = turn["cached_reply"]
+    if not ai_response:
+        llm_timeout = max(1.0, LLM_DEADLINE - (time.time() - start_time))
+        llm_started = time.perf_counter()
+        ai_response = query_gemini(turn["prompt"], turn["system_prompt"], max_tokens=200, timeout=llm_timeout,
+                                   priority=PRIORITY_CRISIS if route.intent == "crisis" else PRIORITY_NORMAL,
+                                   trace=trace)
+        trace.record("llm", llm_seconds(trace, llm_started))
+    generated = bool(ai_response) and not turn["cached_reply"]
     
     # Fallback if Gemini fails
     if not ai_response:
-        if user_language in ["hinglish", "urdu"]:
-            ai_response = "Yaar, I'm having trouble right now. Can you say that again? 💙"
-        else:
-            ai_response = "I'm here to listen. Could you tell me more? 💙"
+        FALLBACKS.inc("llm", "empty_reply")
+        with trace.span("fallback"):
+            ai_response = fallback_reply(user_language)
+    
+    # Emotion result: whatever is ready by now, bounded by its own deadline
+    sentiment_analysis = stage_result(emotion_stage, "emotion", EMOTION_DEADLINE, start_time, NEUTRAL_SENTIMENT)
+    
+    if generated and turn["cacheable"]:
+        semantic_cache.store(turn["query_embedding"], semantic_scope(user_language, sentiment_analysis), ai_response)
     
     processing_time = round(time.time() - start_time, 3)
     
-    return jsonify({
+    return jsonify(finish_chat({
         "response": ai_response,
         "sentiment": sentiment_analysis,
         "processing_time": processing_time,
         "response_type": "mental_health"
+    }, "chat", trace, debug))
+
+# ============================================================================
+# STREAMING CHAT ENDPOINT (Server-Sent Events)
+# ============================================================================
+
+def sse_event(event: str, payload: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming variant of /api/chat.
+
+    Events, in order: `sentiment` (same object as /api/chat), one or more
+    `chunk` ({"text": ...}) as Gemini generates, then `done` with the full
+    `response`, `processing_time` and `response_type`.
+    """
+    start_time = time.time()
+    
+    parsed = parse_chat_request()
+    if parsed is None:
+        return jsonify({"error": "Message is required"}), 400
+    user_message, conversation_history = parsed
+    trace = Trace(STAGE_SECONDS)
+    debug = wants_debug_timings()
+    
+    with trace.span("routing"):
+        route = route_message(user_message)
+    with trace.span("language"):
+        user_language = detect_language(user_message)
+    emotion_stage = start_stage(trace.wrap("emotion", detect_emotions), user_message)
+    
+    def sentiment():
+        return stage_result(emotion_stage, "emotion", EMOTION_DEADLINE, start_time, NEUTRAL_SENTIMENT)
+    
+    def done(response: str, response_type: str):
+        return sse_event("done", finish_chat({
+            "response": response,
+            "processing_time": round(time.time() - start_time, 3),
+            "response_type": response_type
+        }, "chat_stream", trace, debug))
+    
+    def generate():
+        if is_simple_greeting(user_message, route):
+            response = greeting_reply(user_language)
+            yield sse_event("sentiment", sentiment())
+            yield sse_event("chunk", {"text": response})
+            yield done(response, "greeting")
+            return
+        
+        turn = prepare_reply(user_message, conversation_history, user_language, emotion_stage, start_time, trace, route)
+        if turn["cached_reply"]:
+            yield sse_event("sentiment", sentiment())
+            yield sse_event("chunk", {"text": turn["cached_reply"]})
+            yield done(turn["cached_reply"], "mental_health")
+            return
+        
+        llm_timeout = max(1.0, LLM_DEADLINE - (time.time() - start_time))
+        chunks = query_gemini_stream(turn["prompt"], turn["system_prompt"], max_tokens=200, timeout=llm_timeout,
+                                     priority=PRIORITY_CRISIS if route.intent == "crisis" else PRIORITY_NORMAL,
+                                     trace=trace)
+        # Emotion runs while Gemini produces its first tokens; the sentiment event
+        # goes out right before the first chunk so it never delays time-to-first-token
+        llm_started = time.perf_counter()
+        first_chunk = next(chunks, "")
+        trace.record("llm_first_token", llm_seconds(trace, llm_started))
+        sentiment_analysis = sentiment()
+        yield sse_event("sentiment", sentiment_analysis)
+        
+        if not first_chunk:
+            FALLBACKS.inc("llm", "empty_reply")
+            response = fallback_reply(user_language)
+            yield sse_event("chunk", {"text": response})
+            yield done(response, "mental_health")
+            return
+        
+        parts = [first_chunk]
+        yield sse_event("chunk", {"text": first_chunk})
+        for text in chunks:
+            parts.append(text)
+            yield sse_event("chunk", {"text": text})
+        trace.record("llm", llm_seconds(trace, llm_started))
+        
+        response = "".join(parts).strip()
+        if turn["cacheable"]:
+            semantic_cache.store(turn["query_embedding"], semantic_scope(user_language, sentiment_analysis), response)
+        yield done(response, "mental_health")
+    
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
     })
 
 # ============================================================================
-# HEALTH CHECK
+# BATCH CHAT (transcript replay, queued check-ins)
 # ============================================================================
 
-@app.route('/api/health', methods=['GET'])
-def health():
-    """Health check endpoint."""
+CHAT_BATCH_MAX_ITEMS = int(os.environ.get("CHAT_BATCH_MAX_ITEMS", "64"))
+# Gemini calls in flight across all batches (free tier: 15 RPM)
+CHAT_BATCH_LLM_CONCURRENCY = int(os.environ.get("CHAT_BATCH_LLM_CONCURRENCY", "4"))
+# Batch items may queue for Gemini quota much longer than interactive chats
+CHAT_BATCH_DEADLINE = float(os.environ.get("CHAT_BATCH_DEADLINE_SECONDS", "300"))
+
+batch_llm_executor = ThreadPoolExecutor(
+    max_workers=CHAT_BATCH_LLM_CONCURRENCY,
+    thread_name_prefix="chat-batch-llm"
+)
+
+def process_chat_batch(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Python-callable /api/chat for many messages.
+
+    `items` are {"message", "conversation_history"?, "id"?} dicts. Language,
+    emotion and embeddings run as one batched call each; Gemini calls run with
+    bounded concurrency. Each result has the /api/chat fields plus `language`
+    and per-stage `timings` (batched stages report the shared batch time).
+    """
+    start_time = time.time()
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    messages, histories, positions = [], [], []
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        if "id" in item:
+            results[i]["id"] = item["id"]
+        message = item.get("message")
+        if not isinstance(message, str) or not message.strip():
+            results[i]["error"] = "Message is required"
+            continue
+        messages.append(message.strip())
+        histories.append(item.get("conversation_history") or [])
+        positions.append(i)
+
+    timings: Dict[str, float] = {}
+
+    def timed(stage: str, fn, *args):
+        started = time.time()
+        value = fn(*args)
+        timings[stage] = round(time.time() - started, 3)
+        return value
+
+    languages = timed("language", lambda: [r.language for r in identify_languages(messages)])
+    routes = timed("routing", lambda: [route_message(m) for m in messages])
+    # Emotion classification overlaps with the embedding encode
+    emotion_stage = start_stage(timed, "emotion", detect_emotions_batch, messages)
+
+    # Only messages that pass the retrieval gate are encoded and searched; every
+    # window turn of every such message is encoded up front in shared batches
+    needs_context = [n for n, route in enumerate(routes)
+                     if route.intent != "greeting" and retrieval_gate(messages[n], route, histories[n]).retrieve]
+    window_texts: Dict[Any, List[str]] = {}  # shard (None = default index) -> texts to encode
+    for n in needs_context:
+        shard = ready_shard(languages[n])
+        if shard is not None or uses_dense_retrieval(languages[n]):
+            window_texts.setdefault(shard, []).extend(text for text, _ in context_window(messages[n], histories[n]))
+    timed("embedding", lambda: [embed_batch(texts, shard=shard) for shard, texts in window_texts.items()])
+    retrieved = timed("retrieval", lambda: {n: retrieve_context(messages[n], 2, None, histories[n], languages[n])
+                                            for n in needs_context})
+    contexts = {n: documents for n, (documents, _) in retrieved.items()}
+    embeddings = {n: embedding for n, (_, embedding) in retrieved.items()}
+
     try:
-        test_response = gemini_model.generate_content("test")
-        gemini_status = "online" if test_response else "offline"
-    except:
-        gemini_status = "offline"
+        sentiments = emotion_stage.result()
+    except Exception as e:
+        print(f"batch emotion stage error: {e}")
+        sentiments = [dict(NEUTRAL_SENTIMENT) for _ in messages]
+
+    def reply(n: int) -> Dict[str, Any]:
+        started = time.time()
+        language, sentiment = languages[n], sentiments[n]
+        if routes[n].intent == "greeting":
+            return {"response": greeting_reply(language), "response_type": "greeting", "llm": 0.0}
+        scope = semantic_scope(language, sentiment)
+        cacheable = semantic_cacheable(histories[n], routes[n])
+        response = (semantic_cache.lookup(embeddings.get(n), scope) or "") if cacheable else ""
+        if not response:
+            context = "\n".join(contexts.get(n, []))
+            response = query_gemini(build_prompt(messages[n], histories[n], context), build_system_prompt(language),
+                                    max_tokens=200, timeout=CHAT_BATCH_DEADLINE,
+                                    priority=PRIORITY_CRISIS if routes[n].intent == "crisis" else PRIORITY_BATCH)
+            if response and cacheable:
+                semantic_cache.store(embeddings.get(n), scope, response)
+        return {
+            "response": response or fallback_reply(language),
+            "response_type": "mental_health",
+            "llm": round(time.time() - started, 3),
+        }
+
+    futures = [batch_llm_executor.submit(reply, n) for n in range(len(messages))]
+    for n, future in enumerate(futures):
+        try:
+            outcome = future.result()
+        except Exception as e:
+            print(f"batch item error: {e}")
+            outcome = {"response": fallback_reply(languages[n]), "response_type": "mental_health", "llm": 0.0}
+        results[positions[n]].update({
+            "response": outcome["response"],
+            "sentiment": sentiments[n],
+            "language": languages[n],
+            "response_type": outcome["response_type"],
+            "processing_time": round(time.time() - start_time, 3),
+            "timings": dict(timings, llm=outcome["llm"]),
+        })
+    return results
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Batch variant of /api/chat: {"messages": [{"message", "conversation_history"?, "id"?}, ...]}."""
+    start_time = time.time()
+    data = request.json
+    items = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "messages must be a non-empty list"}), 400
+    if len(items) > CHAT_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {CHAT_BATCH_MAX_ITEMS} messages per batch"}), 400
+    if not all(isinstance(item, dict) for item in items):
+        return jsonify({"error": "Each message must be an object"}), 400
     
+    results = process_chat_batch(items)
+    REQUEST_SECONDS.observe(time.time() - start_time, "chat_batch", "batch")
     return jsonify({
+        "results": results,
+        "count": len(results),
+        "processing_time": round(time.time() - start_time, 3)
+    })
+
+# ============================================================================
+# DASHBOARD RECOMMENDATIONS (see recommendations.py)
+# ============================================================================
+
+RECOMMENDATION_POLISH_PROMPT = """You rewrite a short weekly wellbeing summary for a mental health app.
+Keep it to 2-3 warm, encouraging sentences addressed to the user. Keep every fact; add no new ones.
+No diagnoses, no markdown."""
+
+def polish_weekly_summary(summary: str, overview: Dict[str, Any]) -> str:
+    """Background rewrite of the template summary; batch priority, so chats always go first."""
+    prompt = f"Mood overview: {json.dumps(overview)}\nSummary: {summary}\n\nRewritten summary:"
+    return query_gemini(prompt, RECOMMENDATION_POLISH_PROMPT, max_tokens=150, timeout=CHAT_BATCH_DEADLINE,
+                        priority=PRIORITY_BATCH)
+
+def gemini_has_headroom() -> bool:
+    """A Gemini request is free right now: nobody queued and the buckets and daily quota not drained."""
+    stats = gemini_limiter.stats()
+    return (stats["queued"] == 0 and stats["requests_available"] >= 1
+            and stats["requests_today"] < stats["daily_limit"])
+
+recommender = RecommendationEngine(
+    embed=lambda texts: embed_batch(texts, wait=False),
+    search=lambda key, vector, k: search_faiss(key, k, embedding=vector),
+    polish=polish_weekly_summary,
+    headroom=gemini_has_headroom,
+)
+
+@app.route('/api/recommendations', methods=['POST'])
+def recommendations():
+    """Dashboard suggestions, action plan and weekly summary from recent check-ins,
+    journal entries and chat messages. No LLM call on the request path; ?polish=1
+    rewrites the weekly summary in the background when RECOMMENDATIONS_LLM_POLISH is on."""
+    start_time = time.time()
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    payload = {key: data.get(key) if isinstance(data.get(key), list) else []
+               for key in ("chat_history", "journal_entries", "check_ins")}
+
+    result = recommender.recommend(payload, polish=request.args.get("polish") == "1")
+    REQUEST_SECONDS.observe(time.time() - start_time, "recommendations", result["source"])
+    return jsonify(dict(result, processing_time=round(time.time() - start_time, 3)))
+
+# ============================================================================
+# HEALTH CHECK
+# ============================================================================
+
+def gemini_status() -> str:
+    """Gemini state from in-process bookkeeping only (no API call)."""
+    _, gemini_model = gemini.get(wait=False) or (None, None)
+    if gemini_model is None:
+        return "loading" if not gemini.settled else "offline"
+    # Open (failing fast) or half-open (probing) breaker
+    if upstream("gemini").breaker.state != "closed":
+        return "degraded"
+    return "online"
+
+def gemini_deep_check() -> Dict[str, Any]:
+    """One real round-trip to Gemini; count_tokens consumes no generation quota."""
+    _, gemini_model = gemini.get(wait=False) or (None, None)
+    if gemini_model is None:
+        return {"status": "offline", "error": "Gemini model not loaded (API key not set?)"}
+    gemini_model.count_tokens("ping", request_options={"timeout": 5})
+    return {"status": "online"}
+
+gemini_deep_check_cached = DeepCheck("gemini", gemini_deep_check)
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Health check endpoint, answered from in-process state.
+
+    `?deep=1` adds a real Gemini round-trip, run at most once per
+    HEALTH_DEEP_INTERVAL seconds (cached result otherwise).
+    """
+    loaded = retrieval.get(wait=False)
+    snapshot = loaded[0].current() if loaded else None
+    payload = {
         "status": "online",
-        "gemini_api": gemini_status,
+        "gemini_api": gemini_status(),
         "model": "gemini-2.0-flash",
-        "faiss_docs": len(documents) if documents else 0,
-        "faiss_enabled": index is not None,
-        "hf_inference_enabled": HF_TOKEN is not None
-    })
+        "faiss_docs": snapshot.meta.get("count", len(snapshot.documents)) if snapshot else 0,
+        "faiss_enabled": snapshot is not None,
+        "faiss_index_type": snapshot.meta["index_type"] if snapshot else None,
+        "faiss_index_version": snapshot.version if snapshot else None,
+        # Shards load on the first message in their language
+        "retrieval_shards": {language: resource.state for language, resource in shards.items()},
+        "retrieval_server": retrieval_client.stats() if retrieval_client else None,
+        "hf_inference_enabled": HF_TOKEN is not None,
+        "emotion_backend": EMOTION_BACKEND,
+        "onnx_emotion_error": onnx_classifier.load_error if onnx_classifier else None,
+        "http_pool": http_client.stats(),
+        "batching": {
+            "embedding": embedding_batcher.stats(),
+            "emotion": emotion_batcher.stats()
+        },
+        "cache": {
+            "emotion": emotion_cache.stats(),
+            "retrieval": retrieval_cache.stats(),
+            "embedding": embedding_cache.stats(),
+            "semantic": semantic_cache.stats()
+        },
+        "recommendations": recommender.stats(),
+        "upstreams": upstream_snapshot(),
+        "gemini_rate_limit": gemini_limiter.stats()
+    }
+    if request.args.get("deep") == "1":
+        payload["deep_check"] = {"gemini": gemini_deep_check_cached.result()}
+    return jsonify(payload)
+
+# ============================================================================
+# METRICS (Prometheus text format)
+# ============================================================================
+
+for _name, _cache in (("emotion", emotion_cache), ("retrieval", retrieval_cache), ("embedding", embedding_cache),
+                      ("semantic", semantic_cache)):
+    Gauge(f"{_name}_cache_entries", lambda c=_cache: c.stats()["entries"], help=f"Entries in the {_name} cache")
+    Gauge(f"{_name}_cache_hit_rate", lambda c=_cache: c.stats()["hit_rate"], help=f"Hit rate of the {_name} cache")
+Gauge("http_in_flight", lambda: http_client.stats()["in_flight"], help="Upstream HTTP requests in flight")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage/request latency histograms, fallback and error counters (this worker only)."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+# ============================================================================
+# LIVENESS / READINESS (startup)
+# ============================================================================
+
+def warm_up():
+    """Load every lazy resource now (used by the warm-up thread and WARMUP_MODE=eager)."""
+    started = time.perf_counter()
+    gemini.get()
+    retrieval.get()
+    sparse_index()
+    if onnx_classifier is not None:
+        onnx_classifier.available
+    # Catalog embeddings are computed once here, never on a request
+    recommender.warm()
+    record_timing("warm_up", started)
+    print(f"✓ Warm-up finished in {startup_timings['warm_up']}s")
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+
+@app.route('/api/live', methods=['GET'])
+def live():
+    """Liveness: the process is up and serving (answers before any model is loaded)."""
+    return jsonify({"status": "alive", "startup_timings": startup_timings})
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once Gemini and retrieval have finished loading (or failed, degraded)."""
+    resources = {"gemini": gemini, "retrieval": retrieval}
+    is_ready = all(r.settled for r in resources.values())
+    loaded = retrieval.get(wait=False)
+    snapshot = loaded[0].current() if loaded else None
+    return jsonify({
+        "status": "ready" if is_ready else "starting",
+        "resources": {
+            name: {"state": r.state, "error": r.error} for name, r in resources.items()
+        },
+        "gemini_api": gemini_status(),
+        "faiss_index_version": snapshot.version if snapshot else None,
+        # Upstream trouble is reported here but never fails readiness: the chat
+        # endpoints have fallbacks, and pulling every worker out helps no one
+        "upstreams": upstream_snapshot(),
+        "startup_timings": startup_timings
+    }), (200 if is_ready else 503)
 
 @app.route('/', methods=['GET'])
 def root():
@@ -364,5 +1431,13 @@ def root():
         ]
     })
 
+record_timing("import", BOOT_STARTED)
+print(f"✓ app.py imported in {startup_timings['import']}s (warm-up mode: {WARMUP_MODE})")
+
+if WARMUP_MODE == "eager":
+    warm_up()
+elif WARMUP_MODE == "background":
+    start_warm_up()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
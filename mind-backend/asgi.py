@@ -0,0 +1,518 @@
+"""
+ASGI entry point: the chat endpoints on an event loop, everything else from the Flask app.
+
+Under gunicorn every in-flight chat holds a worker thread for as long as
+Gemini (or the HF Inference API) takes to answer, so a worker serves
+GUNICORN_THREADS chats at a time. Here /api/chat and /api/chat/stream are
+native coroutines:
+
+- HF Inference calls go through one httpx.AsyncClient (pooled, 503 retries
+  with backoff, optional hedging as in app.py), Gemini through
+  `generate_content_async`. Breakers, adaptive timeouts and metrics are the
+  ones app.py uses.
+- CPU-bound work (MiniLM encode, FAISS / BM25 search, ONNX emotion passes)
+  runs on a bounded executor of ASGI_CPU_WORKERS threads, so a burst of
+  chats queues there instead of spawning a thread per request.
+- The Gemini quota queue (rate_limiter.py) is a blocking wait shared with
+  other processes; admission runs on its own executor.
+
+All other routes (/api/chat/batch, /api/recommendations, /api/health,
+/api/ready, /api/live, /metrics, /) are served by the Flask app from
+app.py, mounted as WSGI. Request and response shapes are identical.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    python asgi.py
+
+Environment:
+    ASGI_CPU_WORKERS          threads for encode / search / ONNX work (default 8)
+    ASGI_ADMISSION_WORKERS    threads waiting in the Gemini quota queue (default 32)
+    ASGI_HTTP_CONNECTIONS     concurrent HF Inference connections (default 100)
+"""
+
+import asyncio
+import contextlib
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import app as core
+from cache import normalize_text
+from http_client import HTTP_MAX_RETRIES, HTTP_POOL_SIZE, retry_delay
+from metrics import Trace
+from rate_limiter import PRIORITY_CRISIS, PRIORITY_NORMAL, RateLimited
+from resilience import CircuitOpen, upstream
+from routing import Route as MessageRoute, route_message
+
+ASGI_CPU_WORKERS = int(os.environ.get("ASGI_CPU_WORKERS", "8"))
+ASGI_ADMISSION_WORKERS = int(os.environ.get("ASGI_ADMISSION_WORKERS", "32"))
+ASGI_HTTP_CONNECTIONS = int(os.environ.get("ASGI_HTTP_CONNECTIONS", "100"))
+
+cpu_executor = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix="asgi-cpu")
+admission_executor = ThreadPoolExecutor(max_workers=ASGI_ADMISSION_WORKERS, thread_name_prefix="asgi-admit")
+
+_http: Optional[httpx.AsyncClient] = None
+
+
+def async_http() -> httpx.AsyncClient:
+    """The process-wide AsyncClient (created on first use, closed at shutdown)."""
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(limits=httpx.Limits(max_connections=ASGI_HTTP_CONNECTIONS,
+                                                      max_keepalive_connections=HTTP_POOL_SIZE))
+    return _http
+
+
+async def run_in(executor: ThreadPoolExecutor, fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+# ============================================================================
+# ASYNC UPSTREAM CLIENTS
+# ============================================================================
+
+async def hedged(make, delay: Optional[float]):
+    """Async resilience.hedged_call: a backup attempt after `delay`; the loser is cancelled."""
+    primary = asyncio.ensure_future(make())
+    if delay is None:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    pending = {primary, asyncio.ensure_future(make())}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+            error = task.exception()
+    raise error
+
+
+async def call_hf_inference_async(text: Union[str, List[str]], timeout: float = None):
+    """app.call_hf_inference over httpx: same breaker, adaptive timeout and retries."""
+    status, url, headers, payload, timeout = core.hf_request(text, timeout)
+
+    async def post():
+        # As http_client: retries and backoff all fit in `timeout`
+        deadline = time.monotonic() + timeout
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            remaining = max(0.001, deadline - time.monotonic())
+            resp = await async_http().post(url, headers=headers, json=payload, timeout=remaining)
+            if resp.status_code != 503 or attempt == HTTP_MAX_RETRIES:
+                break
+            # 503 while the model loads on the HF side
+            delay = retry_delay(resp.headers.get("Retry-After"), attempt)
+            if time.monotonic() + delay >= deadline:
+                break
+            await asyncio.sleep(delay)
+        resp.raise_for_status()
+        return resp.json()
+
+    started = time.perf_counter()
+    try:
+        if status.hedge:
+            result = await hedged(post, status.latency.percentile(0.95))
+        else:
+            result = await post()
+    except Exception as e:
+        status.failure(e)
+        raise
+    status.success(time.perf_counter() - started)
+    return result
+
+
+def detect_emotions_onnx(text: str) -> Optional[Dict[str, Any]]:
+    """app.detect_emotions on the local ONNX model; None when the model cannot be loaded."""
+    return core.detect_emotions(text) if core.onnx_classifier.available else None
+
+
+async def detect_emotions_async(text: str) -> Dict[str, Any]:
+    """app.detect_emotions without holding a thread while the HF API answers."""
+    if len(text.split()) < 3 or core.EMOTION_BACKEND == "none":
+        return dict(core.NEUTRAL_SENTIMENT)
+    if core.onnx_classifier is not None and core.onnx_classifier.load_error is None:
+        # Local ONNX forward pass (and the first-use load): CPU-bound, so it takes a CPU thread
+        result = await run_in(cpu_executor, detect_emotions_onnx, text)
+        if result is not None:
+            return result
+    if not core.HF_TOKEN:
+        return dict(core.NEUTRAL_SENTIMENT)
+    # HF API, including the fallback when the ONNX model is unavailable: awaited, no thread held
+
+    cache_key = normalize_text(text)
+    cached = core.emotion_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        results = core.hf_scores(await call_hf_inference_async(text))
+    except CircuitOpen:
+        core.FALLBACKS.inc("emotion", "circuit_open")
+        return dict(core.NEUTRAL_SENTIMENT)
+    except Exception as e:
+        print(f"Emotion detection error ({core.EMOTION_BACKEND}):", e)
+        core.UPSTREAM_ERRORS.inc(core.EMOTION_BACKEND, type(e).__name__)
+        core.FALLBACKS.inc("emotion", "error")
+        return dict(core.NEUTRAL_SENTIMENT)
+
+    if not results:
+        return dict(core.NEUTRAL_SENTIMENT)
+    result = core.sentiment_from_scores(results)
+    core.emotion_cache.set(cache_key, result)
+    return result
+
+
+async def gemini_admit_async(prompt: str, system_prompt: str, max_tokens: int, timeout: float, priority: int,
+                             trace: Trace = None):
+    # The quota queue blocks (its state is shared with other processes through a file lock)
+    return await run_in(admission_executor, core.gemini_admit, prompt, system_prompt, max_tokens, timeout, priority,
+                        trace)
+
+
+async def query_gemini_async(prompt: str, system_prompt: str, max_tokens: int = 200, timeout: float = None,
+                             priority: int = PRIORITY_NORMAL, trace: Trace = None) -> str:
+    """app.query_gemini on generate_content_async ("" on any error)."""
+    try:
+        admitted = await gemini_admit_async(prompt, system_prompt, max_tokens, timeout, priority, trace)
+        if admitted is None:
+            return ""
+        gemini_model, full_prompt, options = admitted
+        sent = time.perf_counter()
+        response = await gemini_model.generate_content_async(full_prompt, **options)
+        upstream("gemini").latency.observe(time.perf_counter() - sent)
+        text = response.text.strip() if response.text else ""
+        upstream("gemini").success()
+        return text
+    except CircuitOpen:
+        return ""
+    except RateLimited as e:
+        print(f"Gemini request shed: {e}")
+        core.FALLBACKS.inc("llm", "rate_limited")
+        return ""
+    except Exception as e:
+        print(f"Gemini error: {e}")
+        core.gemini_failed(e)
+        return ""
+
+
+async def query_gemini_stream_async(prompt: str, system_prompt: str, max_tokens: int = 200, timeout: float = None,
+                                    priority: int = PRIORITY_NORMAL, trace: Trace = None):
+    """app.query_gemini_stream as an async generator (yields nothing on error)."""
+    try:
+        admitted = await gemini_admit_async(prompt, system_prompt, max_tokens, timeout, priority, trace)
+        if admitted is None:
+            return
+        gemini_model, full_prompt, options = admitted
+        response = await gemini_model.generate_content_async(full_prompt, stream=True, **options)
+        succeeded = False
+        async for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                if not succeeded:
+                    upstream("gemini").success()
+                    succeeded = True
+                yield text
+        if not succeeded:
+            upstream("gemini").success()
+    except CircuitOpen:
+        return
+    except RateLimited as e:
+        print(f"Gemini request shed: {e}")
+        core.FALLBACKS.inc("llm", "rate_limited")
+    except Exception as e:
+        print(f"Gemini stream error: {e}")
+        core.gemini_failed(e)
+
+# ============================================================================
+# ASYNC CHAT PIPELINE
+# ============================================================================
+
+def _consume_error(task: asyncio.Future) -> None:
+    # A stage abandoned at its deadline may still fail later; that is not worth a warning
+    if not task.cancelled():
+        task.exception()
+
+
+async def start_stage(awaitable) -> asyncio.Future:
+    """Start a pipeline stage as a task (CHAT_PIPELINE_MODE=sequential awaits it here)."""
+    if core.CHAT_PIPELINE_MODE == "sequential":
+        stage = asyncio.get_running_loop().create_future()
+        try:
+            stage.set_result(await awaitable)
+        except Exception as e:
+            stage.set_exception(e)
+    else:
+        stage = asyncio.ensure_future(awaitable)
+    stage.add_done_callback(_consume_error)
+    return stage
+
+
+async def stage_result(stage: asyncio.Future, name: str, deadline: float, start_time: float, default,
+                       log_timeout: bool = True):
+    """app.stage_result for a task: wait until the deadline, the stage keeps running after it."""
+    remaining = max(0.0, deadline - (time.time() - start_time))
+    try:
+        return await asyncio.wait_for(asyncio.shield(stage), remaining)
+    except asyncio.TimeoutError:
+        if log_timeout:
+            print(f"{name} stage missed its {deadline}s deadline, using fallback")
+            core.FALLBACKS.inc(name, "timeout")
+        return default
+    except Exception as e:
+        print(f"{name} stage error: {e}")
+        core.FALLBACKS.inc(name, "error")
+        return default
+
+
+async def timed(trace: Trace, stage: str, awaitable):
+    with trace.span(stage):
+        return await awaitable
+
+
+async def prepare_reply(user_message: str, conversation_history, user_language: str, emotion_stage,
+                        start_time: float, trace: Trace, route: MessageRoute):
+    """app.prepare_reply with retrieval on the CPU executor."""
+    with trace.span("retrieval_gate"):
+        decision = core.retrieval_gate(user_message, route, conversation_history)
+    retrieval_stage = await start_stage(run_in(cpu_executor, trace.wrap("retrieval", core.retrieve_context),
+                                               user_message, 2, decision, conversation_history, user_language))
+    relevant_docs, query_embedding = await stage_result(
+        retrieval_stage, "retrieval", core.RETRIEVAL_DEADLINE, start_time, ([], None)
+    )
+    context = "\n".join(relevant_docs) if relevant_docs else ""
+
+    cached_reply = ""
+    cacheable = core.semantic_cacheable(conversation_history, route)
+    if cacheable and query_embedding is not None:
+        early_deadline = (time.time() - start_time) + core.SEMANTIC_CACHE_EMOTION_WAIT
+        early_sentiment = await stage_result(emotion_stage, "emotion", min(core.EMOTION_DEADLINE, early_deadline),
+                                             start_time, None, log_timeout=False)
+        if early_sentiment is not None:
+            with trace.span("semantic_cache"):
+                cached_reply = core.semantic_cache.lookup(
+                    query_embedding, core.semantic_scope(user_language, early_sentiment)) or ""
+
+    with trace.span("prompt_build"):
+        system_prompt = core.build_system_prompt(user_language)
+        prompt = core.build_prompt(user_message, conversation_history, context)
+
+    return {
+        "system_prompt": system_prompt,
+        "prompt": prompt,
+        "query_embedding": query_embedding,
+        "cached_reply": cached_reply,
+        "cacheable": cacheable,
+    }
+
+
+async def parse_chat_request(request: Request):
+    """(user_message, conversation_history, debug) from the JSON body, or None if invalid."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or 'message' not in data:
+        return None
+    debug = (core.CHAT_DEBUG_TIMINGS or request.query_params.get("debug_timings") == "1"
+             or bool(data.get("debug_timings")))
+    return data['message'].strip(), data.get('conversation_history', []), debug
+
+
+def llm_priority(route: MessageRoute) -> int:
+    return PRIORITY_CRISIS if route.intent == "crisis" else PRIORITY_NORMAL
+
+
+async def chat(request: Request):
+    """/api/chat (same request and response as app.chat)."""
+    start_time = time.time()
+
+    parsed = await parse_chat_request(request)
+    if parsed is None:
+        return JSONResponse({"error": "Message is required"}, status_code=400)
+    user_message, conversation_history, debug = parsed
+    trace = Trace(core.STAGE_SECONDS)
+
+    with trace.span("routing"):
+        route = route_message(user_message)
+    with trace.span("language"):
+        user_language = core.detect_language(user_message)
+
+    emotion_stage = await start_stage(timed(trace, "emotion", detect_emotions_async(user_message)))
+
+    # LEVEL 1: Simple greetings (use templates)
+    if core.is_simple_greeting(user_message, route):
+        response = core.greeting_reply(user_language)
+        sentiment_analysis = await stage_result(emotion_stage, "emotion", core.EMOTION_DEADLINE, start_time,
+                                                core.NEUTRAL_SENTIMENT)
+        return JSONResponse(core.finish_chat({
+            "response": response,
+            "sentiment": sentiment_analysis,
+            "processing_time": round(time.time() - start_time, 3),
+            "response_type": "greeting"
+        }, "chat", trace, debug))
+
+    # LEVEL 2: Complex queries (use Gemini + RAG)
+    turn = await prepare_reply(user_message, conversation_history, user_language, emotion_stage, start_time, trace,
+                               route)
+
+    ai_response = turn["cached_reply"]
+    if not ai_response:
+        llm_timeout = max(1.0, core.LLM_DEADLINE - (time.time() - start_time))
+        llm_started = time.perf_counter()
+        ai_response = await query_gemini_async(turn["prompt"], turn["system_prompt"], max_tokens=200,
+                                               timeout=llm_timeout, priority=llm_priority(route), trace=trace)
+        trace.record("llm", core.llm_seconds(trace, llm_started))
+    generated = bool(ai_response) and not turn["cached_reply"]
+
+    if not ai_response:
+        core.FALLBACKS.inc("llm", "empty_reply")
+        with trace.span("fallback"):
+            ai_response = core.fallback_reply(user_language)
+
+    sentiment_analysis = await stage_result(emotion_stage, "emotion", core.EMOTION_DEADLINE, start_time,
+                                            core.NEUTRAL_SENTIMENT)
+
+    if generated and turn["cacheable"]:
+        core.semantic_cache.store(turn["query_embedding"], core.semantic_scope(user_language, sentiment_analysis),
+                                  ai_response)
+
+    return JSONResponse(core.finish_chat({
+        "response": ai_response,
+        "sentiment": sentiment_analysis,
+        "processing_time": round(time.time() - start_time, 3),
+        "response_type": "mental_health"
+    }, "chat", trace, debug))
+
+
+async def chat_stream(request: Request):
+    """/api/chat/stream (same events as app.chat_stream: sentiment, chunk..., done)."""
+    start_time = time.time()
+
+    parsed = await parse_chat_request(request)
+    if parsed is None:
+        return JSONResponse({"error": "Message is required"}, status_code=400)
+    user_message, conversation_history, debug = parsed
+    trace = Trace(core.STAGE_SECONDS)
+
+    with trace.span("routing"):
+        route = route_message(user_message)
+    with trace.span("language"):
+        user_language = core.detect_language(user_message)
+    emotion_stage = await start_stage(timed(trace, "emotion", detect_emotions_async(user_message)))
+
+    async def sentiment():
+        return await stage_result(emotion_stage, "emotion", core.EMOTION_DEADLINE, start_time,
+                                  core.NEUTRAL_SENTIMENT)
+
+    def done(response: str, response_type: str):
+        return core.sse_event("done", core.finish_chat({
+            "response": response,
+            "processing_time": round(time.time() - start_time, 3),
+            "response_type": response_type
+        }, "chat_stream", trace, debug))
+
+    async def generate():
+        if core.is_simple_greeting(user_message, route):
+            response = core.greeting_reply(user_language)
+            yield core.sse_event("sentiment", await sentiment())
+            yield core.sse_event("chunk", {"text": response})
+            yield done(response, "greeting")
+            return
+
+        turn = await prepare_reply(user_message, conversation_history, user_language, emotion_stage, start_time,
+                                   trace, route)
+        if turn["cached_reply"]:
+            yield core.sse_event("sentiment", await sentiment())
+            yield core.sse_event("chunk", {"text": turn["cached_reply"]})
+            yield done(turn["cached_reply"], "mental_health")
+            return
+
+        llm_timeout = max(1.0, core.LLM_DEADLINE - (time.time() - start_time))
+        chunks = query_gemini_stream_async(turn["prompt"], turn["system_prompt"], max_tokens=200,
+                                           timeout=llm_timeout, priority=llm_priority(route), trace=trace)
+        # As in app.py: the sentiment event goes out right before the first chunk
+        llm_started = time.perf_counter()
+        first_chunk = await anext(chunks, "")
+        trace.record("llm_first_token", core.llm_seconds(trace, llm_started))
+        sentiment_analysis = await sentiment()
+        yield core.sse_event("sentiment", sentiment_analysis)
+
+        if not first_chunk:
+            core.FALLBACKS.inc("llm", "empty_reply")
+            response = core.fallback_reply(user_language)
+            yield core.sse_event("chunk", {"text": response})
+            yield done(response, "mental_health")
+            return
+
+        parts = [first_chunk]
+        yield core.sse_event("chunk", {"text": first_chunk})
+        async for text in chunks:
+            parts.append(text)
+            yield core.sse_event("chunk", {"text": text})
+        trace.record("llm", core.llm_seconds(trace, llm_started))
+
+        response = "".join(parts).strip()
+        if turn["cacheable"]:
+            core.semantic_cache.store(turn["query_embedding"],
+                                      core.semantic_scope(user_language, sentiment_analysis), response)
+        yield done(response, "mental_health")
+
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# ============================================================================
+# APPLICATION
+# ============================================================================
+
+def with_cors(endpoint):
+    """Flask-CORS policy of app.py for a native route (mounted Flask routes keep their own)."""
+    return CORSMiddleware(
+        request_response(endpoint),
+        allow_origins=["https://bot-sooty-sigma.vercel.app"],
+        allow_origin_regex=r"http://localhost(:\d+)?",
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+    )
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    yield
+    if _http is not None:
+        await _http.aclose()
+    cpu_executor.shutdown(wait=False)
+    admission_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/api/chat", with_cors(chat), methods=["POST", "OPTIONS"]),
+        Route("/api/chat/stream", with_cors(chat_stream), methods=["POST", "OPTIONS"]),
+        Mount("/", app=WSGIMiddleware(core.app)),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "5000")))
@@ -0,0 +1,115 @@
+"""
+Micro-batching scheduler for model inference.
+
+Concurrent requests each want to encode one query (or classify one message).
+MicroBatcher coalesces items that arrive within a short window into a single
+batched call - one SentenceTransformer.encode / classifier forward pass - and
+hands each caller its own row of the result.
+
+Environment:
+    MICRO_BATCHING        "1" to enable (default), "0" to call models directly
+    BATCH_WINDOW_MS       how long the first item waits for company (default 5)
+    BATCH_MAX_SIZE        flush as soon as this many items are queued (default 16)
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+
+from metrics import Histogram, LATENCY_BUCKETS, SIZE_BUCKETS
+
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "1") == "1"
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+
+
+class MicroBatcher:
+    """Collects single items into batches for `batch_fn(items) -> results` (same order)."""
+
+    def __init__(self, name: str, batch_fn: Callable[[List[Any]], Sequence[Any]],
+                 window_ms: float = BATCH_WINDOW_MS, max_batch: int = BATCH_MAX_SIZE,
+                 enabled: bool = MICRO_BATCHING):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.enabled = enabled
+        self.batch_sizes = Histogram(f"{name}_batch_size", SIZE_BUCKETS)
+        self.queue_wait = Histogram(f"{name}_queue_wait_seconds", LATENCY_BUCKETS)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(); each gunicorn worker starts its own
+        pid = os.getpid()
+        if self._worker is not None and self._pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._pid != pid or not self._worker.is_alive():
+                self._queue = queue.Queue()
+                self._pid = pid
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        if not self.enabled:
+            try:
+                future.set_result(self.batch_fn([item])[0])
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._ensure_worker()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item: Any, timeout: float = None) -> Any:
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        flush_at = batch[0][2] + self.window
+        while len(batch) < self.max_batch:
+            remaining = flush_at - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait.observe(started - enqueued)
+            self.batch_sizes.observe(len(batch))
+
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: got {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "pending": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+        }
@@ -0,0 +1,162 @@
+"""
+Benchmark: dense (MiniLM), sparse (BM25) and hybrid (RRF) retrieval, per language.
+
+The corpus is the technique catalog from recommendations.py (one document per
+technique), with hand-labelled queries in English, Roman Urdu and Urdu script.
+For each retriever and language it reports mean latency per query and
+recall@k (share of queries whose labelled technique is in the top k).
+
+Dense search is an exact inner product over normalised MiniLM embeddings,
+i.e. what a flat FAISS index returns; it is skipped when
+sentence-transformers is not installed. Dense latency includes the query
+encode, which is what the sparse path saves.
+
+The "production" row is what a chat message actually gets: the catalog is
+indexed with build_index.py into a temporary data directory, and each query
+goes through app.py's retrieval gate, language detection and
+retrieve_context (result caches off). A query the gate rejects counts as a
+miss. Needs faiss and sentence-transformers, like the app.
+
+Usage (from mind-backend/):
+    python benchmarks/bench_retrieval.py [--k 3] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np  # noqa: E402
+
+from bm25 import BM25Index  # noqa: E402
+from fusion import reciprocal_rank_fusion  # noqa: E402
+from index_store import DATA_DIR, DEFAULT_EMBEDDING_MODEL  # noqa: E402
+from recommendations import TECHNIQUE_CATALOG, technique_text  # noqa: E402
+from routing import route_message  # noqa: E402
+
+# (language, query, id of the technique that should be retrieved)
+QUERIES = [
+    ("english", "I can't fall asleep at night, my mind keeps racing", "br-478"),
+    ("english", "I feel so lonely, nobody talks to me", "mt-connect"),
+    ("english", "my exams are overwhelming and I keep procrastinating", "sr-tasks"),
+    ("english", "I'm having a panic attack right now", "sr-grounding"),
+    ("english", "I worry about everything all day long", "sr-worry"),
+    ("english", "my shoulders and neck are so tense from stress", "ex-stretch"),
+    ("english", "I'm always criticising myself", "mt-selfcompassion"),
+    ("english", "I need to calm my breathing quickly", "br-sigh"),
+    ("hinglish", "mujhe raat ko neend nahi aati", "br-478"),
+    ("hinglish", "yaar main bohat akela feel karta hoon, kisi dost se baat nahi hoti", "mt-connect"),
+    ("hinglish", "imtihan ki wajah se bohot tension hai", "sr-tasks"),
+    ("hinglish", "mujhe ghabrahat ho rahi hai, saans nahi aa rahi", "br-box"),
+    ("hinglish", "har waqt pareshaan rehta hoon, fikar khatam nahi hoti", "sr-worry"),
+    ("hinglish", "dil bohat udaas hai aaj", "rs-depression"),
+    ("hinglish", "bohot thakan hai, sukoon chahiye", "ex-pmr"),
+    ("urdu", "مجھے نیند نہیں آتی", "br-478"),
+    ("urdu", "میں بہت اکیلا ہوں", "mt-connect"),
+    ("urdu", "امتحان کی وجہ سے بہت پریشانی ہے", "sr-worry"),
+    ("urdu", "مجھے گھبراہٹ ہو رہی ہے", "br-box"),
+    ("urdu", "دل بہت اداس ہے", "rs-depression"),
+]
+
+
+def load_dense():
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return None
+    return SentenceTransformer(DEFAULT_EMBEDDING_MODEL)
+
+
+def load_production(ids, documents, k):
+    """Gate + retrieve_context from app.py over a temporary index of `documents` (None without faiss)."""
+    try:
+        import build_index
+    except ImportError:
+        return None
+    workdir = tempfile.mkdtemp(prefix="bench-retrieval-")
+    corpus = os.path.join(workdir, "catalog.jsonl")
+    with open(corpus, "w", encoding="utf-8") as f:
+        for doc_id, doc in zip(ids, documents):
+            f.write(json.dumps({"id": doc_id, "text": doc}, ensure_ascii=False) + "\n")
+    build_index.build(build_index.parse_args([corpus, "--output-dir", os.path.join(workdir, DATA_DIR)]))
+
+    # app.py reads ./data; measure the retrieval itself, not cache hits
+    os.chdir(workdir)
+    os.environ.pop("RETRIEVAL_SOCKET", None)
+    os.environ.update({"WARMUP_MODE": "eager", "RETRIEVAL_CACHE_SIZE": "0", "EMBEDDING_CACHE_SIZE": "0"})
+    import app
+
+    by_text = {" ".join(doc.split()): doc_id for doc_id, doc in zip(ids, documents)}
+
+    def production(language, query):
+        decision = app.retrieval_gate(query, route_message(query))
+        docs, _ = app.retrieve_context(query, k, decision, None, app.detect_language(query))
+        return [by_text.get(doc) for doc in docs]
+
+    return production
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions per query")
+    args = parser.parse_args()
+
+    ids = [item["id"] for item in TECHNIQUE_CATALOG]
+    documents = [technique_text(item) for item in TECHNIQUE_CATALOG]
+    started = time.perf_counter()
+    sparse_index = BM25Index(documents)
+    print(f"BM25 index: {len(documents)} documents, {sparse_index.vocabulary_size} terms, "
+          f"built in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    model = load_dense()
+    if model is None:
+        print("sentence-transformers not installed: dense and hybrid rows skipped")
+        matrix = None
+    else:
+        matrix = np.asarray(model.encode(documents, normalize_embeddings=True), dtype=np.float32)
+
+    def sparse(language, query):
+        return [ids[hit.doc_id] for hit in sparse_index.search(query, args.k * 2, language == "hinglish")]
+
+    def dense(language, query):
+        vector = model.encode([query], normalize_embeddings=True)[0]
+        return [ids[i] for i in np.argsort(-(matrix @ vector))[: args.k * 2]]
+
+    def hybrid(language, query):
+        # What app.py does: Urdu / Roman Urdu use BM25 alone, English fuses both
+        if language != "english":
+            return sparse(language, query)
+        return reciprocal_rank_fusion([(1.0, dense(language, query)), (1.0, sparse(language, query))], limit=args.k)
+
+    retrievers = [("sparse (BM25)", sparse)]
+    if matrix is not None:
+        retrievers += [("dense (MiniLM)", dense), ("hybrid (RRF)", hybrid)]
+        production = load_production(ids, documents, args.k)
+        if production is None:
+            print("faiss not installed: production row skipped")
+        else:
+            retrievers.append(("production", production))
+
+    print(f"\n{'retriever':16s} {'language':9s} {'queries':>7s} {'recall@' + str(args.k):>9s} {'µs/query':>10s}")
+    for name, retrieve in retrievers:
+        hits, seconds, counts = defaultdict(int), defaultdict(float), defaultdict(int)
+        for language, query, expected in QUERIES:
+            hits[language] += expected in retrieve(language, query)[: args.k]
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                retrieve(language, query)
+            seconds[language] += (time.perf_counter() - started) / args.repeat
+            counts[language] += 1
+        for language in counts:
+            print(f"{name:16s} {language:9s} {counts[language]:7d} {hits[language] / counts[language]:9.2f} "
+                  f"{seconds[language] / counts[language] * 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: per-message routing cost, old scans vs the compiled router.
+
+"before" reproduces the previous fast path: MessageClassifier.classify from
+app_old_complex.py (lower() + re.search over each uncompiled pattern list in
+turn) plus app.py's substring scans in is_simple_greeting / detect_language.
+"after" is one routing.route_message() pass plus language.identify_language()
+(uncached here, so the numbers reflect a first sighting of each message).
+
+Usage (from mind-backend/):
+    python benchmarks/bench_routing.py [--iterations 20000]
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import language  # noqa: E402
+import routing  # noqa: E402
+
+MESSAGES = [
+    "hi",
+    "hey how are you",
+    "yaar mujhe bohat stress hai exams ka",
+    "I don't want to live anymore",
+    "thank you so much, that was really helpful",
+    "I finally got the job offer today!",
+    "ok",
+    "I have been feeling really anxious about my future and I can't sleep at night",
+    "kaise ho",
+    "what can you help me with?",
+]
+
+
+def legacy_classify(message):
+    msg_lower = message.lower().strip()
+    if len(msg_lower) < 2:
+        return "invalid"
+    if any(re.search(p, msg_lower) for p in routing.CRISIS_PATTERNS):
+        return "crisis"
+    if len(message.split()) <= 5 and any(re.search(p, msg_lower) for p in routing.GREETING_PATTERNS):
+        return "greeting"
+    if any(re.search(p, msg_lower) for p in routing.BOT_INFO_PATTERNS):
+        return "bot_info"
+    if any(re.search(p, msg_lower) for p in routing.GRATITUDE_PATTERNS):
+        return "gratitude"
+    if any(re.search(p, msg_lower) for p in routing.ACHIEVEMENT_PATTERNS):
+        return "achievement"
+    if len(message.split()) <= 3 and any(re.search(p, msg_lower) for p in routing.CASUAL_PATTERNS):
+        return "casual"
+    return "mental_health"
+
+
+def legacy_fast_path(message):
+    intent = legacy_classify(message)
+    greetings = ['hi', 'hello', 'hey', 'kaise ho', 'kaisay ho', 'kessay ho', 'good morning', 'good evening']
+    text_lower = message.lower().strip()
+    is_greeting = len(message.split()) <= 5 and any(g in text_lower for g in greetings)
+    hinglish_words = ['yaar', 'yr', 'hai', 'kya', 'acha', 'theek', 'dekho', 'suno', 'mujhe', 'tumhe']
+    has_hinglish = any(w in message.lower() for w in hinglish_words)
+    return intent, is_greeting, has_hinglish
+
+
+def compiled_fast_path(message):
+    route = routing.route_message(message)
+    return route.intent, route.intent == "greeting", language.identify_language(message).language == "hinglish"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, fn in [("before (per-pattern scans)", legacy_fast_path), ("after (compiled router)", compiled_fast_path)]:
+        seconds = timeit.timeit(lambda: [fn(m) for m in MESSAGES], number=args.iterations // len(MESSAGES))
+        per_message_us = seconds / (args.iterations // len(MESSAGES) * len(MESSAGES)) * 1e6
+        print(f"{name:28s} {per_message_us:7.2f} µs/message")
+
+    print()
+    for message in MESSAGES:
+        print(f"{compiled_fast_path(message)!s:40s} {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Sparse (BM25) retrieval over the technique documents, for queries MiniLM cannot embed.
+
+all-MiniLM-L6-v2 is English-only: a Roman Urdu or Urdu-script message comes back
+with near-random FAISS neighbours. The tokenizer here maps both onto the English
+vocabulary of mind_docs.txt instead:
+
+- Roman Urdu has no fixed spelling ("pareshan" / "pareshaan" / "preshan",
+  "neend" / "nind"), so in messages identified as Hinglish, Latin tokens are
+  looked up by a folded form: doubled letters collapsed, vowels after the
+  first letter dropped. A hit in ROMAN_URDU_GLOSS emits the English terms.
+  Short words fold into each other ("kam" and "kaam", "sun" and "sona"), so
+  folding only applies to tokens of 4+ letters whose folded key keeps 3+
+  consonants; short words match their exact spellings listed in the gloss.
+- A few Urdu-script words map the same way through URDU_SCRIPT_GLOSS.
+- English tokens get a light suffix strip ("breathing" -> "breath"), so
+  query and document inflections meet.
+
+BM25Index is a compact inverted index: one (doc ids, term frequencies) pair of
+numpy arrays per term and a score accumulator per query, so a search over a few
+thousand documents takes microseconds and needs no model.
+"""
+
+import math
+import re
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+|[؀-ۿݐ-ݿ]+")
+_REPEATS = re.compile(r"(.)\1+")
+_INNER_VOWELS = re.compile(r"(?<=.)[aeiouy]")
+
+STOPWORDS = frozenset("""
+    a an the and or but if of to in on at for with from by as is are was were be been am
+    i me my you your it its this that these those we our they them he she his her
+    do does did have has had not no so very really just can could would should will
+    what how why when about feel feeling
+    hai hain ho hoon tha thi the mein main mujhe mera meri mere tum tumhe aap hum ye yeh
+    wo woh kya ka ki ke ko se bhi aur ya nahi nahin nhi bohat bohot bahut kuch sab
+    yaar yr raha rahi rahe hota hoti kar karna karta karti lag lagta lagti
+""".split())
+
+# Roman Urdu -> English terms of the technique corpus (distinctive keys are also folded, see foldable())
+ROMAN_URDU_GLOSS: Dict[str, Tuple[str, ...]] = {
+    "neend": ("sleep",), "sona": ("sleep",), "jaagna": ("sleep", "awake"),
+    "pareshan": ("worry", "anxiety", "stress"), "pareshani": ("worry", "anxiety", "stress"),
+    "tension": ("stress", "anxiety"), "fikar": ("worry",), "fikr": ("worry",),
+    "ghabrahat": ("anxiety", "panic"), "ghabrana": ("anxiety", "panic"), "dar": ("fear", "anxiety"),
+    "darr": ("fear", "anxiety"), "darna": ("fear", "anxiety"), "darta": ("fear", "anxiety"),
+    "darti": ("fear", "anxiety"), "khauf": ("fear", "anxiety"),
+    "udaas": ("sad", "sadness"), "udas": ("sad", "sadness"), "udasi": ("sad", "sadness"),
+    "udaasi": ("sad", "sadness"), "dukh": ("sad", "grief"),
+    "gham": ("sad", "grief"), "rona": ("cry", "sad"), "ro": ("cry", "sad"), "rone": ("cry", "sad"),
+    "akela": ("lonely", "loneliness"), "akeli": ("lonely", "loneliness"), "akele": ("lonely", "loneliness"),
+    "akeela": ("lonely", "loneliness"), "akelapan": ("lonely", "loneliness"),
+    "tanha": ("lonely", "loneliness"), "tanhai": ("lonely", "loneliness"),
+    "gussa": ("anger", "angry"), "ghussa": ("anger", "angry"), "ghusa": ("anger", "angry"), "gusse": ("anger", "angry"),
+    "thakan": ("tired", "exhausted"), "thaka": ("tired",), "thaki": ("tired",),
+    "saans": ("breath", "breathing"), "sans": ("breath", "breathing"),
+    "dost": ("friend",), "baat": ("talk",), "baatein": ("talk",),
+    "likhna": ("write", "journal"), "likho": ("write", "journal"), "likh": ("write", "journal"),
+    "sukoon": ("calm", "relax"), "sakoon": ("calm", "relax"),
+    "aram": ("rest", "relax"), "aaram": ("rest", "relax"), "araam": ("rest", "relax"),
+    "dhyan": ("meditation", "focus"), "imtihan": ("exam", "study"), "parhai": ("study",),
+    "kaam": ("work",), "naukri": ("job", "work"), "ghar": ("home", "family"),
+    "ammi": ("family",), "abbu": ("family",), "walid": ("family",), "rishta": ("relationship",),
+    "mushkil": ("difficult", "overwhelm"), "bojh": ("overwhelm", "burden"),
+    "dil": ("heart", "feelings"), "jazbaat": ("emotion", "feelings"), "ehsaas": ("feelings",),
+    "zindagi": ("life",), "khushi": ("happy", "joy"), "khush": ("happy", "joy"),
+}
+
+URDU_SCRIPT_GLOSS: Dict[str, Tuple[str, ...]] = {
+    "نیند": ("sleep",), "پریشان": ("worry", "anxiety", "stress"), "پریشانی": ("worry", "anxiety", "stress"),
+    "ڈر": ("fear", "anxiety"), "خوف": ("fear", "anxiety"), "گھبراہٹ": ("anxiety", "panic"),
+    "اداس": ("sad", "sadness"), "اداسی": ("sad", "sadness"), "دکھ": ("sad", "grief"), "غم": ("sad", "grief"),
+    "اکیلا": ("lonely", "loneliness"), "تنہا": ("lonely", "loneliness"), "تنہائی": ("lonely", "loneliness"),
+    "غصہ": ("anger", "angry"), "تھکن": ("tired", "exhausted"), "سانس": ("breath", "breathing"),
+    "دوست": ("friend",), "بات": ("talk",), "لکھنا": ("write", "journal"), "سکون": ("calm", "relax"),
+    "امتحان": ("exam", "study"), "کام": ("work",), "دل": ("heart", "feelings"), "خوش": ("happy", "joy"),
+}
+
+# Gloss terms that name distress or a symptom; words glossed to them (and not
+# to neutral terms like "home" or "friend") are what routing.py retrieves on
+DISTRESS_TERMS = frozenset({
+    "sleep", "awake", "worry", "anxiety", "stress", "panic", "fear", "sad", "sadness", "grief", "cry",
+    "lonely", "loneliness", "anger", "angry", "tired", "exhausted", "overwhelm", "burden", "exam",
+})
+
+
+def fold_roman(token: str) -> str:
+    """Spelling-variant key for a Roman Urdu token: "pareshaan" and "preshan" both -> "prshn"."""
+    token = _REPEATS.sub(r"\1", token)
+    token = re.sub(r"(ay|ai|ei|e)$", "e", token)
+    return _INNER_VOWELS.sub("", token).replace("w", "v").replace("q", "k")
+
+
+FOLD_MIN_LENGTH = 4
+FOLD_MIN_CONSONANTS = 3
+
+
+def foldable(token: str, key: str) -> bool:
+    """Whether `token` (folded to `key`) is distinctive enough for a folded lookup."""
+    return len(token) >= FOLD_MIN_LENGTH and sum(ch not in "aeiouy" for ch in key) >= FOLD_MIN_CONSONANTS
+
+
+_FOLDED_GLOSS: Dict[str, Tuple[str, ...]] = {}
+for _word, _terms in ROMAN_URDU_GLOSS.items():
+    _key = fold_roman(_word)
+    if foldable(_word, _key):
+        _FOLDED_GLOSS.setdefault(_key, _terms)
+
+
+_SUFFIXES = (("iness", "y"), ("ness", ""), ("ing", ""), ("ies", "y"), ("ied", "y"), ("ed", ""), ("es", ""), ("s", ""))
+
+
+def stem(token: str) -> str:
+    """Light English suffix strip ("sadness" -> "sad", "worries" -> "worry"); deliberately conservative."""
+    for suffix, replacement in _SUFFIXES:
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            # "stress", "less": a double s is not a plural
+            if suffix in ("s", "es") and token.endswith("ss"):
+                return token
+            return token[: -len(suffix)] + replacement
+    return token
+
+
+def roman_gloss(token: str):
+    """English terms for a Roman Urdu token: exact spelling first, then its folded key."""
+    gloss = ROMAN_URDU_GLOSS.get(token)
+    if gloss is None:
+        key = fold_roman(token)
+        if foldable(token, key):
+            gloss = _FOLDED_GLOSS.get(key)
+    return gloss
+
+
+def tokenize(text: str, roman_urdu: bool = False) -> List[str]:
+    """Index terms for `text`: English stems, Urdu-script words glossed to English.
+
+    With `roman_urdu` (the message was identified as Hinglish), Latin tokens are
+    glossed too. Folded keys are short ("dost" -> "dst"), so folding English
+    text would turn "dust" into "friend"; documents are never tokenized this way.
+    """
+    terms: List[str] = []
+    for token in _TOKEN.findall(text.lower()):
+        if token.isascii():
+            if token in STOPWORDS:
+                continue
+            gloss = roman_gloss(token) if roman_urdu else None
+        else:
+            gloss = URDU_SCRIPT_GLOSS.get(token)
+        if gloss:
+            terms.extend(stem(term) for term in gloss)
+        else:
+            terms.append(stem(token) if token.isascii() else token)
+    return terms
+
+
+class SparseHit(NamedTuple):
+    doc_id: int
+    score: float
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed document list (ids are list positions; empty entries are skipped)."""
+
+    def __init__(self, documents: Sequence[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, doc in enumerate(documents):
+            if not doc:
+                continue
+            terms = tokenize(doc)
+            lengths[doc_id] = len(terms)
+            for term in terms:
+                counts = postings.setdefault(term, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+        live = int(np.count_nonzero(lengths))
+        self.live_documents = live
+        avg_length = float(lengths.sum()) / live if live else 1.0
+        # Per-document length normalisation, folded into one array up front
+        self._norm = (k1 * (1 - b + b * lengths / avg_length)).astype(np.float32)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, counts in postings.items():
+            ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            tfs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            idf = math.log(1 + (live - len(counts) + 0.5) / (len(counts) + 0.5))
+            self._postings[term] = (ids, tfs, idf)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def search(self, query: str, k: int = 3, roman_urdu: bool = False) -> List[SparseHit]:
+        terms = [term for term in dict.fromkeys(tokenize(query, roman_urdu)) if term in self._postings]
+        if not terms:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in terms:
+            ids, tfs, idf = self._postings[term]
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [SparseHit(int(i), float(scores[i])) for i in top]
+
+    def coverage(self, query: str, roman_urdu: bool = False) -> float:
+        """Share of the query's terms that occur in the corpus (0 when nothing is indexable)."""
+        terms = set(tokenize(query, roman_urdu))
+        return sum(term in self._postings for term in terms) / len(terms) if terms else 0.0
@@ -1,27 +1,334 @@
-from sentence_transformers import SentenceTransformer
+"""
+Build the FAISS retrieval index from coping-technique documents.
+
+Documents are streamed from .jsonl files (one {"text": ..., "id": ...} object
+per line; "id" is optional) or plain .txt files (one document per line),
+encoded in batches and added to the index as they go, so memory stays flat as
+the corpus grows.
+
+Examples:
+    python build_index.py                                  # built-in seed documents
+    python build_index.py corpus/*.jsonl --index-type ivf --nlist 256 --nprobe 16
+    python build_index.py techniques.txt --index-type hnsw --hnsw-m 32 --ef-search 64
+
+Incremental updates (no full re-encode, no restart):
+    python build_index.py new_docs.jsonl --incremental           # add new / changed docs
+    python build_index.py corpus/*.jsonl --incremental --prune   # also drop docs no longer in the inputs
+
+Documents are tracked by key (the JSONL "id", else the content hash) in
+mind_docs.manifest.json; only keys that are new or whose content hash changed
+are embedded. Running workers pick up the new version within
+INDEX_RELOAD_INTERVAL seconds (see index_store.LiveIndex).
+
+Per-language shards (queries are routed by language identification):
+    python build_index.py corpus/urdu.jsonl --language urdu        # -> data/shards/urdu/
+    python build_index.py corpus/*.jsonl --language hinglish       # only records with "language": "hinglish"
+
+Non-English shards default to MULTILINGUAL_EMBEDDING_MODEL. A JSONL record's
+optional "language" field keeps it out of other languages' shards. English
+(or no --language) builds the default index directly in the output directory.
+
+Index types (all over L2-normalized embeddings, i.e. cosine similarity):
+    flat  IndexFlatIP    exact search, fine up to tens of thousands of documents
+    ivf   IndexIVFFlat   trained coarse quantizer; --nlist cells, --nprobe searched
+    hnsw  IndexHNSWFlat  graph search; --hnsw-m links, --ef-construction / --ef-search
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Iterable, Iterator, List, Tuple
+
 import faiss
 import numpy as np
-import os
+from sentence_transformers import SentenceTransformer
 
-# Create data directory if it doesn't exist
-os.makedirs("data", exist_ok=True)
+from index_store import (
+    DATA_DIR, DEFAULT_EMBEDDING_MODEL, MULTILINGUAL_EMBEDDING_MODEL, content_hash, index_paths,
+    read_documents as read_doc_store, read_manifest, read_meta, shard_dir, write_doc_store, write_manifest,
+    write_meta
+)
 
-documents = [
+LANGUAGES = ("english", "hinglish", "urdu")
+
+SEED_DOCUMENTS = [
     "Practice deep breathing to calm yourself.",
     "Try a 5-minute meditation to reduce anxiety.",
     "Write down your feelings to process your emotions.",
     "Talk to a friend or therapist if you're overwhelmed."
 ]
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
-embeddings = model.encode(documents, convert_to_tensor=False)
-index = faiss.IndexFlatL2(len(embeddings[0]))
-index.add(np.array(embeddings))
 
-faiss.write_index(index, "data/mind_index.faiss")
-with open("data/mind_docs.txt", "w") as f:
-    for doc in documents:
-        f.write(doc + "\n")
+def read_documents(paths: List[str], language: str = None) -> Iterator[Tuple[str, str]]:
+    """Stream (key, single-line document) pairs from .jsonl / .txt files.
+
+    With `language`, JSONL records tagged with another "language" are skipped.
+    """
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                key = None
+                if path.endswith(".jsonl"):
+                    record = json.loads(line)
+                    if language and record.get("language", language) != language:
+                        continue
+                    text = record.get("text") or record.get("content") or ""
+                    key = record.get("id")
+                else:
+                    text = line
+                # mind_docs.txt is line-oriented, so documents must be single-line
+                text = " ".join(text.split())
+                if text:
+                    yield (str(key) if key is not None else content_hash(text)), text
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode(model: SentenceTransformer, texts: List[str], batch_size: int) -> np.ndarray:
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_tensor=False, show_progress_bar=False)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def make_index(args, dim: int, n_train: int):
+    if args.index_type == "flat":
+        # ID-mapped so documents can later be removed without renumbering
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    if args.index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, args.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = args.ef_construction
+        return index
+    # FAISS wants ~39 training points per cell; shrink nlist for small corpora
+    nlist = max(1, min(args.nlist, n_train // 39 or 1))
+    if nlist != args.nlist:
+        print(f"  nlist reduced {args.nlist} -> {nlist} for {n_train} training vectors")
+        args.nlist = nlist
+    quantizer = faiss.IndexFlatIP(dim)
+    return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+
+
+def add_vectors(index, embeddings: np.ndarray, first_id: int) -> None:
+    ids = np.arange(first_id, first_id + len(embeddings), dtype=np.int64)
+    if isinstance(index, faiss.IndexHNSWFlat):
+        # HNSW numbers vectors sequentially, which already matches the line ids
+        index.add(embeddings)
+    else:
+        index.add_with_ids(embeddings, ids)
+
+
+def publish(index, documents: List[str], manifest: dict, meta: dict, output_dir: str, docs_file: str = None) -> None:
+    """Replace docs, index and manifest, then the sidecar last (the signal workers watch).
+
+    The documents come as a list, or as `docs_file`, a temporary file already
+    written next to the doc store (a full build streams them there).
+    """
+    paths = index_paths(output_dir)
+    previous = read_meta(output_dir) if os.path.exists(paths["meta"]) else {}
+    meta["version"] = int(previous.get("version", 0)) + 1
+
+    index_tmp = f"{paths['index']}.tmp"
+    faiss.write_index(index, index_tmp)
+    if documents is not None:
+        docs_tmp = f"{paths['docs']}.tmp"
+        with open(docs_tmp, "w", encoding="utf-8") as f:
+            for doc in documents:
+                f.write(doc + "\n")
+        os.replace(docs_tmp, paths["docs"])
+    elif docs_file is not None:
+        os.replace(docs_file, paths["docs"])
+    write_doc_store(output_dir)
+    os.replace(index_tmp, paths["index"])
+    write_manifest(manifest, output_dir)
+    write_meta(meta, output_dir)
+
+
+def build(args) -> None:
+    os.makedirs(args.output_dir, exist_ok=True)
+    paths = index_paths(args.output_dir)
+    if args.inputs:
+        documents = read_documents(args.inputs, args.language)
+    else:
+        documents = ((content_hash(doc), doc) for doc in SEED_DOCUMENTS)
+
+    model = SentenceTransformer(args.model)
+    dim = model.get_sentence_embedding_dimension()
+    train_size = args.train_size or args.nlist * 39
+
+    started = time.time()
+    index = None
+    # IVF only: vectors held back (ids 0..n-1) until the quantizer is trained
+    pending: List[np.ndarray] = []
+    count = 0
+    entries = {}
+
+    docs_tmp = f"{paths['docs']}.tmp"
+    with open(docs_tmp, "w", encoding="utf-8") as docs_out:
+        for batch in batched(documents, args.batch_size):
+            first_id = count
+            fresh = []
+            for key, doc in batch:
+                if key in entries:
+                    continue
+                docs_out.write(doc + "\n")
+                entries[key] = {"hash": content_hash(doc), "id": count}
+                fresh.append(doc)
+                count += 1
+            if not fresh:
+                continue
+            embeddings = encode(model, fresh, args.batch_size)
+
+            if args.index_type == "ivf" and index is None:
+                pending.append(embeddings)
+                if sum(len(p) for p in pending) < train_size:
+                    continue
+                embeddings = np.vstack(pending)
+                first_id = 0
+                pending = []
+                index = make_index(args, dim, len(embeddings))
+                index.train(embeddings)
+            elif index is None:
+                index = make_index(args, dim, 0)
+
+            add_vectors(index, embeddings, first_id)
+            print(f"  encoded {count} documents ({time.time() - started:.1f}s)")
+
+        if pending:
+            embeddings = np.vstack(pending)
+            index = make_index(args, dim, len(embeddings))
+            index.train(embeddings)
+            add_vectors(index, embeddings, 0)
+
+    if index is None or count == 0:
+        os.remove(docs_tmp)
+        raise SystemExit("No documents found in the given inputs.")
+
+    meta = {
+        "index_type": args.index_type,
+        "metric": "ip",
+        "normalize": True,
+        "model": args.model,
+        "language": args.language or "english",
+        "dim": dim,
+        "count": count,
+        "tombstones": 0,
+        "built_at": int(time.time()),
+    }
+    if args.index_type == "ivf":
+        meta.update({"nlist": args.nlist, "nprobe": min(args.nprobe, args.nlist)})
+    elif args.index_type == "hnsw":
+        meta.update({"hnsw_m": args.hnsw_m, "ef_construction": args.ef_construction, "ef_search": args.ef_search})
+    # The streamed docs go live together with the index, never ahead of it
+    publish(index, None, {"entries": entries, "next_id": count}, meta, args.output_dir, docs_file=docs_tmp)
+
+    print(f"✓ {args.index_type} FAISS index with {count} documents saved to {args.output_dir}/ "
+          f"({time.time() - started:.1f}s)")
+
+
+def sync(args) -> None:
+    """Embed only new/changed documents and add/remove them in the existing index."""
+    paths = index_paths(args.output_dir)
+    manifest = read_manifest(args.output_dir)
+    if manifest is None or not os.path.exists(paths["index"]):
+        raise SystemExit("No manifest/index found - run a full build first (without --incremental).")
+
+    meta = read_meta(args.output_dir)
+    index = faiss.read_index(paths["index"])
+    documents = read_doc_store(args.output_dir)
+    entries = manifest["entries"]
+    next_id = int(manifest["next_id"])
+
+    seen = set()
+    to_add: List[Tuple[str, str]] = []
+    to_remove: List[int] = []
+    sources = read_documents(args.inputs, args.language) if args.inputs else ((content_hash(d), d) for d in SEED_DOCUMENTS)
+    for key, doc in sources:
+        if key in seen:
+            continue
+        seen.add(key)
+        entry = entries.get(key)
+        if entry is not None and entry["hash"] == content_hash(doc):
+            continue
+        if entry is not None:
+            to_remove.append(entry["id"])
+        to_add.append((key, doc))
+
+    if args.prune:
+        to_remove.extend(entry["id"] for key, entry in entries.items() if key not in seen)
+
+    if not to_add and not to_remove:
+        print("✓ Index already up to date")
+        return
+
+    if to_remove:
+        removed_ids = set(to_remove)
+        if isinstance(index, faiss.IndexHNSWFlat):
+            # HNSW cannot delete vectors; the emptied doc line filters them out at query time
+            meta["tombstones"] = int(meta.get("tombstones", 0)) + len(removed_ids)
+        else:
+            index.remove_ids(np.array(sorted(removed_ids), dtype=np.int64))
+        for doc_id in removed_ids:
+            documents[doc_id] = ""
+        entries = {key: entry for key, entry in entries.items() if entry["id"] not in removed_ids}
+
+    model = SentenceTransformer(meta["model"])
+    for batch in batched(to_add, args.batch_size):
+        embeddings = encode(model, [doc for _, doc in batch], args.batch_size)
+        add_vectors(index, embeddings, next_id)
+        for key, doc in batch:
+            documents.append(doc)
+            entries[key] = {"hash": content_hash(doc), "id": next_id}
+            next_id += 1
+
+    meta["count"] = len(entries)
+    meta["updated_at"] = int(time.time())
+    publish(index, documents, {"entries": entries, "next_id": next_id}, meta, args.output_dir)
+    print(f"✓ Index updated: +{len(to_add)} / -{len(set(to_remove))} documents "
+          f"({len(entries)} live, version {meta['version']})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the FAISS index for mind-backend retrieval")
+    parser.add_argument("inputs", nargs="*", help=".jsonl / .txt document files (default: built-in seed docs)")
+    parser.add_argument("--output-dir", default=DATA_DIR)
+    parser.add_argument("--model", default=None,
+                        help=f"embedding model (default {DEFAULT_EMBEDDING_MODEL}; "
+                             f"{MULTILINGUAL_EMBEDDING_MODEL} for non-English shards)")
+    parser.add_argument("--language", choices=LANGUAGES, default=None,
+                        help="build the shard for this language (non-English shards go to <output-dir>/shards/<language>)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--index-type", choices=["flat", "ivf", "hnsw"], default="flat")
+    parser.add_argument("--nlist", type=int, default=100, help="IVF cells")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF cells searched per query")
+    parser.add_argument("--train-size", type=int, default=0, help="IVF training vectors (default nlist*39)")
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--incremental", action="store_true",
+                        help="update the existing index instead of rebuilding it")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --incremental: remove documents missing from the inputs")
+    args = parser.parse_args(argv)
+    if args.language and args.language != "english":
+        args.output_dir = shard_dir(args.language, args.output_dir)
+        args.model = args.model or MULTILINGUAL_EMBEDDING_MODEL
+    args.model = args.model or DEFAULT_EMBEDDING_MODEL
+    return args
 
-print("✓ FAISS index and documents saved to data/ folder")
 
+if __name__ == "__main__":
+    args = parse_args()
+    sync(args) if args.incremental else build(args)
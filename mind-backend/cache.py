@@ -0,0 +1,127 @@
+"""
+Bounded in-process caches for expensive per-message calls.
+
+TTLCache is a thread-safe LRU with a time-to-live and an approximate memory
+cap. app.py puts one in front of emotion detection and one in front of FAISS
+retrieval; both report hit/miss counters in /api/health.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = ".,!?;:'\"()[]{}"
+
+
+def normalize_text(text: str) -> str:
+    """Cache key for a message: lower-cased, whitespace-collapsed, edge punctuation stripped."""
+    return _WHITESPACE.sub(" ", text.lower()).strip().strip(_EDGE_PUNCTUATION).strip()
+
+
+def approx_size(obj: Any) -> int:
+    """Rough deep size in bytes of the small JSON-like values we cache."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item) for item in obj)
+    return size
+
+
+class TTLCache:
+    """LRU cache with per-entry TTL, an entry limit and a memory cap."""
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: float = 3600.0,
+                 max_bytes: int = 8 * 1024 * 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, max_entries: int = 1024, ttl: float = 3600.0,
+                 max_bytes: int = 8 * 1024 * 1024) -> "TTLCache":
+        """Build a cache configured by <PREFIX>_CACHE_SIZE / _CACHE_TTL / _CACHE_MAX_BYTES."""
+        return cls(
+            name,
+            max_entries=int(os.environ.get(f"{prefix}_CACHE_SIZE", max_entries)),
+            ttl=float(os.environ.get(f"{prefix}_CACHE_TTL", ttl)),
+            max_bytes=int(os.environ.get(f"{prefix}_CACHE_MAX_BYTES", max_bytes)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        size = approx_size(key) + approx_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,48 @@
+"""
+Helpers for combining several retrieval results into one context list.
+
+- weighted_mean: fold several query embeddings (e.g. the last few conversation
+  turns) into one unit vector, so a single FAISS search covers the window.
+- reciprocal_rank_fusion: merge ranked lists from separate searches; a document
+  scores sum(weight / (RRF_K + rank)) over the lists it appears in.
+- dedupe_by_prefix: drop near-duplicate documents sharing their first characters
+  (the same technique indexed from two sources), as app_old_complex.py did.
+"""
+
+from typing import Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+RRF_K = 60
+DEDUPE_PREFIX = 50
+
+
+def dedupe_by_prefix(documents: Iterable[str], prefix: int = DEDUPE_PREFIX) -> List[str]:
+    seen = set()
+    unique = []
+    for doc in documents:
+        key = doc[:prefix]
+        if key not in seen:
+            seen.add(key)
+            unique.append(doc)
+    return unique
+
+
+def weighted_mean(vectors: Sequence, weights: Sequence[float]) -> np.ndarray:
+    """Weighted mean of L2-normalised vectors, renormalised (float32, 1-D)."""
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1.0, norms)
+    combined = np.asarray(weights, dtype=np.float32) @ matrix
+    norm = float(np.linalg.norm(combined))
+    return combined / norm if norm else combined
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Tuple[float, Sequence[Hashable]]], limit: int,
+                           k: int = RRF_K) -> List[Hashable]:
+    """Fuse (weight, ranked items) lists; returns the top `limit` items by fused score."""
+    scores = {}
+    for weight, ranked in rankings:
+        for rank, item in enumerate(ranked):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
@@ -0,0 +1,35 @@
+"""
+Gunicorn settings for mind-backend (picked up automatically by `gunicorn app:app`).
+
+With preload_app the master imports app.py once - FAISS index (mmapped),
+document store (mmapped) and the SentenceTransformer weights - and forks the
+workers afterwards, so those pages are shared copy-on-write instead of being
+loaded again by every worker.
+
+Environment:
+    PORT                 listen port (default 5000)
+    WEB_CONCURRENCY      worker processes (default 2)
+    GUNICORN_THREADS     threads per worker (default 4)
+    GUNICORN_PRELOAD     "1" to load resources in the master before forking (default)
+    GUNICORN_TIMEOUT     worker timeout in seconds (default 60)
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+if preload_app:
+    # Load models synchronously in the master: warm-up threads would not survive fork()
+    os.environ.setdefault("WARMUP_MODE", "eager")
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far into the permanent generation so the
+    # cyclic GC in the workers never touches (and so never copies) those pages
+    if preload_app:
+        gc.freeze()
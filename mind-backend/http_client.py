@@ -0,0 +1,141 @@
+"""
+Shared, pooled HTTP client for outbound calls (Hugging Face Inference API).
+
+Every gunicorn worker gets one requests.Session with keep-alive connection
+pooling, so chat requests reuse TCP+TLS connections instead of paying a new
+handshake per message. 503 "model loading" responses are retried with
+exponential backoff (honouring Retry-After), but only within the call's
+`timeout`: each attempt gets what is left of it, so a call never outlasts the
+(adaptive) timeout its circuit breaker set, retries and backoff included.
+
+Environment:
+    HTTP_POOL_SIZE        connections kept alive per host, per worker (default 10)
+    HTTP_MAX_RETRIES      retries on 503 responses (default 3)
+    HTTP_BACKOFF_FACTOR   backoff base in seconds (default 0.5)
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "10"))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", "0.5"))
+
+
+def retry_delay(retry_after: Optional[str], attempt: int, backoff_factor: float = HTTP_BACKOFF_FACTOR) -> float:
+    """Retry-After when the server sends seconds, else exponential backoff."""
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return backoff_factor * (2 ** attempt)
+
+
+class PooledHTTPClient:
+    """Process-wide requests.Session with pooling, retries and usage stats."""
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_factor: float = HTTP_BACKOFF_FACTOR):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._pid = None
+        self._in_flight = 0
+        self._requests = 0
+        self._retries = 0
+        self._errors = 0
+
+    def _build_session(self):
+        # No urllib3 Retry: it would restart the full timeout on every attempt
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=0,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session, adapter
+
+    @property
+    def session(self) -> requests.Session:
+        # Sockets must not be shared across fork(), so a worker forked from a
+        # preloaded master builds its own session on first use.
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session, self._adapter = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method: str, url: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """Send a request, retrying 503s while `timeout` (seconds, for the whole call) allows."""
+        session = self.session
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._in_flight += 1
+            self._requests += 1
+        try:
+            attempt = 0
+            while True:
+                remaining = max(0.001, deadline - time.monotonic()) if deadline else None
+                resp = session.request(method, url, timeout=remaining, **kwargs)
+                if resp.status_code != 503 or attempt >= self.max_retries:
+                    return resp
+                delay = retry_delay(resp.headers.get("Retry-After"), attempt, self.backoff_factor)
+                if deadline and time.monotonic() + delay >= deadline:
+                    return resp
+                resp.close()
+                time.sleep(delay)
+                attempt += 1
+                with self._lock:
+                    self._retries += 1
+        except requests.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool-level stats used to size HTTP_POOL_SIZE under load."""
+        connections = 0
+        pooled_requests = 0
+        adapter = self._adapter
+        if adapter is not None and self._pid == os.getpid():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                connections += getattr(pool, "num_connections", 0)
+                pooled_requests += getattr(pool, "num_requests", 0)
+
+        reuse_ratio = 1 - connections / pooled_requests if pooled_requests else 0.0
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self._in_flight,
+            "requests": self._requests,
+            "connections_opened": connections,
+            "reuse_ratio": round(max(0.0, reuse_ratio), 3),
+            "retries": self._retries,
+            "errors": self._errors,
+        }
+
+
+http_client = PooledHTTPClient()
@@ -0,0 +1,330 @@
+"""
+On-disk layout of the FAISS retrieval index, shared by build_index.py and app.py.
+
+    data/mind_index.faiss       FAISS index (flat, IVF or HNSW)
+    data/mind_docs.txt          one document per line; line number == FAISS id
+    data/mind_index.meta.json   sidecar: index type, metric, embedding model, search params
+    data/mind_docs.manifest.json  document key -> {content hash, FAISS id}, for incremental updates
+    data/mind_docs.bin          documents as concatenated UTF-8 (memory-mapped at runtime)
+    data/mind_docs.offsets.npy  uint64 byte offsets into mind_docs.bin (n + 1 entries)
+
+Per-language shards (`build_index.py --language urdu`) use the same layout in
+data/shards/<language>/, usually with a multilingual embedding model; the
+files directly under data/ are the default (English) index.
+
+An index without a sidecar is treated as the original IndexFlatL2 over raw
+MiniLM embeddings, so older data/ folders keep working.
+
+Removed documents leave an empty line behind (a tombstone) so ids never shift.
+build_index.py publishes a new version by replacing docs, index and manifest
+and writing the sidecar last; LiveIndex notices the sidecar change and swaps
+the whole snapshot in one reference assignment. A version built with another
+embedding model is not swapped in (queries are encoded with the model loaded
+at startup); switching models takes a restart.
+
+The FAISS index is opened with IO_FLAG_MMAP and documents are read through a
+memory-mapped offset table, so gunicorn workers (especially with preload_app,
+see gunicorn.conf.py) share the same physical pages instead of each holding a
+private copy.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from fusion import dedupe_by_prefix
+
+DATA_DIR = "data"
+INDEX_FILE = "mind_index.faiss"
+DOCS_FILE = "mind_docs.txt"
+META_FILE = "mind_index.meta.json"
+MANIFEST_FILE = "mind_docs.manifest.json"
+DOCS_BIN_FILE = "mind_docs.bin"
+DOCS_OFFSETS_FILE = "mind_docs.offsets.npy"
+SHARDS_DIR = "shards"
+
+# Memory-map the FAISS index and document store instead of copying them into each worker
+INDEX_MMAP = os.environ.get("INDEX_MMAP", "1") == "1"
+
+# How often (seconds) workers check the sidecar for a newly published index; 0 disables
+INDEX_RELOAD_INTERVAL = float(os.environ.get("INDEX_RELOAD_INTERVAL", "5"))
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Compact (118M parameters, 384-d) model covering Urdu; default for non-English shards
+MULTILINGUAL_EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+
+LEGACY_META = {
+    "index_type": "flat_l2",
+    "metric": "l2",
+    "normalize": False,
+    "model": DEFAULT_EMBEDDING_MODEL,
+}
+
+
+def index_paths(data_dir: str = DATA_DIR) -> Dict[str, str]:
+    return {
+        "index": os.path.join(data_dir, INDEX_FILE),
+        "docs": os.path.join(data_dir, DOCS_FILE),
+        "meta": os.path.join(data_dir, META_FILE),
+        "manifest": os.path.join(data_dir, MANIFEST_FILE),
+        "docs_bin": os.path.join(data_dir, DOCS_BIN_FILE),
+        "docs_offsets": os.path.join(data_dir, DOCS_OFFSETS_FILE),
+    }
+
+
+def shard_dir(language: str, data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, SHARDS_DIR, language)
+
+
+def available_shards(data_dir: str = DATA_DIR) -> List[str]:
+    """Languages with a built shard under data/shards/."""
+    root = os.path.join(data_dir, SHARDS_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        language for language in os.listdir(root)
+        if all(os.path.exists(path) for key, path in index_paths(shard_dir(language, data_dir)).items()
+               if key in ("index", "docs"))
+    )
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def read_meta(data_dir: str = DATA_DIR) -> Dict[str, Any]:
+    path = index_paths(data_dir)["meta"]
+    if not os.path.exists(path):
+        return dict(LEGACY_META)
+    with open(path, "r") as f:
+        meta = json.load(f)
+    return {**LEGACY_META, **meta}
+
+
+def _write_json(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def write_meta(meta: Dict[str, Any], data_dir: str = DATA_DIR) -> None:
+    _write_json(index_paths(data_dir)["meta"], meta)
+
+
+def read_manifest(data_dir: str = DATA_DIR) -> Optional[Dict[str, Any]]:
+    path = index_paths(data_dir)["manifest"]
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest: Dict[str, Any], data_dir: str = DATA_DIR) -> None:
+    _write_json(index_paths(data_dir)["manifest"], manifest)
+
+
+def read_documents(data_dir: str = DATA_DIR) -> List[str]:
+    with open(index_paths(data_dir)["docs"], "r", encoding="utf-8") as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def write_doc_store(data_dir: str = DATA_DIR) -> int:
+    """Convert mind_docs.txt into the offset-indexed binary store; returns the document count."""
+    paths = index_paths(data_dir)
+    offsets = [0]
+    bin_tmp = f"{paths['docs_bin']}.tmp"
+    with open(paths["docs"], "r", encoding="utf-8") as src, open(bin_tmp, "wb") as dst:
+        for line in src:
+            encoded = line.strip().encode("utf-8")
+            dst.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+    offsets_tmp = f"{paths['docs_offsets']}.tmp.npy"
+    np.save(offsets_tmp, np.asarray(offsets, dtype=np.uint64))
+    os.replace(bin_tmp, paths["docs_bin"])
+    os.replace(offsets_tmp, paths["docs_offsets"])
+    return len(offsets) - 1
+
+
+class MmapDocStore:
+    """Read-only, list-like view over mind_docs.bin; nothing is decoded until indexed."""
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        paths = index_paths(data_dir)
+        self._offsets = np.load(paths["docs_offsets"], mmap_mode="r")
+        with open(paths["docs_bin"], "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap cannot map an empty file
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._data[start:end].decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def open_documents(data_dir: str = DATA_DIR):
+    """Memory-mapped store when it is present and current, else the plain-text list."""
+    paths = index_paths(data_dir)
+    if INDEX_MMAP and os.path.exists(paths["docs_bin"]) and os.path.exists(paths["docs_offsets"]):
+        if os.stat(paths["docs_offsets"]).st_mtime_ns >= os.stat(paths["docs"]).st_mtime_ns:
+            return MmapDocStore(data_dir)
+    return read_documents(data_dir)
+
+
+def apply_search_params(index, meta: Dict[str, Any]) -> None:
+    """Restore query-time knobs (nprobe / efSearch) that FAISS does not persist."""
+    import faiss
+
+    index_type = meta.get("index_type")
+    if index_type == "ivf" and meta.get("nprobe"):
+        faiss.extract_index_ivf(index).nprobe = int(meta["nprobe"])
+    elif index_type == "hnsw" and meta.get("ef_search"):
+        index.hnsw.efSearch = int(meta["ef_search"])
+
+
+def read_index_file(path: str, use_mmap: bool = INDEX_MMAP):
+    """faiss.read_index, memory-mapped where the index type supports it."""
+    import faiss
+
+    if use_mmap:
+        flag_sets = [faiss.IO_FLAG_MMAP]
+        if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            # Zero-copy flat codes (newer FAISS); IVF rejects the combination
+            flag_sets.insert(0, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_MMAP_IFC)
+        for flags in flag_sets:
+            try:
+                return faiss.read_index(path, flags)
+            except RuntimeError:
+                continue
+    return faiss.read_index(path)
+
+
+def load_index(data_dir: str = DATA_DIR):
+    """Read the FAISS index and its sidecar, with search params applied."""
+    meta = read_meta(data_dir)
+    index = read_index_file(index_paths(data_dir)["index"])
+    apply_search_params(index, meta)
+    return index, meta
+
+
+def prepare_queries(embeddings, meta: Dict[str, Any]) -> np.ndarray:
+    """Shape query embeddings the way the index was built (float32, L2-normalized for IP)."""
+    queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    if meta.get("normalize"):
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.maximum(norms, 1e-12)
+    return queries
+
+
+def search_snapshot(snapshot: "IndexSnapshot", query_embedding, k: int) -> List[str]:
+    """Top-k documents for one query embedding (shared by app.py and retrieval_server.py)."""
+    documents = snapshot.documents
+    # Over-fetch: removed documents (empty lines) and near-duplicates are dropped below
+    _, indices = snapshot.index.search(prepare_queries(query_embedding, snapshot.meta), k * 2)
+    results = []
+    for idx in indices[0]:
+        # IVF/HNSW pad missing neighbours with -1
+        if 0 <= idx < len(documents) and documents[idx]:
+            results.append(documents[idx])
+    return dedupe_by_prefix(results)[:k]
+
+
+class IndexSnapshot(NamedTuple):
+    index: Any
+    documents: Sequence[str]  # list or MmapDocStore
+    meta: Dict[str, Any]
+
+    @property
+    def version(self) -> int:
+        return int(self.meta.get("version", 0))
+
+
+def load_snapshot(data_dir: str = DATA_DIR) -> IndexSnapshot:
+    index, meta = load_index(data_dir)
+    return IndexSnapshot(index, open_documents(data_dir), meta)
+
+
+class LiveIndex:
+    """Serves the current IndexSnapshot and hot-swaps it when a new version is published."""
+
+    def __init__(self, data_dir: str = DATA_DIR, check_interval: float = INDEX_RELOAD_INTERVAL):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._stamp = None
+        self._next_check = 0.0
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def _published_stamp(self):
+        paths = index_paths(self.data_dir)
+        try:
+            return os.stat(paths["meta"]).st_mtime_ns
+        except FileNotFoundError:
+            try:
+                return os.stat(paths["index"]).st_mtime_ns
+            except FileNotFoundError:
+                return None
+
+    def load(self) -> IndexSnapshot:
+        stamp = self._published_stamp()
+        self._snapshot = load_snapshot(self.data_dir)
+        self._stamp = stamp
+        return self._snapshot
+
+    def current(self) -> Optional[IndexSnapshot]:
+        """Current snapshot; at most every check_interval seconds, look for a newer one."""
+        if self.check_interval > 0 and self._snapshot is not None:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.check_interval
+                stamp = self._published_stamp()
+                if stamp is not None and stamp != self._stamp:
+                    self._start_reload(stamp)
+        return self._snapshot
+
+    def _start_reload(self, stamp) -> None:
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        # Requests keep using the old snapshot while the new one loads
+        threading.Thread(target=self._reload, args=(stamp,), name="index-reload", daemon=True).start()
+
+    def _reload(self, stamp) -> None:
+        try:
+            snapshot = load_snapshot(self.data_dir)
+            current_model = self._snapshot.meta.get("model") if self._snapshot else None
+            if current_model and snapshot.meta.get("model") != current_model:
+                # The loaded SentenceTransformer (and cached query vectors) belong to
+                # the old model: its queries would be meaningless against these vectors
+                print(f"⚠️ FAISS index version {snapshot.version} was built with {snapshot.meta.get('model')}, "
+                      f"not {current_model}; keeping version {self._snapshot.version} until a restart")
+                self._stamp = stamp
+                return
+            self._snapshot = snapshot
+            self._stamp = stamp
+            print(f"✓ FAISS index hot-swapped to version {snapshot.version} ({len(snapshot.documents)} slots)")
+        except Exception as e:
+            print(f"⚠️ FAISS index reload failed, keeping version "
+                  f"{self._snapshot.version if self._snapshot else '-'}: {e}")
+            self._stamp = stamp
+        finally:
+            self._reloading = False
@@ -0,0 +1,77 @@
+"""
+Language identification for English / Roman Urdu (Hinglish) / Urdu script.
+
+Runs on every request before anything else, so it is built for speed:
+- Arabic-script (Urdu) and Devanagari code points are counted in bulk with a
+  str.translate() deletion table (one C-level pass) instead of a Python loop.
+- Roman Urdu is detected by whole-token lookups in a frozenset lexicon, so
+  "yr" no longer matches inside "your", nor "hai" inside "chair".
+- Results carry a confidence score. They are not memoized: a cache keyed on
+  the text would keep users' messages in memory, and one pass is cheap.
+"""
+
+import re
+from typing import Iterable, List, NamedTuple
+
+# Arabic (incl. Urdu letters), Arabic Supplement, Arabic Presentation Forms, Devanagari
+_SCRIPT_RANGES = [(0x0600, 0x06FF), (0x0750, 0x077F), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF), (0x0900, 0x097F)]
+_DELETE_SCRIPT = {cp: None for start, end in _SCRIPT_RANGES for cp in range(start, end + 1)}
+
+_LATIN_TOKEN = re.compile(r"[a-z]+")
+
+# Whole-token Roman Urdu / Hinglish markers; English homographs ("main", "to",
+# "ho", "na") are left out on purpose
+HINGLISH_LEXICON = frozenset("""
+    yaar yr hai hain kya acha accha achha theek thik dekho suno mujhe tumhe mujhse tumse
+    nahi nahin bohat bohot bahut kaise kaisay kessay kyun kyunke kyunki kuch sab abhi
+    mera meri mere tera teri tumhara tumhari hamara apna apni bhi lekin magar phir
+    karna karo karta karti raha rahi rahe gaya gayi hua hui hoga hogi dil pareshan udaas
+    khush dost zindagi samajh pata chahiye sakta sakti wala wali haan jee ji shukriya
+""".split())
+
+# Share of characters in Urdu/Devanagari script above which a message is "urdu"
+URDU_SCRIPT_THRESHOLD = 0.3
+
+
+class LanguageResult(NamedTuple):
+    language: str  # "english" | "hinglish" | "urdu"
+    confidence: float
+    script_ratio: float
+    lexicon_hits: int
+
+
+def script_char_count(text: str) -> int:
+    """Number of Urdu/Devanagari code points, counted in one translate() pass."""
+    return len(text) - len(text.translate(_DELETE_SCRIPT))
+
+
+def identify_language(text: str) -> LanguageResult:
+    if not text:
+        return LanguageResult("english", 0.0, 0.0, 0)
+
+    # Most traffic is plain ASCII, which cannot contain script characters
+    script_chars = 0 if text.isascii() else script_char_count(text)
+    script_ratio = script_chars / len(text)
+
+    tokens = _LATIN_TOKEN.findall(text.lower())
+    hits = sum(map(HINGLISH_LEXICON.__contains__, tokens))
+    hit_ratio = hits / len(tokens) if tokens else 0.0
+
+    if script_ratio > URDU_SCRIPT_THRESHOLD:
+        confidence = min(1.0, 0.6 + script_ratio * 0.4)
+        language = "urdu"
+    elif hits or script_chars:
+        # One marker word in a long English sentence is weak evidence
+        confidence = min(1.0, 0.5 + hit_ratio * 1.5 + (0.2 if script_chars else 0.0))
+        language = "hinglish"
+    else:
+        # Short messages give little evidence either way
+        confidence = min(1.0, 0.5 + 0.1 * len(tokens))
+        language = "english"
+
+    return LanguageResult(language, round(confidence, 2), round(script_ratio, 3), hits)
+
+
+def identify_languages(texts: Iterable[str]) -> List[LanguageResult]:
+    """Batch form of identify_language."""
+    return [identify_language(text) for text in texts]
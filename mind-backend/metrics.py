@@ -0,0 +1,225 @@
+"""
+Lightweight in-process metrics (no external dependencies).
+
+Histograms and counters register themselves in REGISTRY, which renders them in
+the Prometheus text exposition format for the /metrics endpoint. Values are
+per process: under gunicorn each worker exports its own series.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Latency buckets in seconds, tuned for sub-millisecond to multi-second stages
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+METRIC_PREFIX = "mind_"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Registry:
+    """Set of metrics rendered together in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric) -> None:
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            name = METRIC_PREFIX + metric.name
+            lines.append(f"# HELP {name} {metric.help or metric.name}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(name))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect plus two additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS, help: str = "",
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def observe(self, value: float) -> None:
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Cumulative bucket counts (Prometheus-style) plus count/sum/mean."""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = {}
+        running = 0
+        for bound, c in zip(self.buckets, counts):
+            running += c
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + counts[-1]
+        return {
+            "buckets": cumulative,
+            "count": count,
+            "sum": round(total, 6),
+            "mean": round(total / count, 6) if count else 0.0,
+        }
+
+    def render(self, name: str, label_names: Sequence[str] = (), label_values: Sequence[str] = ()) -> List[str]:
+        snap = self.snapshot()
+        lines = [
+            "%s_bucket%s %d" % (name, _labels(label_names, label_values, 'le="%s"' % bound), count)
+            for bound, count in snap["buckets"].items()
+        ]
+        lines.append(f"{name}_sum{_labels(label_names, label_values)} {snap['sum']}")
+        lines.append(f"{name}_count{_labels(label_names, label_values)} {snap['count']}")
+        return lines
+
+
+class LabeledHistogram:
+    """Histogram family keyed by label values, e.g. stage latency by stage name."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS,
+                 help: str = "", registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.name, self.buckets, registry=None))
+        return child
+
+    def observe(self, value: float, *values: str) -> None:
+        self.labels(*values).observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"/".join(values): child.snapshot() for values, child in list(self._children.items())}
+
+    def render(self, name: str) -> List[str]:
+        lines: List[str] = []
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(name, self.label_names, values))
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels, e.g. fallbacks by stage and cause."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, label_names: Sequence[str] = (), help: str = "",
+                 registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def inc(self, *values: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"/".join(values) or "total": value for values, value in self._values.items()}
+
+    def render(self, name: str) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{name}{_labels(self.label_names, values)} {value}" for values, value in items]
+
+
+class Gauge:
+    """Value read from a callback at render time (queue depths, cache sizes)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, read: Callable[[], float], help: str = "", registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.read = read
+        if registry is not None:
+            registry.register(self)
+
+    def render(self, name: str) -> List[str]:
+        try:
+            return [f"{name} {float(self.read())}"]
+        except Exception:
+            return []
+
+
+class Trace:
+    """Per-request stage timer: each span is kept for the response and observed
+    in a LabeledHistogram keyed by stage (a perf_counter pair per stage)."""
+
+    def __init__(self, histogram: LabeledHistogram):
+        self.histogram = histogram
+        self.timings: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds, 4)
+        self.histogram.observe(seconds, stage)
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def wrap(self, stage: str, fn: Callable) -> Callable:
+        """`fn` timed as `stage` wherever it runs (e.g. on a pipeline thread)."""
+        def run(*args, **kwargs):
+            with self.span(stage):
+                return fn(*args, **kwargs)
+        return run
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
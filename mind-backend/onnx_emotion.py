@@ -0,0 +1,165 @@
+"""
+Local ONNX (int8 quantized) backend for emotion detection.
+
+The fine-tuned XLM-R emotion model (the one pushed by upload_to_huggingface.py)
+is exported once to ONNX and dynamically quantized to int8. At runtime only
+onnxruntime and the fast `tokenizers` library are needed - no torch, no
+network - which keeps CPU inference well under 50 ms per message.
+
+Export (needs torch + transformers, run once on a dev machine):
+    python onnx_emotion.py export --model zainabkhan9118/RomanUrduEmotions --output models/emotion-onnx
+
+Use it in app.py:
+    EMOTION_BACKEND=onnx ONNX_EMOTION_MODEL_DIR=models/emotion-onnx gunicorn app:app
+"""
+
+import argparse
+import json
+import os
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+ONNX_MODEL_FILE = "model.int8.onnx"
+ONNX_MAX_LENGTH = int(os.environ.get("ONNX_EMOTION_MAX_LENGTH", "128"))
+ONNX_THREADS = int(os.environ.get("ONNX_EMOTION_THREADS", "1"))
+
+
+def export_onnx(model_name: str, output_dir: str, opset: int = 14) -> str:
+    """Export a Hugging Face sequence-classification model to int8 ONNX."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["i feel so sad today"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+
+    int8_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+    # tokenizer.json + config.json (id2label) are all the runtime needs
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+
+    size_mb = os.path.getsize(int8_path) / (1024 * 1024)
+    print(f"✓ Exported {model_name} to {int8_path} ({size_mb:.1f} MB, int8)")
+    return int8_path
+
+
+class OnnxEmotionClassifier:
+    """Lazily loaded onnxruntime emotion classifier."""
+
+    def __init__(self, model_dir: str):
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+        self._session = None
+        self._tokenizer = None
+        self._labels: List[str] = []
+        self._input_names = set()
+        self._load_error = None
+
+    def _load(self):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(self.model_dir, "config.json"), "r") as f:
+            config = json.load(f)
+        id2label = config.get("id2label", {})
+        self._labels = [id2label.get(str(i), id2label.get(i, str(i))) for i in range(len(id2label))]
+
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        pad_id = config.get("pad_token_id", 1)
+        tokenizer.enable_truncation(max_length=ONNX_MAX_LENGTH)
+        tokenizer.enable_padding(pad_id=pad_id, pad_token=tokenizer.id_to_token(pad_id) or "<pad>")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_THREADS
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(
+            os.path.join(self.model_dir, ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in session.get_inputs()}
+        self._tokenizer = tokenizer
+        self._session = session
+        print(f"✓ ONNX emotion model loaded from {self.model_dir} ({len(self._labels)} labels)")
+
+    @property
+    def available(self) -> bool:
+        """Load on first use; a failed load is reported once and not retried."""
+        if self._session is not None:
+            return True
+        if self._load_error is not None:
+            return False
+        with self._lock:
+            if self._session is None and self._load_error is None:
+                try:
+                    self._load()
+                except Exception as e:
+                    self._load_error = str(e)
+                    print(f"⚠️ ONNX emotion model unavailable ({e})")
+        return self._session is not None
+
+    @property
+    def load_error(self):
+        return self._load_error
+
+    def classify(self, texts: List[str]) -> List[List[Dict[str, float]]]:
+        """Return [{label, score}, ...] per text, like the HF text-classification pipeline."""
+        if not self.available:
+            raise RuntimeError(f"ONNX emotion model unavailable: {self._load_error}")
+
+        encodings = self._tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self._input_names}
+        logits = self._session.run(None, feeds)[0]
+
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return [
+            [{"label": label, "score": float(score)} for label, score in zip(self._labels, row)]
+            for row in probs
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the emotion model to int8 ONNX")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export + quantize a Hugging Face model")
+    export.add_argument("--model", default=os.environ.get("HF_MODEL", "zainabkhan9118/RomanUrduEmotions"))
+    export.add_argument("--output", default="models/emotion-onnx")
+    export.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(args.model, args.output, opset=args.opset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Client-side rate limiter for the Gemini free tier (15 RPM, 1M TPM, 200 RPD).
+
+Three limits are enforced before a request leaves the process:
+- requests per minute and tokens per minute, as token buckets whose burst plus
+  refill never exceeds the quota in any 60s window;
+- requests per day, as a counter that resets at midnight US Pacific time,
+  when Gemini's daily quota does (GEMINI_QUOTA_TIMEZONE).
+
+Bucket state lives in a small JSON file guarded by fcntl.flock, so every
+gunicorn worker on the host draws from the same quota. Where the file cannot be
+used (no fcntl, read-only /tmp) an in-process stand-in takes over.
+
+Callers wait in a priority queue (crisis messages first, batch jobs last). A
+request is shed - acquire() returns False - as soon as it is clear it cannot be
+sent before its deadline, so the caller can answer with its fallback instead of
+sitting in the queue. A 429 from Gemini pauses all workers for a short penalty.
+
+Environment:
+    GEMINI_RATE_LIMIT        "1" to enable (default)
+    GEMINI_RPM / GEMINI_TPM / GEMINI_RPD   quotas (default 15 / 1000000 / 200)
+    GEMINI_RPM_BURST         requests that may go out back to back (default 3)
+    GEMINI_RATE_STATE        shared state file (default /tmp/mind-gemini-ratelimit.json)
+    GEMINI_429_PENALTY       seconds to pause after a 429 (default 10)
+    GEMINI_QUEUE_MAX_WAIT    seconds an interactive (normal priority) chat may queue (default 2)
+    GEMINI_QUOTA_TIMEZONE    zone whose midnight resets the daily count (default America/Los_Angeles)
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Any, Callable, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+GEMINI_RATE_LIMIT = os.environ.get("GEMINI_RATE_LIMIT", "1") == "1"
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", "15"))
+GEMINI_TPM = float(os.environ.get("GEMINI_TPM", "1000000"))
+GEMINI_RPD = int(os.environ.get("GEMINI_RPD", "200"))
+GEMINI_RPM_BURST = float(os.environ.get("GEMINI_RPM_BURST", "3"))
+GEMINI_RATE_STATE = os.environ.get("GEMINI_RATE_STATE", "/tmp/mind-gemini-ratelimit.json")
+GEMINI_429_PENALTY = float(os.environ.get("GEMINI_429_PENALTY", "10"))
+# Crisis messages and batch jobs may queue up to their deadline; ordinary chats
+# get the fallback reply instead of holding a worker thread in the queue
+GEMINI_QUEUE_MAX_WAIT = float(os.environ.get("GEMINI_QUEUE_MAX_WAIT", "2"))
+GEMINI_QUOTA_TIMEZONE = os.environ.get("GEMINI_QUOTA_TIMEZONE", "America/Los_Angeles")
+
+PRIORITY_CRISIS, PRIORITY_NORMAL, PRIORITY_BATCH = 0, 1, 2
+
+
+def _quota_zone(name: str):
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"⚠️ Unknown GEMINI_QUOTA_TIMEZONE {name!r} (no tz database?); daily count resets at UTC midnight")
+        return timezone.utc
+
+
+QUOTA_ZONE = _quota_zone(GEMINI_QUOTA_TIMEZONE)
+
+
+class RateLimited(RuntimeError):
+    """The request could not be sent within its deadline (or the daily quota is spent)."""
+
+
+def estimate_tokens(text: str, max_output_tokens: int = 0) -> int:
+    """Rough token count (~4 characters per token) plus the reply budget."""
+    return len(text) // 4 + 1 + max_output_tokens
+
+
+class _LocalState:
+    """In-process stand-in for the shared state file."""
+
+    shared = False
+
+    def __init__(self):
+        self._state: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def transact(self, fn: Callable[[Dict[str, Any]], Any]) -> Any:
+        with self._lock:
+            return fn(self._state)
+
+    def peek(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._state)
+
+
+class _FileState:
+    """JSON state shared by every process on the host, updated under an exclusive flock."""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()  # flock is per process; serialise this process's threads
+        with open(self.path, "a"):
+            pass
+
+    def transact(self, fn: Callable[[Dict[str, Any]], Any]) -> Any:
+        with self._lock, open(self.path, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                result = fn(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def peek(self) -> Dict[str, Any]:
+        """Read-only snapshot under a shared flock (health probes never block admissions)."""
+        with open(self.path, "r") as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                raw = f.read()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        try:
+            return json.loads(raw) if raw else {}
+        except ValueError:
+            return {}
+
+
+def _open_state(path: str):
+    if fcntl is not None and path:
+        try:
+            return _FileState(path)
+        except OSError as e:
+            print(f"⚠️ Rate limiter state file {path} unusable ({e}); limiting per process instead")
+    return _LocalState()
+
+
+class GeminiRateLimiter:
+    """RPM/TPM token buckets + daily counter, with a priority queue of waiters."""
+
+    def __init__(self, rpm: float = GEMINI_RPM, tpm: float = GEMINI_TPM, rpd: int = GEMINI_RPD,
+                 burst: float = GEMINI_RPM_BURST, state_path: str = GEMINI_RATE_STATE,
+                 enabled: bool = GEMINI_RATE_LIMIT):
+        self.enabled = enabled
+        self.rpd = rpd
+        # Burst B refilling at (quota - B) per minute: at most `quota` in any 60s window
+        self.rpm_capacity = max(1.0, min(burst, rpm))
+        self.rpm_rate = max(rpm - self.rpm_capacity, 1.0) / 60.0
+        self.tpm_capacity = tpm / 4
+        self.tpm_rate = (tpm - self.tpm_capacity) / 60.0
+        self._state = _open_state(state_path) if enabled else _LocalState()
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.granted = 0
+        self.shed = 0
+        self.waited_seconds = 0.0
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take one request + `tokens` if available (returns 0), else seconds until possible."""
+        tokens = min(tokens, self.tpm_capacity)
+
+        def take(state: Dict[str, Any]) -> float:
+            now = time.time()
+            today = datetime.now(QUOTA_ZONE).strftime("%Y-%m-%d")
+            if state.get("day") != today:
+                state["day"], state["day_count"] = today, 0
+            if state["day_count"] >= self.rpd:
+                return float("inf")
+            blocked = state.get("blocked_until", 0.0) - now
+            if blocked > 0:
+                return blocked
+
+            elapsed = max(0.0, now - state.get("updated", now))
+            requests = min(self.rpm_capacity, state.get("requests", self.rpm_capacity) + elapsed * self.rpm_rate)
+            budget = min(self.tpm_capacity, state.get("tokens", self.tpm_capacity) + elapsed * self.tpm_rate)
+            state["updated"], state["requests"], state["tokens"] = now, requests, budget
+
+            wait = max((1 - requests) / self.rpm_rate, (tokens - budget) / self.tpm_rate, 0.0)
+            if wait > 0:
+                return wait
+            state["requests"] = requests - 1
+            state["tokens"] = budget - tokens
+            state["day_count"] += 1
+            return 0.0
+
+        return self._state.transact(take)
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_NORMAL, timeout: float = None) -> bool:
+        """Block until the request may be sent. False means shed: it would not make `timeout`."""
+        if not self.enabled:
+            return True
+        started = time.monotonic()
+        deadline = started + timeout if timeout is not None else float("inf")
+        entry = [priority, next(self._seq), False]  # [priority, arrival, cancelled]
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            # A new head (e.g. a crisis message) must get its turn right away
+            self._cond.notify_all()
+            try:
+                while True:
+                    # Drop waiters that gave up, then only the head may draw from the buckets
+                    while self._waiters and self._waiters[0][2]:
+                        heapq.heappop(self._waiters)
+                    now = time.monotonic()
+                    if self._waiters[0] is entry:
+                        wait = self._try_acquire(tokens)
+                        if wait == 0:
+                            heapq.heappop(self._waiters)
+                            self.granted += 1
+                            self.waited_seconds += now - started
+                            return True
+                        if wait == float("inf") or now + wait > deadline:
+                            entry[2] = True
+                            self.shed += 1
+                            return False
+                        # Re-check early: other workers share the buckets, a 429 may block them
+                        self._cond.wait(min(wait, 1.0))
+                    else:
+                        if now >= deadline:
+                            entry[2] = True
+                            self.shed += 1
+                            return False
+                        self._cond.wait(deadline - now if deadline != float("inf") else None)
+            finally:
+                self._cond.notify_all()
+
+    def penalize(self, seconds: float = GEMINI_429_PENALTY) -> None:
+        """Pause every worker after Gemini answered 429."""
+        def block(state: Dict[str, Any]) -> None:
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), time.time() + seconds)
+            state["requests"] = 0.0
+        self._state.transact(block)
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state.peek()
+        return {
+            "enabled": self.enabled,
+            "shared_across_workers": self._state.shared,
+            "requests_available": round(state.get("requests", self.rpm_capacity), 2),
+            "tokens_available": int(state.get("tokens", self.tpm_capacity)),
+            "requests_today": state.get("day_count", 0),
+            "daily_limit": self.rpd,
+            "queued": sum(1 for w in self._waiters if not w[2]),
+            "granted": self.granted,
+            "shed": self.shed,
+            "mean_wait_seconds": round(self.waited_seconds / self.granted, 3) if self.granted else 0.0,
+        }
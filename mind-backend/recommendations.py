@@ -0,0 +1,378 @@
+"""
+Dashboard recommendations without an LLM on the hot path.
+
+auth-backend's dashboard posts the user's recent check-ins, journal entries and
+chat messages to /api/recommendations (20s client timeout). The engine here:
+
+1. summarises mood from check-in / journal moods and chat sentiments;
+2. embeds what the user wrote (check-in notes, journal text, own chat turns)
+   into one weighted profile vector - per-text embeddings come from app.py's
+   embedding cache, so unchanged entries are never re-encoded;
+3. scores a fixed technique catalog against that vector (catalog embeddings
+   are computed once, at warm-up) and adds the closest documents from the FAISS
+   technique corpus as extra mood tips;
+4. fills weekly_summary, action_plan and suggestions from templates.
+
+Results are cached per payload. When an LLM polisher is configured and the
+request asks for it (?polish=1), the weekly summary is rewritten in the
+background and served from the cache on the next request for the same data;
+the first response never waits for it. Polish is skipped while the Gemini
+limiter has no spare request, so it never takes quota a chat could use.
+
+Environment:
+    RECOMMENDATIONS_CACHE_SIZE / _TTL   result cache (default 512 / 1800s)
+    RECOMMENDATIONS_LLM_POLISH          "1" to allow ?polish=1 requests to rewrite summaries with Gemini (default 0)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from cache import TTLCache
+from fusion import weighted_mean
+
+RECOMMENDATIONS_LLM_POLISH = os.environ.get("RECOMMENDATIONS_LLM_POLISH", "0") == "1"
+
+CATEGORIES = ("exercises", "breathing", "mood_tips", "stress_relief", "resources")
+PER_CATEGORY = 3
+
+# Check-in / journal moods (auth-backend enum) on a 1-5 scale
+MOOD_SCORES = {"very happy": 5, "happy": 4, "neutral": 3, "sad": 2, "depressed": 1}
+SENTIMENT_SCORES = {"positive": 4, "neutral": 3, "negative": 2}
+
+# mood_match: "challenging" | "neutral" | "positive" | "any"
+TECHNIQUE_CATALOG: List[Dict[str, Any]] = [
+    {"id": "ex-walk", "category": "exercises", "title": "Ten-minute mindful walk",
+     "description": "Walk outside at an easy pace and notice five things you can see, hear and feel.",
+     "duration": "10 min", "tags": ["movement", "mindfulness", "low mood"], "mood_match": "challenging"},
+    {"id": "ex-stretch", "category": "exercises", "title": "Gentle stretching",
+     "description": "Loosen your neck, shoulders and back with slow stretches, breathing into each one.",
+     "duration": "5 min", "tags": ["tension", "body", "stress"], "mood_match": "any"},
+    {"id": "ex-pmr", "category": "exercises", "title": "Progressive muscle relaxation",
+     "description": "Tense and release each muscle group from your feet to your face to let go of physical anxiety.",
+     "duration": "12 min", "tags": ["anxiety", "sleep", "tension"], "mood_match": "challenging"},
+    {"id": "ex-dance", "category": "exercises", "title": "One-song movement break",
+     "description": "Put on a song you love and move however feels good to keep your energy up.",
+     "duration": "4 min", "tags": ["energy", "joy"], "mood_match": "positive"},
+    {"id": "ex-yoga", "category": "exercises", "title": "Bedtime yoga flow",
+     "description": "A few slow floor poses before bed to settle your body when sleep is hard.",
+     "duration": "10 min", "tags": ["sleep", "insomnia", "rest"], "mood_match": "any"},
+    {"id": "br-box", "category": "breathing", "title": "Box breathing",
+     "description": "Breathe in for 4, hold for 4, out for 4, hold for 4. Repeat for a few rounds.",
+     "duration": "3 min", "tags": ["anxiety", "panic", "focus"], "mood_match": "challenging"},
+    {"id": "br-478", "category": "breathing", "title": "4-7-8 breathing for sleep",
+     "description": "Inhale for 4, hold for 7, exhale slowly for 8 to calm your nervous system before sleep.",
+     "duration": "4 min", "tags": ["sleep", "insomnia", "racing thoughts"], "mood_match": "any"},
+    {"id": "br-sigh", "category": "breathing", "title": "Physiological sigh",
+     "description": "Two short inhales through the nose and one long exhale through the mouth to release stress fast.",
+     "duration": "1 min", "tags": ["stress", "panic", "overwhelm"], "mood_match": "challenging"},
+    {"id": "br-coherent", "category": "breathing", "title": "Coherent breathing",
+     "description": "Breathe in and out for about 5 seconds each to find a steady, balanced rhythm.",
+     "duration": "5 min", "tags": ["balance", "focus", "calm"], "mood_match": "neutral"},
+    {"id": "mt-gratitude", "category": "mood_tips", "title": "Three good things",
+     "description": "Write down three things that went well today and why they happened.",
+     "duration": "5 min", "tags": ["gratitude", "journaling", "positivity"], "mood_match": "any"},
+    {"id": "mt-connect", "category": "mood_tips", "title": "Reach out to someone",
+     "description": "Send a message to a friend or family member, even just to say hello.",
+     "duration": "5 min", "tags": ["loneliness", "connection", "support"], "mood_match": "challenging"},
+    {"id": "mt-sunlight", "category": "mood_tips", "title": "Morning light",
+     "description": "Spend a few minutes in daylight soon after waking to lift energy and steady your sleep.",
+     "duration": "10 min", "tags": ["energy", "sleep", "routine"], "mood_match": "neutral"},
+    {"id": "mt-savor", "category": "mood_tips", "title": "Savor the good moments",
+     "description": "Pause on something that went well and replay it in detail to make the feeling last.",
+     "duration": "3 min", "tags": ["joy", "achievement", "positivity"], "mood_match": "positive"},
+    {"id": "mt-selfcompassion", "category": "mood_tips", "title": "Talk to yourself like a friend",
+     "description": "When self-criticism shows up, ask what you would say to a friend in the same spot.",
+     "duration": "5 min", "tags": ["self-criticism", "sadness", "worth"], "mood_match": "challenging"},
+    {"id": "sr-worry", "category": "stress_relief", "title": "Scheduled worry time",
+     "description": "Park worries in a list and give them 15 minutes later in the day instead of all day.",
+     "duration": "15 min", "tags": ["worry", "anxiety", "overthinking"], "mood_match": "challenging"},
+    {"id": "sr-grounding", "category": "stress_relief", "title": "5-4-3-2-1 grounding",
+     "description": "Name 5 things you see, 4 you feel, 3 you hear, 2 you smell and 1 you taste.",
+     "duration": "3 min", "tags": ["panic", "anxiety", "overwhelm"], "mood_match": "challenging"},
+    {"id": "sr-break", "category": "stress_relief", "title": "Screen-free break",
+     "description": "Step away from screens for ten minutes: stretch, get water, look out of a window.",
+     "duration": "10 min", "tags": ["work", "study", "burnout", "stress"], "mood_match": "any"},
+    {"id": "sr-tasks", "category": "stress_relief", "title": "Break it into one small step",
+     "description": "Pick the smallest next step of a task that feels too big and do only that.",
+     "duration": "10 min", "tags": ["exams", "deadlines", "procrastination", "overwhelm"], "mood_match": "neutral"},
+    {"id": "rs-mindfulness", "category": "resources", "title": "Mindfulness basics", "type": "article",
+     "description": "What mindfulness is and simple ways to practise it during the day.",
+     "tags": ["mindfulness", "beginner"], "mood_match": "any"},
+    {"id": "rs-sleep", "category": "resources", "title": "Sleep hygiene guide", "type": "article",
+     "description": "Habits that make falling and staying asleep easier.",
+     "tags": ["sleep", "insomnia", "routine"], "mood_match": "any"},
+    {"id": "rs-anxiety", "category": "resources", "title": "Understanding anxiety", "type": "article",
+     "description": "Why anxiety happens, what it feels like in the body, and techniques that help.",
+     "tags": ["anxiety", "panic", "worry"], "mood_match": "challenging"},
+    {"id": "rs-depression", "category": "resources", "title": "When low mood lingers", "type": "article",
+     "description": "Signs that sadness may be depression and when to reach out to a professional.",
+     "tags": ["depression", "sadness", "support"], "mood_match": "challenging"},
+    {"id": "rs-helpline", "category": "resources", "title": "Talk to someone now", "type": "helpline",
+     "description": "If things feel unbearable, contact a local crisis line or emergency services right away.",
+     "tags": ["crisis", "support", "help"], "mood_match": "challenging"},
+    {"id": "rs-habits", "category": "resources", "title": "Building habits that stick", "type": "article",
+     "description": "How small, regular routines keep a good stretch going.",
+     "tags": ["habits", "routine", "growth"], "mood_match": "positive"},
+]
+
+
+def technique_text(item: Dict[str, Any]) -> str:
+    return f"{item['title']}. {item['description']} {' '.join(item.get('tags', []))}"
+
+
+def _texts(entries: Sequence[Dict[str, Any]], *fields: str) -> List[str]:
+    out = []
+    for entry in entries or []:
+        if not isinstance(entry, dict):
+            continue
+        for field in fields:
+            value = entry.get(field)
+            if isinstance(value, str) and value.strip():
+                out.append(value.strip())
+    return out
+
+
+def mood_overview(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Mood counts, mean score (1-5), trend and overall state from the payload."""
+    check_ins = [e for e in payload.get("check_ins") or [] if isinstance(e, dict)]
+    journals = [e for e in payload.get("journal_entries") or [] if isinstance(e, dict)]
+    chats = [e for e in payload.get("chat_history") or [] if isinstance(e, dict) and e.get("role") == "user"]
+
+    # Newest first, as dashboard.js sends them
+    scores = [MOOD_SCORES[str(e.get("mood", "")).lower()] for e in check_ins + journals
+              if str(e.get("mood", "")).lower() in MOOD_SCORES]
+    scores += [SENTIMENT_SCORES[e["sentiment"]] for e in chats if e.get("sentiment") in SENTIMENT_SCORES]
+
+    mean = sum(scores) / len(scores) if scores else 3.0
+    state = "positive" if mean >= 3.6 else "challenging" if mean < 2.8 else "neutral"
+    trend = "steady"
+    ordered = [MOOD_SCORES[str(e.get("mood", "")).lower()] for e in check_ins
+               if str(e.get("mood", "")).lower() in MOOD_SCORES]
+    if len(ordered) >= 4:
+        half = len(ordered) // 2
+        recent, earlier = sum(ordered[:half]) / half, sum(ordered[half:]) / (len(ordered) - half)
+        if recent - earlier >= 0.5:
+            trend = "improving"
+        elif earlier - recent >= 0.5:
+            trend = "declining"
+
+    return {
+        "state": state,
+        "mean_score": round(mean, 2),
+        "trend": trend,
+        "check_ins": len(check_ins),
+        "journal_entries": len(journals),
+        "chat_messages": len(chats),
+        "hard_days": sum(1 for s in ordered if s <= 2),
+        "good_days": sum(1 for s in ordered if s >= 4),
+    }
+
+
+def weekly_summary(overview: Dict[str, Any]) -> str:
+    if not (overview["check_ins"] or overview["journal_entries"] or overview["chat_messages"]):
+        return "Check in a few times this week and we'll tailor your plan to how you're feeling."
+    parts = []
+    if overview["check_ins"]:
+        parts.append(f"You checked in {overview['check_ins']} time{'s' if overview['check_ins'] != 1 else ''}"
+                     f" with {overview['good_days']} good and {overview['hard_days']} harder day"
+                     f"{'s' if overview['hard_days'] != 1 else ''}.")
+    if overview["trend"] == "improving":
+        parts.append("Your mood has been lifting lately - keep doing what's helping.")
+    elif overview["trend"] == "declining":
+        parts.append("The last few days looked heavier than before, so this plan leans on gentle, calming steps.")
+    elif overview["state"] == "challenging":
+        parts.append("It's been a tough stretch; small, kind routines can make the days feel lighter.")
+    elif overview["state"] == "positive":
+        parts.append("You've been in a good place - a few habits can help you keep that momentum.")
+    else:
+        parts.append("Things have been fairly steady; a couple of small habits can add some lift.")
+    if overview["journal_entries"]:
+        parts.append("Your journaling is a great way to notice patterns - keep it up.")
+    return " ".join(parts)
+
+
+class RecommendationEngine:
+    """Embedding-scored technique catalog with per-payload caching and background polish.
+
+    `embed(texts)` returns one vector (or None) per text; `search(key, vector, k)`
+    returns corpus documents nearest to a vector (`key` names it for caching). Either may be None, in which
+    case scoring falls back to tag and mood matching. `headroom()` says whether a polish call may be spent now.
+    """
+
+    def __init__(self, embed: Optional[Callable[[List[str]], List[Any]]] = None,
+                 search: Optional[Callable[[str, Any, int], List[str]]] = None,
+                 polish: Optional[Callable[[str, Dict[str, Any]], str]] = None,
+                 headroom: Optional[Callable[[], bool]] = None,
+                 catalog: Sequence[Dict[str, Any]] = TECHNIQUE_CATALOG):
+        self.embed = embed
+        self.search = search
+        self.polish = polish if RECOMMENDATIONS_LLM_POLISH else None
+        self.headroom = headroom
+        self.catalog = list(catalog)
+        self.cache = TTLCache.from_env("recommendations", "RECOMMENDATIONS", max_entries=512, ttl=1800)
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._polishing = set()
+        self.polish_skipped = 0
+        self._polish_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recommendation-polish")
+
+    def warm(self) -> bool:
+        """Embed the catalog once (called at warm-up); False while no model is available."""
+        if self._matrix is not None:
+            return True
+        if self.embed is None:
+            return False
+        vectors = self.embed([technique_text(item) for item in self.catalog])
+        if any(v is None for v in vectors):
+            return False
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self._matrix = matrix
+        return True
+
+    def _profile(self, payload: Dict[str, Any]):
+        """Weighted mean embedding of what the user wrote (newest entries weigh most)."""
+        if self.embed is None or not self.warm():
+            return None
+        texts, weights = [], []
+        groups = [
+            (_texts(payload.get("journal_entries"), "text"), 1.0),
+            (_texts(payload.get("check_ins"), "notes"), 0.8),
+            (_texts([m for m in payload.get("chat_history") or [] if isinstance(m, dict) and m.get("role") == "user"],
+                    "content"), 0.6),
+        ]
+        for group, base in groups:
+            for i, text in enumerate(group):
+                texts.append(text[:1000])
+                weights.append(base * 0.85 ** i)
+        if not texts:
+            return None
+        pairs = [(v, w) for v, w in zip(self.embed(texts), weights) if v is not None]
+        if not pairs:
+            return None
+        return weighted_mean([v for v, _ in pairs], [w for _, w in pairs])
+
+    def _score(self, profile, overview: Dict[str, Any], keywords: str) -> np.ndarray:
+        if profile is not None and self._matrix is not None:
+            scores = self._matrix @ profile
+        else:
+            # No model: overlap between tags and the user's own words
+            scores = np.array([sum(tag in keywords for tag in item.get("tags", [])) * 0.2 for item in self.catalog],
+                              dtype=np.float32)
+        mood_bonus = np.array([0.15 if item.get("mood_match") == overview["state"]
+                               else 0.05 if item.get("mood_match") == "any" else 0.0 for item in self.catalog],
+                              dtype=np.float32)
+        return scores + mood_bonus
+
+    def _compute(self, payload: Dict[str, Any], key: str) -> Dict[str, Any]:
+        overview = mood_overview(payload)
+        profile = self._profile(payload)
+        keywords = " ".join(_texts(payload.get("journal_entries"), "text")
+                            + _texts(payload.get("check_ins"), "notes")
+                            + _texts(payload.get("chat_history"), "content")).lower()
+        scores = self._score(profile, overview, keywords)
+
+        suggestions: Dict[str, List[Dict[str, Any]]] = {category: [] for category in CATEGORIES}
+        for index in np.argsort(-scores):
+            item = self.catalog[int(index)]
+            bucket = suggestions[item["category"]]
+            if len(bucket) < PER_CATEGORY:
+                entry = {key: value for key, value in item.items() if key != "category"}
+                entry["score"] = round(float(scores[index]), 3)
+                bucket.append(entry)
+
+        # Closest documents from the FAISS technique corpus, as extra tips
+        if profile is not None and self.search is not None:
+            for doc in self.search(f"recommendations:{key}", profile, 2):
+                suggestions["mood_tips"].append({
+                    "id": f"corpus-{hashlib.sha1(doc.encode('utf-8')).hexdigest()[:8]}",
+                    "title": doc.split(".")[0][:60],
+                    "description": doc,
+                    "tags": ["library"],
+                    "mood_match": overview["state"],
+                })
+
+        def top(category):
+            return suggestions[category][0] if suggestions[category] else None
+
+        plan_items = [("morning", top("mood_tips")), ("afternoon", top("breathing") or top("stress_relief")),
+                      ("evening", top("exercises"))]
+        action_plan = [
+            {"title": item["title"], "detail": item["description"], "timeOfDay": time_of_day,
+             "duration": item.get("duration", "")}
+            for time_of_day, item in plan_items if item
+        ]
+        resources = suggestions["resources"]
+        resource_summary = (
+            f"Start with \"{resources[0]['title']}\"" + (f", then \"{resources[1]['title']}\"." if len(resources) > 1 else ".")
+            if resources else "Start with small wellness habits and build from there."
+        )
+        return {
+            "weekly_summary": weekly_summary(overview),
+            "action_plan": action_plan,
+            "suggestions": suggestions,
+            "resource_summary": resource_summary,
+            "mood_overview": overview,
+            "personalized": profile is not None,
+            "polished": False,
+        }
+
+    @staticmethod
+    def cache_key(payload: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def recommend(self, payload: Dict[str, Any], polish: bool = False) -> Dict[str, Any]:
+        """Recommendations for a dashboard payload; `source` is "cache" or "computed".
+
+        `polish` asks for the weekly summary to be rewritten in the background
+        (only when a polisher is configured and the limiter has headroom).
+        """
+        key = self.cache_key(payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached, source="cache")
+        result = self._compute(payload, key)
+        self.cache.set(key, result)
+        if (polish and self.polish is not None
+                and result["mood_overview"]["check_ins"] + result["mood_overview"]["journal_entries"]):
+            if self.headroom is None or self.headroom():
+                self._schedule_polish(key, result)
+            else:
+                self.polish_skipped += 1
+        return dict(result, source="computed")
+
+    def _schedule_polish(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            if key in self._polishing:
+                return
+            self._polishing.add(key)
+
+        def run():
+            try:
+                text = self.polish(result["weekly_summary"], result["mood_overview"])
+                if text:
+                    self.cache.set(key, dict(result, weekly_summary=text, polished=True))
+            except Exception as e:
+                print(f"Recommendation polish error: {e}")
+            finally:
+                with self._lock:
+                    self._polishing.discard(key)
+
+        self._polish_executor.submit(run)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "catalog_size": len(self.catalog),
+            "catalog_embedded": self._matrix is not None,
+            "polish_enabled": self.polish is not None,
+            "polishing": len(self._polishing),
+            "polish_skipped": self.polish_skipped,
+            "cache": self.cache.stats(),
+        }
@@ -0,0 +1,261 @@
+"""
+Resilience layer for the HF Inference API and Gemini.
+
+Every outbound call reports its outcome to an UpstreamStatus, so health and
+readiness probes can answer from in-process state ("last successful Gemini call
+12s ago, 0 consecutive failures") instead of making a request of their own.
+
+Each UpstreamStatus also carries:
+- a CircuitBreaker (closed -> open after N consecutive failures -> half-open
+  probe after a cool-down), so callers skip straight to their fallback while an
+  upstream is down instead of tying up a gunicorn thread for the full timeout;
+- a LatencyTracker, whose recent percentiles give an adaptive timeout
+  (p99 x multiplier, clamped) in place of one fixed worst-case value.
+
+hedged_call() optionally fires a second identical request when the first is
+slower than the upstream's usual p95 and returns whichever finishes first.
+
+DeepCheck wraps the one probe that does talk to an upstream: it is rate-limited
+and its result is cached, so a load balancer polling every few seconds costs at
+most one upstream call per interval.
+
+Environment:
+    HEALTH_DEEP_INTERVAL          seconds a deep-check result is reused (default 60)
+    CIRCUIT_FAILURE_THRESHOLD     consecutive failures that open a breaker (default 5)
+    CIRCUIT_RESET_SECONDS         seconds a breaker stays open before a probe (default 30)
+    ADAPTIVE_TIMEOUT_PERCENTILE   latency percentile the timeout is based on (default 0.99)
+    ADAPTIVE_TIMEOUT_MULTIPLIER   headroom over that percentile (default 2.0)
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES  successes needed before adapting (default 20)
+    HEDGE_UPSTREAMS               comma-separated upstreams to hedge, e.g. "hf_api" (default none)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Any, Callable, Dict, Optional
+
+HEALTH_DEEP_INTERVAL = float(os.environ.get("HEALTH_DEEP_INTERVAL", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+ADAPTIVE_TIMEOUT_PERCENTILE = float(os.environ.get("ADAPTIVE_TIMEOUT_PERCENTILE", "0.99"))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.environ.get("ADAPTIVE_TIMEOUT_MULTIPLIER", "2.0"))
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = int(os.environ.get("ADAPTIVE_TIMEOUT_MIN_SAMPLES", "20"))
+HEDGE_UPSTREAMS = {name.strip() for name in os.environ.get("HEDGE_UPSTREAMS", "").split(",") if name.strip()}
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by consecutive failures."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (a half-open breaker lets one probe through)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self) -> None:
+        """Give back a half-open probe slot that was granted but never used."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "times_opened": self.opened, "rejected_calls": self.rejected}
+
+
+class LatencyTracker:
+    """Recent successful-call latencies and the adaptive timeout derived from them."""
+
+    def __init__(self, window: int = 200, min_samples: int = ADAPTIVE_TIMEOUT_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: "deque[float]" = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout(self, default: float, floor: float = 1.0, ceiling: Optional[float] = None) -> float:
+        """p{ADAPTIVE_TIMEOUT_PERCENTILE} x multiplier within [floor, ceiling]; `default` until warmed up."""
+        observed = self.percentile(ADAPTIVE_TIMEOUT_PERCENTILE)
+        if observed is None:
+            return default
+        ceiling = default if ceiling is None else ceiling
+        return round(min(ceiling, max(floor, observed * ADAPTIVE_TIMEOUT_MULTIPLIER)), 3)
+
+
+class UpstreamStatus:
+    """Outcome counters and timestamps for one upstream (thread-safe)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.hedge = name in HEDGE_UPSTREAMS
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        return self.breaker.allow()
+
+    def timeout(self, default: float, floor: float = 1.0) -> float:
+        return self.latency.timeout(default, floor)
+
+    def success(self, latency: Optional[float] = None) -> None:
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.last_success = time.time()
+        self.breaker.record_success()
+        if latency is not None:
+            self.latency.observe(latency)
+
+    def failure(self, error: Any) -> None:
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_failure = time.time()
+            self.last_error = str(error)[:200]
+        self.breaker.record_failure()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+
+        def ago(stamp):
+            return round(now - stamp, 1) if stamp else None
+
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "seconds_since_success": ago(self.last_success),
+            "seconds_since_failure": ago(self.last_failure),
+            "last_error": self.last_error,
+            "circuit": self.breaker.snapshot(),
+            "latency_p50": self.latency.percentile(0.5),
+            "latency_p99": self.latency.percentile(0.99),
+            "hedged": self.hedge,
+        }
+
+
+_upstreams: Dict[str, UpstreamStatus] = {}
+_upstreams_lock = threading.Lock()
+
+
+def upstream(name: str) -> UpstreamStatus:
+    """The shared UpstreamStatus for `name` (created on first use)."""
+    status = _upstreams.get(name)
+    if status is None:
+        with _upstreams_lock:
+            status = _upstreams.setdefault(name, UpstreamStatus(name))
+    return status
+
+
+def upstream_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: status.snapshot() for name, status in list(_upstreams.items())}
+
+
+def hedged_call(executor: Executor, delay: Optional[float], fn: Callable, *args, **kwargs):
+    """fn(*args) - plus an identical backup call if the first is still running after
+    `delay` seconds. Returns the first result; raises only if both attempts fail.
+
+    Only for idempotent requests: the slower attempt still runs to completion.
+    """
+    primary = executor.submit(fn, *args, **kwargs)
+    if delay is None:
+        return primary.result()
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    pending = {primary, executor.submit(fn, *args, **kwargs)}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+class DeepCheck:
+    """Runs `check()` at most once per `interval` seconds and caches the result.
+
+    Concurrent callers never queue behind a running check: they get the last
+    cached result (or a "pending" placeholder on the very first run).
+    """
+
+    def __init__(self, name: str, check: Callable[[], Dict[str, Any]], interval: float = HEALTH_DEEP_INTERVAL):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self._result: Dict[str, Any] = {"status": "pending"}
+        self._checked_at: Optional[float] = None
+        self._running = threading.Lock()
+
+    def result(self) -> Dict[str, Any]:
+        fresh = self._checked_at is not None and time.monotonic() - self._checked_at < self.interval
+        if not fresh and self._running.acquire(blocking=False):
+            try:
+                started = time.perf_counter()
+                try:
+                    result = dict(self.check())
+                except Exception as e:
+                    result = {"status": "offline", "error": str(e)[:200]}
+                result["latency_seconds"] = round(time.perf_counter() - started, 3)
+                self._result = result
+                self._checked_at = time.monotonic()
+            finally:
+                self._running.release()
+        age = round(time.monotonic() - self._checked_at, 1) if self._checked_at is not None else None
+        return dict(self._result, age_seconds=age)
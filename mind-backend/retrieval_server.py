@@ -0,0 +1,389 @@
+"""
+Out-of-process retrieval: one embedding model and one FAISS index shared by every web worker.
+
+Each gunicorn worker normally holds its own SentenceTransformer (the FAISS
+index and documents are memory-mapped and shared already). With
+RETRIEVAL_SOCKET set, app.py loads neither and sends encode / search requests
+to this server over a Unix socket instead, so web workers can be scaled for
+Gemini waits without multiplying model memory.
+
+    python retrieval_server.py --socket /tmp/mind-retrieval.sock [--data-dir data]
+    RETRIEVAL_SOCKET=/tmp/mind-retrieval.sock gunicorn app:app
+
+Protocol: length-prefixed binary frames, both directions.
+
+    header   !IIB   body length, request id, opcode (request) / status (response)
+    texts    !H count, then per text !I length + UTF-8
+    vector   little-endian float32
+
+    EMBED   texts                               -> !HH count, dim + count*dim floats
+    SEARCH  !HH k, dim + vector (dim 0: encode) + texts[query]   -> !I version + texts[docs]
+    SPARSE  !HB k, roman_urdu + texts[query]    -> !I version + texts[docs]   (BM25, see bm25.py)
+    STATS   (empty)                             -> JSON
+
+Requests are pipelined: a client writes as many frames as it likes without
+waiting, and the server answers each as soon as it is done, tagged with the
+request id (so possibly out of order). Encodes from all connections go through
+one MicroBatcher and share forward passes.
+
+Environment (client side, read by app.py):
+    RETRIEVAL_SOCKET          path of the server's socket; unset = retrieval in-process (default)
+    RETRIEVAL_SOCKET_TIMEOUT  seconds a request may take (default 2)
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RETRIEVAL_SOCKET = os.environ.get("RETRIEVAL_SOCKET")
+RETRIEVAL_SOCKET_TIMEOUT = float(os.environ.get("RETRIEVAL_SOCKET_TIMEOUT", "2"))
+
+HEADER = struct.Struct("!IIB")
+OP_EMBED, OP_SEARCH, OP_SPARSE, OP_STATS = 1, 2, 3, 4
+OP_NAMES = {OP_EMBED: "embed", OP_SEARCH: "search", OP_SPARSE: "sparse", OP_STATS: "stats"}
+STATUS_OK, STATUS_ERROR = 0, 1
+MAX_FRAME = 16 * 1024 * 1024
+_COUNT = struct.Struct("!H")
+_LENGTH = struct.Struct("!I")
+_FLOAT32 = np.dtype("<f4")
+
+
+class RetrievalServerError(RuntimeError):
+    """The server answered with an error, or could not be reached."""
+
+
+# ----------------------------------------------------------------------------
+# Frame encoding
+# ----------------------------------------------------------------------------
+
+def pack_texts(texts: Sequence[str]) -> bytes:
+    parts = [_COUNT.pack(len(texts))]
+    for text in texts:
+        encoded = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+
+def unpack_texts(body: bytes, offset: int = 0) -> Tuple[List[str], int]:
+    (count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    texts = []
+    for _ in range(count):
+        (length,) = _LENGTH.unpack_from(body, offset)
+        offset += _LENGTH.size
+        texts.append(body[offset:offset + length].decode("utf-8"))
+        offset += length
+    return texts, offset
+
+
+def pack_search(query: str, k: int, embedding=None) -> bytes:
+    vector = b"" if embedding is None else np.asarray(embedding, dtype=_FLOAT32).ravel().tobytes()
+    return struct.pack("!HH", k, len(vector) // 4) + vector + pack_texts([query])
+
+
+def pack_sparse(query: str, k: int, roman_urdu: bool) -> bytes:
+    return struct.pack("!HB", k, int(roman_urdu)) + pack_texts([query])
+
+
+def unpack_documents(body: bytes) -> Tuple[int, List[str]]:
+    (version,) = _LENGTH.unpack_from(body)
+    documents, _ = unpack_texts(body, _LENGTH.size)
+    return version, documents
+
+
+def unpack_embeddings(body: bytes) -> np.ndarray:
+    count, dim = struct.unpack_from("!HH", body)
+    return np.frombuffer(body, dtype=_FLOAT32, count=count * dim, offset=4).reshape(count, dim)
+
+
+# ----------------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------------
+
+class RetrievalService:
+    """The model, index and BM25 index behind the socket (requests run on worker threads)."""
+
+    def __init__(self, data_dir: str):
+        from batching import MicroBatcher
+        from index_store import LiveIndex
+        from sentence_transformers import SentenceTransformer
+
+        started = time.perf_counter()
+        self.live_index = LiveIndex(data_dir)
+        snapshot = self.live_index.load()
+        self.model = SentenceTransformer(snapshot.meta["model"])
+        self.batcher = MicroBatcher(
+            "server_embedding", lambda texts: self.model.encode(texts, convert_to_tensor=False)
+        )
+        self._sparse: Tuple[Optional[int], Any] = (None, None)
+        self._sparse_lock = threading.Lock()
+        self.requests = {name: 0 for name in OP_NAMES.values()}
+        self.errors = 0
+        print(f"✓ Retrieval server loaded {snapshot.meta['index_type']} index v{snapshot.version} "
+              f"({len(snapshot.documents)} documents) and {snapshot.meta['model']} "
+              f"in {time.perf_counter() - started:.1f}s")
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        futures = [self.batcher.submit(text) for text in texts]
+        return np.asarray([future.result() for future in futures], dtype=_FLOAT32)
+
+    def sparse_index(self, snapshot):
+        from bm25 import BM25Index
+
+        version, index = self._sparse
+        if version != snapshot.version or index is None:
+            with self._sparse_lock:
+                version, index = self._sparse
+                if version != snapshot.version or index is None:
+                    index = BM25Index(snapshot.documents)
+                    self._sparse = (snapshot.version, index)
+        return index
+
+    def handle(self, op: int, body: bytes) -> bytes:
+        from index_store import search_snapshot
+
+        if op not in OP_NAMES:
+            raise ValueError(f"unknown opcode {op}")
+        self.requests[OP_NAMES[op]] += 1
+        snapshot = self.live_index.current()
+        if op == OP_EMBED:
+            texts, _ = unpack_texts(body)
+            embeddings = self.embed(texts)
+            dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+            return struct.pack("!HH", len(texts), dim) + embeddings.astype(_FLOAT32).tobytes()
+        if op == OP_SEARCH:
+            k, dim = struct.unpack_from("!HH", body)
+            offset = 4 + dim * 4
+            (query,), _ = unpack_texts(body, offset)
+            embedding = (np.frombuffer(body, dtype=_FLOAT32, count=dim, offset=4) if dim
+                         else self.batcher(query))
+            return _LENGTH.pack(snapshot.version) + pack_texts(search_snapshot(snapshot, embedding, k))
+        if op == OP_SPARSE:
+            k, roman_urdu = struct.unpack_from("!HB", body)
+            (query,), _ = unpack_texts(body, 3)
+            hits = self.sparse_index(snapshot).search(query, k, bool(roman_urdu))
+            return _LENGTH.pack(snapshot.version) + pack_texts([snapshot.documents[hit.doc_id] for hit in hits])
+        if op == OP_STATS:
+            return json.dumps({
+                "index_version": snapshot.version,
+                "documents": len(snapshot.documents),
+                "model": snapshot.meta["model"],
+                "requests": self.requests,
+                "errors": self.errors,
+                "batching": self.batcher.stats(),
+            }).encode("utf-8")
+        raise ValueError(f"unknown opcode {op}")
+
+
+async def serve(service: RetrievalService, path: str, threads: int) -> None:
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="retrieval")
+    loop = asyncio.get_running_loop()
+
+    async def respond(writer, drain_lock, request_id: int, op: int, body: bytes) -> None:
+        try:
+            payload = await loop.run_in_executor(executor, service.handle, op, body)
+            status = STATUS_OK
+        except Exception as e:
+            service.errors += 1
+            payload, status = f"{type(e).__name__}: {e}".encode("utf-8"), STATUS_ERROR
+        writer.write(HEADER.pack(len(payload), request_id, status) + payload)
+        async with drain_lock:
+            await writer.drain()
+
+    async def connection(reader, writer) -> None:
+        drain_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                length, request_id, op = HEADER.unpack(await reader.readexactly(HEADER.size))
+                if length > MAX_FRAME:
+                    break
+                body = await reader.readexactly(length)
+                # Pipelining: start on this request and go straight back to reading
+                task = loop.create_task(respond(writer, drain_lock, request_id, op, body))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(connection, path=path)
+    os.chmod(path, 0o660)
+    print(f"✓ Retrieval server listening on {path} ({threads} threads)")
+    async with server:
+        await server.serve_forever()
+
+
+# ----------------------------------------------------------------------------
+# Client (one connection per process, shared by its threads)
+# ----------------------------------------------------------------------------
+
+class RetrievalClient:
+    """Pipelined client: any number of threads write requests on one socket; a reader
+    thread resolves each Future when the response with its id arrives."""
+
+    def __init__(self, path: str, timeout: float = RETRIEVAL_SOCKET_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.index_version: Optional[int] = None
+        self.requests = 0
+        self.errors = 0
+        self._sock: Optional[socket.socket] = None
+        self._pid: Optional[int] = None
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def _connection(self) -> Tuple[socket.socket, Dict[int, Future]]:
+        with self._lock:
+            # A connection inherited through fork() belongs to the parent
+            if self._sock is None or self._pid != os.getpid():
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+                self._sock, self._pid, self._pending = sock, os.getpid(), {}
+                threading.Thread(target=self._read_loop, args=(sock, self._pending),
+                                 name="retrieval-client", daemon=True).start()
+            return self._sock, self._pending
+
+    def _read_loop(self, sock: socket.socket, pending: Dict[int, Future]) -> None:
+        stream = sock.makefile("rb")
+        error: Exception = RetrievalServerError("retrieval server closed the connection")
+        try:
+            while True:
+                header = stream.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                length, request_id, status = HEADER.unpack(header)
+                body = stream.read(length)
+                future = pending.pop(request_id, None)
+                if future is None:
+                    # Late reply to a request its caller gave up on (see _forget)
+                    continue
+                if status == STATUS_OK:
+                    future.set_result(body)
+                else:
+                    future.set_exception(RetrievalServerError(body.decode("utf-8", "replace")))
+        except OSError as e:
+            error = RetrievalServerError(str(e))
+        finally:
+            self._drop(sock)
+            for future in list(pending.values()):
+                if not future.done():
+                    future.set_exception(error)
+            pending.clear()
+
+    def _drop(self, sock: socket.socket) -> None:
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def submit(self, op: int, body: bytes = b"") -> Future:
+        """Send one request without waiting for earlier ones (pipelined)."""
+        future: Future = Future()
+        sock = pending = request_id = None
+        try:
+            sock, pending = self._connection()
+            request_id = next(self._ids)
+            pending[request_id] = future
+            future.slot = (pending, request_id)
+            with self._send_lock:
+                sock.sendall(HEADER.pack(len(body), request_id, op) + body)
+            self.requests += 1
+        except OSError as e:
+            self.errors += 1
+            if sock is not None:
+                pending.pop(request_id, None)
+                self._drop(sock)
+            if not future.done():
+                future.set_exception(RetrievalServerError(f"cannot reach retrieval server at {self.path}: {e}"))
+        return future
+
+    @staticmethod
+    def _forget(future: Future) -> None:
+        """Stop tracking a request whose caller is done waiting (a timed-out reply may never come)."""
+        pending, request_id = getattr(future, "slot", (None, None))
+        if pending is not None:
+            pending.pop(request_id, None)
+
+    def _result(self, future: Future) -> bytes:
+        try:
+            return future.result(self.timeout)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._forget(future)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return unpack_embeddings(self._result(self.submit(OP_EMBED, pack_texts(texts))))
+
+    def search(self, query: str, k: int, embedding=None) -> List[str]:
+        body = self._result(self.submit(OP_SEARCH, pack_search(query, k, embedding)))
+        self.index_version, documents = unpack_documents(body)
+        return documents
+
+    def sparse_many(self, queries: List[str], k: int, roman_urdu: bool = False) -> List[List[str]]:
+        """BM25 results for several queries, all requests in flight at once."""
+        futures = [self.submit(OP_SPARSE, pack_sparse(query, k, roman_urdu)) for query in queries]
+        results = []
+        try:
+            for future in futures:
+                self.index_version, documents = unpack_documents(self._result(future))
+                results.append(documents)
+        finally:
+            for future in futures:
+                self._forget(future)
+        return results
+
+    def server_stats(self) -> Dict[str, Any]:
+        return json.loads(self._result(self.submit(OP_STATS)).decode("utf-8"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "socket": self.path,
+            "connected": self._sock is not None and self._pid == os.getpid(),
+            "in_flight": len(self._pending),
+            "requests": self.requests,
+            "errors": self.errors,
+            "index_version": self.index_version,
+        }
+
+
+def main():
+    from index_store import DATA_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--socket", default=RETRIEVAL_SOCKET or "/tmp/mind-retrieval.sock")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--threads", type=int, default=8, help="threads running encodes and searches")
+    args = parser.parse_args()
+    service = RetrievalService(args.data_dir)
+    try:
+        asyncio.run(serve(service, args.socket, args.threads))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Compiled single-pass message router for the chat fast path.
+
+All intent patterns (crisis, greeting, bot info, gratitude, achievement,
+casual) are folded into ONE case-insensitive alternation regex with a named
+group per intent. A single finditer() pass collects every intent present; priority (crisis first) is
+applied afterwards, so a crisis phrase is never masked by an earlier "hi".
+A greeting only wins when the message holds nothing but greeting words.
+
+See benchmarks/bench_routing.py for the per-message cost against the old
+per-pattern scans. Language identification lives in language.py.
+
+retrieval_decision() gates RAG on the same cheap signals (intent, a
+therapeutic-vocabulary regex, message length), so small talk never pays for
+a MiniLM encode and a FAISS search. The vocabulary includes the Roman Urdu
+and Urdu-script words bm25.py glosses to distress terms, so short Urdu
+messages about sleep, worry or sadness reach BM25 while "ghar par sab theek
+hai" stays small talk.
+"""
+
+import os
+import re
+from typing import FrozenSet, NamedTuple, Sequence
+
+from bm25 import DISTRESS_TERMS, ROMAN_URDU_GLOSS, URDU_SCRIPT_GLOSS
+
+CRISIS_PATTERNS = [
+    r"\b(?:suicid(?:e|al)|kill\s+myself|end\s+(?:it|my\s+life))\b",
+    # Self-harm only: "you hurt me" is a relationship problem, not a crisis
+    r"\bhurt(?:ing)?\s+myself\b",
+    r"\b(?:want|going)\s+to\s+hurt\s+(?:myself|me)\b",
+    r"\bdon'?t\s+want\s+to\s+live\b",
+    r"\bbetter\s+off\s+dead\b",
+    r"\b(?:wants?|wanted|wanna)\s+(?:to\s+)?die\b",
+    # Roman Urdu and Urdu script
+    r"\bkhud\s*k[ua]shi\b",
+    r"\b(?:marna|mar\s+jana)\s+chaht[aei]\b",
+    r"\bjeena\s+nahi\b",
+    r"\bjeene\s+ka\s+(?:dil|mann?)\s+nahi\b",
+    r"\bzindagi\s+khatam\b",
+    r"خودکشی",
+    r"مرنا\s+چاہت[ای]",
+]
+
+GREETING_PATTERNS = [
+    r"\b(?:hi|hey|hello|sup|yo|hiya|howdy)\b",
+    r"\bgood\s+(?:morning|afternoon|evening|night)\b",
+    r"\bwhat'?s\s+up\b",
+    r"\bhow\s+are\s+you\b",
+    r"\bhow'?s\s+it\s+going\b",
+    r"\b(?:kaise|kaisay|kessay)\s+ho\b",
+]
+
+BOT_INFO_PATTERNS = [
+    r"\b(?:who|what)\s+are\s+you\b",
+    r"\btell\s+me\s+about\s+(?:yourself|you)\b",
+    r"\bhow\s+do\s+you\s+work\b",
+    r"\bwhat\s+(?:can|do)\s+you\s+(?:do|help)\b",
+    r"\bwhat\s+is\s+(?:this|your\s+name)\b",
+    r"\b(?:your|you're)\s+name\b",
+]
+
+GRATITUDE_PATTERNS = [
+    r"\bthank(?:s|\s+you)\b",
+    r"\bappreciate\b",
+    r"\bhelpful\b",
+    r"\byou'?re\s+(?:great|amazing|awesome|helpful)\b",
+]
+
+ACHIEVEMENT_PATTERNS = [
+    r"\b(?:got|landed|achieved|finished|completed|won|passed|succeeded)\s+(?:a|an|the|my)?\s*"
+    r"(?:job|offer|promotion|exam|test|project|goal|degree)\b",
+    r"\bi\s+(?:made|did)\s+it\b",
+    r"\baccomplished\b",
+    r"\bproud\s+of\s+(?:myself|me)\b",
+]
+
+CASUAL_PATTERNS = [
+    r"\bhow\s+was\s+your\s+day\b",
+    r"\bwhat\s+do\s+you\s+think\s+about\b",
+    r"^\s*(?:ok|okay|alright|cool|nice)\s*[.!]*$",
+]
+
+# Vocabulary (English + Roman Urdu) that makes technique retrieval worthwhile;
+# successor of app_old_complex.py's mental_health_keywords substring list
+RETRIEVAL_PATTERNS = [
+    r"\b(?:anxi(?:ous|ety)|depress(?:ed|ion|ing)|stress(?:ed|ful)?|panic(?:king)?|worr(?:y|ied|ying)|"
+    r"fear|scared|afraid|nervous|sad|lonely|alone|overwhelm(?:ed|ing)?|insomnia|therap(?:y|ist)|"
+    r"cop(?:e|ing)|burn(?:ed|t)?\s*out|exhausted|hopeless|worthless|cry(?:ing)?|angry|anger|grief|"
+    r"griev(?:e|ing)|trauma|heartbroken|breakup|grades|exams?|deadline)\b",
+    r"\bcan(?:'?t|not)\s+(?:sleep|focus|concentrate|stop|breathe|cope)\b",
+    r"\bhelp\s+me\b",
+    r"\bfeel(?:ing)?\s+(?:so\s+|really\s+)?(?:bad|low|down|empty|lost|stuck|numb|tired)\b",
+    r"\b(?:pareshan|pareshaan|udaas|udas|tension|ghabrahat|ghabra\w*|akela|akeli|rona|neend|"
+    r"dukh|dukhi|gham|thak\s*gaya|thak\s*gayi|dil\s+nahi\s+lag\w*)\b",
+]
+
+# Words the BM25 tokenizer glosses to distress terms (Roman Urdu and Urdu script):
+# short Urdu messages have no other signal, and these are the ones sparse retrieval can serve
+GLOSS_WORDS = sorted((word for gloss in (ROMAN_URDU_GLOSS, URDU_SCRIPT_GLOSS)
+                      for word, terms in gloss.items() if DISTRESS_TERMS.intersection(terms)),
+                     key=len, reverse=True)
+RETRIEVAL_PATTERNS.append(r"\b(?:" + "|".join(map(re.escape, GLOSS_WORDS)) + r")\b")
+
+RETRIEVAL_TRIGGER = re.compile("|".join(RETRIEVAL_PATTERNS), re.IGNORECASE)
+
+# Messages at least this long are retrieved for even without a keyword
+RAG_MIN_WORDS = int(os.environ.get("RAG_MIN_WORDS", "12"))
+
+# Intents whose replies never use technique documents
+NO_RETRIEVAL_INTENTS = frozenset({"greeting", "bot_info", "gratitude", "casual", "invalid"})
+
+# Order matters only within one position of the scan; priority is applied below
+_INTENT_PATTERNS = [
+    ("crisis", CRISIS_PATTERNS),
+    ("greeting", GREETING_PATTERNS),
+    ("bot_info", BOT_INFO_PATTERNS),
+    ("gratitude", GRATITUDE_PATTERNS),
+    ("achievement", ACHIEVEMENT_PATTERNS),
+    ("casual", CASUAL_PATTERNS),
+]
+
+# A greeting is a message made only of greeting phrases, punctuation and a few
+# address words: "hi there!" is one, "hey I failed my exam" is not
+GREETING_ONLY = re.compile(
+    r"^(?:\W|" + "|".join(GREETING_PATTERNS)
+    + r"|\b(?:there|everyone|again|friend|buddy|bro|dear|ji|aap|tum|yaar)\b)*$",
+    re.IGNORECASE,
+)
+
+ROUTER = re.compile(
+    "|".join(f"(?P<{name}>{'|'.join(patterns)})" for name, patterns in _INTENT_PATTERNS),
+    re.IGNORECASE,
+)
+
+PRIORITY = ["crisis", "greeting", "bot_info", "gratitude", "achievement", "casual"]
+CONFIDENCE = {
+    "crisis": 1.0,
+    "greeting": 0.9,
+    "bot_info": 0.85,
+    "gratitude": 0.8,
+    "achievement": 0.8,
+    "casual": 0.7,
+    "mental_health": 0.5,
+    "invalid": 1.0,
+}
+
+
+class Route(NamedTuple):
+    intent: str
+    confidence: float
+    matched: FrozenSet[str]
+
+
+def route_message(message: str) -> Route:
+    """Classify a message in one regex pass (crisis > greeting > bot_info > ...)."""
+    text = message.strip()
+    if len(text) < 2:
+        return Route("invalid", CONFIDENCE["invalid"], frozenset())
+
+    matched = {match.lastgroup for match in ROUTER.finditer(text)}
+
+    word_count = len(text.split())
+    intent = "mental_health"
+    for name in PRIORITY:
+        if name not in matched:
+            continue
+        # Greetings only count with nothing else in the message, acknowledgements in very short ones
+        if name == "greeting" and not GREETING_ONLY.match(text):
+            continue
+        if name == "casual" and word_count > 3:
+            continue
+        intent = name
+        break
+
+    return Route(intent, CONFIDENCE[intent], frozenset(matched))
+
+
+class RetrievalDecision(NamedTuple):
+    retrieve: bool
+    reason: str
+
+
+def retrieval_decision(message: str, route: Route, context: Sequence[str] = ()) -> RetrievalDecision:
+    """Whether RAG is worth an embedding + FAISS search for this message (regex-cheap).
+
+    `context` holds recent conversation turns: a follow-up like "it happened
+    again" retrieves when the turns before it were about anxiety.
+    """
+    if route.intent == "crisis":
+        return RetrievalDecision(True, "crisis")
+    # Checked before the intent so "thanks, but I'm still anxious" still retrieves
+    if RETRIEVAL_TRIGGER.search(message):
+        return RetrievalDecision(True, "keyword")
+    if route.intent in NO_RETRIEVAL_INTENTS:
+        return RetrievalDecision(False, "intent")
+    if any(RETRIEVAL_TRIGGER.search(turn) for turn in context):
+        return RetrievalDecision(True, "context")
+    if len(message.split()) >= RAG_MIN_WORDS:
+        return RetrievalDecision(True, "length")
+    return RetrievalDecision(False, "no_signal")
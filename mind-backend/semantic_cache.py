@@ -0,0 +1,124 @@
+"""
+Embedding-keyed semantic cache for Gemini replies.
+
+Paraphrases ("I can't sleep" / "cant sleep at night") map to nearby MiniLM
+embeddings. The cache stores the query embedding already computed for
+retrieval next to the Gemini reply, and serves that reply to later messages
+whose cosine similarity clears a threshold within the same scope (detected
+language + emotion). Saves both latency and free-tier quota (15 RPM).
+
+Entries are shared across users, so app.py only caches opening messages
+(no conversation history in the prompt) and never crisis messages.
+
+Environment:
+    SEMANTIC_CACHE            "1" to enable (default)
+    SEMANTIC_CACHE_THRESHOLD  minimum cosine similarity for a hit (default 0.92)
+    SEMANTIC_CACHE_SIZE       max entries across all scopes, LRU evicted (default 512)
+    SEMANTIC_CACHE_TTL        seconds an entry may be served (default 3600)
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+SEMANTIC_CACHE = os.environ.get("SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """Nearest-neighbour reply cache, partitioned by scope, with LRU + TTL eviction."""
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_SIZE,
+                 ttl: float = SEMANTIC_CACHE_TTL, enabled: bool = SEMANTIC_CACHE):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled and max_entries > 0
+        # entry id -> (scope, unit vector, reply, expires_at); order = LRU
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # scope -> (entry ids, stacked vectors), rebuilt lazily after a change
+        self._matrices: Dict[Hashable, tuple] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._hit_similarity = 0.0
+
+    def _matrix(self, scope: Hashable):
+        cached = self._matrices.get(scope)
+        if cached is None:
+            ids = [i for i, entry in self._entries.items() if entry[0] == scope]
+            vectors = np.vstack([self._entries[i][1] for i in ids]) if ids else None
+            cached = (ids, vectors)
+            self._matrices[scope] = cached
+        return cached
+
+    def _drop(self, entry_id: int) -> None:
+        scope = self._entries.pop(entry_id)[0]
+        self._matrices.pop(scope, None)
+
+    def lookup(self, embedding, scope: Hashable) -> Optional[str]:
+        """Cached reply for the closest earlier prompt in `scope`, if similar enough."""
+        if not self.enabled or embedding is None:
+            return None
+        query = _unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            ids, vectors = self._matrix(scope)
+            if vectors is not None:
+                similarities = vectors @ query
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                entry_id = ids[best]
+                if similarity >= self.threshold:
+                    _, _, reply, expires_at = self._entries[entry_id]
+                    if expires_at > now:
+                        self._entries.move_to_end(entry_id)
+                        self.hits += 1
+                        self._hit_similarity += similarity
+                        return reply
+                    self._drop(entry_id)
+                    self.expirations += 1
+            self.misses += 1
+        return None
+
+    def store(self, embedding, scope: Hashable, reply: str) -> None:
+        if not self.enabled or embedding is None or not reply:
+            return
+        with self._lock:
+            self._entries[next(self._ids)] = (scope, _unit(embedding), reply, time.monotonic() + self.ttl)
+            self._matrices.pop(scope, None)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "mean_hit_similarity": round(self._hit_similarity / self.hits, 3) if self.hits else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,94 @@
+"""
+Lazy initialization and startup timing for mind-backend.
+
+Heavy dependencies (torch via sentence_transformers, faiss, google.generativeai)
+are wrapped in LazyResource so importing app.py stays cheap: the Flask app can
+answer liveness probes immediately while models load on first use or in a
+background warm-up thread.
+
+Environment:
+    WARMUP_MODE   "background" (default) - start loading in a thread at import
+                  "eager"  - load synchronously at import (gunicorn preload_app)
+                  "lazy"   - load nothing until a request needs it
+"""
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "background").lower()
+
+# Seconds spent in each startup step, reported by /api/live and /api/ready
+startup_timings: Dict[str, float] = {}
+
+
+def record_timing(name: str, started: float) -> float:
+    elapsed = round(time.perf_counter() - started, 3)
+    startup_timings[name] = elapsed
+    return elapsed
+
+
+class LazyResource:
+    """A value built by `loader()` exactly once, on first use or by a warm-up thread."""
+
+    PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._error: Optional[str] = None
+        self._state = self.PENDING
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def error(self) -> Optional[str]:
+        return self._error
+
+    @property
+    def settled(self) -> bool:
+        """Loaded or failed - either way, no longer worth waiting for."""
+        return self._done.is_set()
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._state != self.PENDING:
+                return
+            self._state = self.LOADING
+        started = time.perf_counter()
+        try:
+            self._value = self._loader()
+            self._state = self.READY
+        except Exception as e:
+            self._error = str(e)
+            self._state = self.FAILED
+            print(f"⚠️ Failed to load {self.name}: {e}")
+        finally:
+            record_timing(self.name, started)
+            self._done.set()
+
+    def start_background(self) -> None:
+        if self._state == self.PENDING:
+            threading.Thread(target=self._load, name=f"warmup-{self.name}", daemon=True).start()
+
+    def get(self, wait: bool = True, timeout: Optional[float] = None) -> Any:
+        """The loaded value (None if loading failed).
+
+        wait=False never blocks: it kicks off a background load and returns
+        None until the value is ready.
+        """
+        if self._done.is_set():
+            return self._value
+        if not wait:
+            self.start_background()
+            return None
+        if self._state == self.PENDING:
+            self._load()
+        self._done.wait(timeout)
+        return self._value
@@ -0,0 +1,89 @@
+import pytest
+
+from bm25 import BM25Index, roman_gloss, stem, tokenize
+
+DOCUMENTS = [
+    "Sleep hygiene: keep a regular bedtime and avoid screens before sleep.",
+    "Box breathing calms anxiety and panic: breathe in for four, hold for four.",
+    "Journaling about worry helps you notice patterns in your stress.",
+    "",
+    "Reach out to a friend when loneliness feels heavy.",
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return BM25Index(DOCUMENTS)
+
+
+def test_stem_strips_suffixes_conservatively():
+    assert stem("breathing") == "breath"
+    assert stem("worries") == "worry"
+    assert stem("sadness") == "sad"
+    assert stem("stress") == "stress"
+    assert stem("less") == "less"
+
+
+def test_tokenize_drops_stopwords_and_stems():
+    assert tokenize("I am worrying about my sleep and sadness") == ["worry", "sleep", "sad"]
+
+
+def test_roman_urdu_spelling_variants_fold_to_the_same_gloss():
+    for spelling in ("pareshan", "pareshaan", "preshan"):
+        assert roman_gloss(spelling) == ("worry", "anxiety", "stress")
+    assert roman_gloss("nind") == ("sleep",)
+
+
+def test_short_words_only_match_exact_gloss_spellings():
+    # "kam" folds like "kaam" but is too short to be distinctive
+    assert roman_gloss("kaam") == ("work",)
+    assert roman_gloss("kam") is None
+
+
+def test_roman_urdu_is_glossed_only_when_asked():
+    message = "mujhe neend nahi aati, bohat pareshaan hoon"
+    assert "sleep" in tokenize(message, roman_urdu=True)
+    assert "worry" in tokenize(message, roman_urdu=True)
+    assert tokenize(message) == ["neend", "aati", "pareshaan"]
+    # English text is never folded: "dust" would otherwise read as "dost" (friend)
+    assert tokenize("dust") == ["dust"]
+
+
+def test_urdu_script_is_glossed():
+    assert "sleep" in tokenize("مجھے نیند نہیں آتی")
+
+
+def test_search_ranks_the_matching_document_first(index):
+    hits = index.search("how do I stop a panic attack", k=3)
+    assert hits[0].doc_id == 1
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
+
+
+def test_repeated_terms_score_higher(index):
+    # "sleep" and "worry" are equally rare, but document 0 says "sleep" twice
+    scores = {hit.doc_id: hit.score for hit in index.search("sleep worry", k=5)}
+    assert set(scores) == {0, 2}
+    assert scores[0] > scores[2]
+
+
+def test_roman_urdu_query_reaches_english_documents(index):
+    hits = index.search("raat ko neend nahi aati", k=1, roman_urdu=True)
+    assert hits[0].doc_id == 0
+    assert index.search("raat ko neend nahi aati", k=1) == []
+
+
+def test_empty_documents_are_skipped(index):
+    assert index.size == 5
+    assert index.live_documents == 4
+    assert all(hit.doc_id != 3 for hit in index.search("friend sleep worry breathing", k=5))
+
+
+def test_k_is_capped_by_matching_documents(index):
+    assert len(index.search("loneliness", k=10)) == 1
+    assert index.search("", k=3) == []
+
+
+def test_coverage_is_the_share_of_known_query_terms(index):
+    assert index.coverage("sleep worry") == 1.0
+    assert index.coverage("sleep zebra") == 0.5
+    assert index.coverage("the and") == 0.0
@@ -0,0 +1,92 @@
+import pytest
+
+import cache
+from cache import TTLCache, normalize_text
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache, "time", fake)
+    return fake
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    c = TTLCache("test", max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "b" is now the oldest
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.evictions == 1
+
+
+def test_overwrite_does_not_evict(clock):
+    c = TTLCache("test", max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.set("a", 10)
+    assert len(c) == 2 and c.evictions == 0
+    assert c.get("a") == 10
+
+
+def test_entries_expire_after_ttl(clock):
+    c = TTLCache("test", ttl=10)
+    c.set("a", 1)
+    c.set("b", 2, ttl=30)
+    clock.now += 9.9
+    assert c.get("a") == 1
+    clock.now += 0.1
+    assert c.get("a") is None
+    assert c.get("b") == 2
+    assert c.expirations == 1
+    assert len(c) == 1
+
+
+def test_memory_cap_evicts_oldest_and_skips_oversized_values(clock):
+    c = TTLCache("test", max_entries=100, max_bytes=1000)
+    c.set("big", "x" * 5000)
+    assert c.get("big") is None and len(c) == 0
+    for i in range(20):
+        c.set(i, "y" * 100)
+    assert c.stats()["bytes"] <= 1000
+    assert c.get(19) is not None and c.get(0) is None
+    assert c.evictions > 0
+
+
+def test_disabled_cache_stores_nothing(clock):
+    c = TTLCache("test", max_entries=0)
+    c.set("a", 1)
+    assert c.get("a", "default") == "default"
+    assert c.stats()["misses"] == 0
+
+
+def test_stats_count_hits_and_misses(clock):
+    c = TTLCache("test")
+    c.set("a", 1)
+    c.get("a")
+    c.get("missing")
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_from_env_reads_prefixed_settings(monkeypatch):
+    monkeypatch.setenv("UNIT_CACHE_SIZE", "7")
+    monkeypatch.setenv("UNIT_CACHE_TTL", "0")
+    c = TTLCache.from_env("unit", "UNIT", max_entries=100, ttl=60)
+    assert c.max_entries == 7 and c.ttl == 0.0
+    assert not c.enabled
+
+
+def test_normalize_text_folds_case_whitespace_and_edge_punctuation():
+    assert normalize_text("  I feel   SO tired!! ") == "i feel so tired"
+    assert normalize_text("don't stop") == "don't stop"
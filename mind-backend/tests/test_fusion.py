@@ -0,0 +1,43 @@
+import numpy as np
+
+from fusion import dedupe_by_prefix, reciprocal_rank_fusion, weighted_mean
+
+
+def test_items_in_both_lists_outrank_single_list_leaders():
+    dense = ["a", "b", "c"]
+    sparse = ["d", "b", "a"]
+    assert reciprocal_rank_fusion([(1.0, dense), (1.0, sparse)], limit=4) == ["a", "b", "d", "c"]
+
+
+def test_rank_position_decides_among_single_list_items():
+    assert reciprocal_rank_fusion([(1.0, ["x", "y", "z"])], limit=3) == ["x", "y", "z"]
+
+
+def test_weights_scale_each_list():
+    fused = reciprocal_rank_fusion([(1.0, ["dense"]), (2.0, ["sparse"])], limit=2)
+    assert fused == ["sparse", "dense"]
+
+
+def test_limit():
+    rankings = [(1.0, ["a", "b"]), (1.0, ["b", "a"])]
+    assert len(reciprocal_rank_fusion(rankings, limit=1)) == 1
+
+
+def test_small_k_favours_first_places_large_k_agreement():
+    rankings = [(1.0, ["a", "x", "y", "c"]), (1.0, ["p", "q", "r", "c"])]
+    sharp = reciprocal_rank_fusion(rankings, limit=8, k=1)
+    flat = reciprocal_rank_fusion(rankings, limit=8)
+    assert sharp.index("a") < sharp.index("c")
+    assert flat.index("c") < flat.index("a")
+
+
+def test_weighted_mean_is_unit_length_and_leans_to_heavier_vectors():
+    combined = weighted_mean([[1.0, 0.0], [0.0, 3.0]], [3.0, 1.0])
+    assert np.isclose(np.linalg.norm(combined), 1.0)
+    assert combined[0] > combined[1]
+    assert combined.dtype == np.float32
+
+
+def test_dedupe_by_prefix_keeps_first_occurrence():
+    docs = ["Breathing: in for four" + "x" * 50, "Breathing: in for four" + "x" * 50 + " (copy)", "Other"]
+    assert dedupe_by_prefix(docs) == [docs[0], docs[2]]
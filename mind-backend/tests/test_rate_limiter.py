@@ -0,0 +1,115 @@
+import threading
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import pytest
+
+import rate_limiter
+from rate_limiter import PRIORITY_BATCH, PRIORITY_CRISIS, GeminiRateLimiter
+
+
+@pytest.fixture
+def limiter_factory(tmp_path):
+    def make(**kwargs):
+        kwargs.setdefault("state_path", str(tmp_path / "gemini-ratelimit.json"))
+        kwargs.setdefault("enabled", True)
+        return GeminiRateLimiter(**kwargs)
+    return make
+
+
+def test_burst_is_granted_then_requests_are_shed(limiter_factory):
+    limiter = limiter_factory(rpm=15, burst=3)
+    assert all(limiter.acquire(10, timeout=0.1) for _ in range(3))
+    # The next request refills in ~5s, far beyond its deadline: shed at once
+    started = time.monotonic()
+    assert not limiter.acquire(10, timeout=0.5)
+    assert time.monotonic() - started < 0.5
+    assert (limiter.granted, limiter.shed) == (3, 1)
+
+
+def test_state_file_is_shared_between_limiters(limiter_factory):
+    first = limiter_factory(rpm=15, burst=2)
+    second = limiter_factory(rpm=15, burst=2)
+    assert first.acquire(10, timeout=0.1)
+    assert second.acquire(10, timeout=0.1)
+    assert not first.acquire(10, timeout=0.1)
+    assert second.stats()["requests_today"] == 2
+
+
+def test_token_budget_limits_large_prompts(limiter_factory):
+    limiter = limiter_factory(rpm=1000, burst=1000, tpm=4000)
+    assert limiter.acquire(1000, timeout=0.1)
+    assert not limiter.acquire(1000, timeout=0.1)
+
+
+def test_penalty_after_429_pauses_admissions(limiter_factory):
+    limiter = limiter_factory(rpm=1000, burst=1000)
+    limiter.penalize(seconds=5)
+    assert not limiter.acquire(10, timeout=0.5)
+
+
+def test_disabled_limiter_always_admits(limiter_factory):
+    limiter = limiter_factory(rpm=1, burst=1, enabled=False)
+    assert all(limiter.acquire(10, timeout=0) for _ in range(5))
+
+
+def test_crisis_waiter_is_served_before_batch(limiter_factory):
+    limiter = limiter_factory(rpm=61, burst=1)  # one request per second after the burst
+    assert limiter.acquire(10, timeout=0.1)
+    order = []
+
+    def wait(priority, name):
+        if limiter.acquire(10, priority=priority, timeout=5):
+            order.append(name)
+
+    batch = threading.Thread(target=wait, args=(PRIORITY_BATCH, "batch"))
+    batch.start()
+    time.sleep(0.1)
+    crisis = threading.Thread(target=wait, args=(PRIORITY_CRISIS, "crisis"))
+    crisis.start()
+    crisis.join(5)
+    batch.join(5)
+    assert order == ["crisis", "batch"]
+
+
+@pytest.fixture
+def quota_clock(monkeypatch):
+    """Wall clock seen by the daily counter, with the quota day in Los Angeles."""
+    try:
+        zone = ZoneInfo("America/Los_Angeles")
+    except ZoneInfoNotFoundError:
+        pytest.skip("no tz database")
+    clock = {}
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock["now"].astimezone(tz)
+
+    monkeypatch.setattr(rate_limiter, "datetime", FakeDatetime)
+    monkeypatch.setattr(rate_limiter, "QUOTA_ZONE", zone)
+    return clock
+
+
+def test_daily_count_resets_at_pacific_midnight(limiter_factory, quota_clock):
+    quota_clock["now"] = datetime(2026, 3, 10, 6, 59, tzinfo=timezone.utc)  # 23:59 PDT on March 9
+    limiter = limiter_factory(rpm=1000, burst=1000, rpd=2)
+
+    assert limiter.acquire(10, timeout=0.1) and limiter.acquire(10, timeout=0.1)
+    # Daily quota spent: shed without waiting, whatever the deadline
+    assert not limiter.acquire(10)
+    assert limiter.stats()["requests_today"] == 2
+
+    quota_clock["now"] = datetime(2026, 3, 10, 7, 0, tzinfo=timezone.utc)  # midnight in Los Angeles
+    assert limiter.acquire(10, timeout=0.1)
+    assert limiter.stats()["requests_today"] == 1
+
+
+def test_daily_count_does_not_reset_at_utc_midnight(limiter_factory, quota_clock):
+    quota_clock["now"] = datetime(2026, 3, 9, 23, 59, tzinfo=timezone.utc)
+    limiter = limiter_factory(rpm=1000, burst=1000, rpd=1)
+
+    assert limiter.acquire(10, timeout=0.1)
+    quota_clock["now"] = datetime(2026, 3, 10, 0, 1, tzinfo=timezone.utc)  # still March 9 in Los Angeles
+    assert not limiter.acquire(10, timeout=0.1)
@@ -0,0 +1,112 @@
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, LatencyTracker, UpstreamStatus
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, "time", fake)
+    return fake
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot() == {"state": "open", "times_opened": 1, "rejected_calls": 1}
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_exactly_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_cool_down(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_released_probe_slot_can_be_granted_again(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_upstream_status_drives_its_breaker(clock):
+    status = UpstreamStatus("unit")
+    for _ in range(status.breaker.failure_threshold):
+        status.failure(RuntimeError("boom"))
+    assert not status.allow()
+    snapshot = status.snapshot()
+    assert snapshot["consecutive_failures"] == status.breaker.failure_threshold
+    assert snapshot["last_error"] == "boom"
+    assert snapshot["circuit"]["state"] == "open"
+
+
+def test_adaptive_timeout_needs_samples_and_stays_clamped():
+    tracker = LatencyTracker(min_samples=5)
+    assert tracker.timeout(30) == 30
+    for seconds in (0.1, 0.2, 0.2, 0.3, 0.4):
+        tracker.observe(seconds)
+    assert tracker.timeout(30, floor=1.0) == 1.0
+    for _ in range(5):
+        tracker.observe(100.0)
+    assert tracker.timeout(30) == 30
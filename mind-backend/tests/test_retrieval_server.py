@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import retrieval_server as rs
+
+
+def test_texts_round_trip_with_unicode_and_empty_strings():
+    texts = ["hello", "", "مجھے نیند نہیں آتی", "naïve"]
+    body = rs.pack_texts(texts)
+    assert rs.unpack_texts(body) == (texts, len(body))
+
+
+def test_texts_unpack_from_an_offset():
+    body = b"\x00\x07" + rs.pack_texts(["a", "b"])
+    texts, end = rs.unpack_texts(body, 2)
+    assert texts == ["a", "b"] and end == len(body)
+
+
+def test_search_frame_carries_k_vector_and_query():
+    vector = np.arange(4, dtype=np.float32)
+    body = rs.pack_search("panic", 3, vector)
+    k, dim = rs.struct.unpack_from("!HH", body)
+    assert (k, dim) == (3, 4)
+    assert np.array_equal(np.frombuffer(body, dtype="<f4", count=dim, offset=4), vector)
+    assert rs.unpack_texts(body, 4 + dim * 4)[0] == ["panic"]
+    # No vector: the server encodes the query itself
+    assert rs.struct.unpack_from("!HH", rs.pack_search("panic", 3))[1] == 0
+
+
+def test_sparse_frame_carries_k_and_roman_urdu_flag():
+    body = rs.pack_sparse("neend", 5, True)
+    assert rs.struct.unpack_from("!HB", body) == (5, 1)
+    assert rs.unpack_texts(body, 3)[0] == ["neend"]
+
+
+def test_document_and_embedding_replies_decode():
+    assert rs.unpack_documents(rs.struct.pack("!I", 7) + rs.pack_texts(["doc"])) == (7, ["doc"])
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    body = rs.struct.pack("!HH", 2, 3) + vectors.astype("<f4").tobytes()
+    assert np.array_equal(rs.unpack_embeddings(body), vectors)
+
+
+class FakeService:
+    """Echoes sparse queries back upper-cased; "slow" answers late, "boom" fails."""
+
+    def __init__(self):
+        self.errors = 0
+
+    def handle(self, op, body):
+        if op == rs.OP_STATS:
+            return json.dumps({"documents": 1}).encode("utf-8")
+        if op != rs.OP_SPARSE:
+            raise ValueError(f"unknown opcode {op}")
+        k, _ = rs.struct.unpack_from("!HB", body)
+        (query,), _ = rs.unpack_texts(body, 3)
+        if query == "boom":
+            raise RuntimeError("index unavailable")
+        if query.startswith("slow"):
+            time.sleep(0.3)
+        return rs.struct.pack("!I", 1) + rs.pack_texts([query.upper()] * k)
+
+
+@pytest.fixture
+def server():
+    # Unix socket paths are limited to ~100 bytes, shorter than some tmp_path values
+    directory = tempfile.mkdtemp(prefix="rs-")
+    path = os.path.join(directory, "retrieval.sock")
+    threading.Thread(target=asyncio.run, args=(rs.serve(FakeService(), path, 4),), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    yield path
+    os.unlink(path)
+    os.rmdir(directory)
+
+
+def test_pipelined_requests_resolve_by_id_out_of_order(server):
+    client = rs.RetrievalClient(server, timeout=5)
+    slow = client.submit(rs.OP_SPARSE, rs.pack_sparse("slow", 1, False))
+    fast = client.submit(rs.OP_SPARSE, rs.pack_sparse("fast", 2, False))
+    assert rs.unpack_documents(fast.result(5)) == (1, ["FAST", "FAST"])
+    assert not slow.done()
+    assert rs.unpack_documents(slow.result(5)) == (1, ["SLOW"])
+    assert client.sparse_many(["a", "b"], 1) == [["A"], ["B"]]
+    assert client.server_stats() == {"documents": 1}
+    assert client.stats()["in_flight"] == 0
+
+
+def test_server_errors_reach_the_caller(server):
+    client = rs.RetrievalClient(server, timeout=5)
+    with pytest.raises(rs.RetrievalServerError, match="index unavailable"):
+        client.sparse_many(["boom"], 1)
+    # The connection survives an error reply
+    assert client.sparse_many(["ok"], 1) == [["OK"]]
+    assert client.errors == 1
+
+
+def test_timed_out_requests_are_forgotten(server):
+    client = rs.RetrievalClient(server, timeout=0.05)
+    for i in range(5):
+        with pytest.raises(Exception):
+            client.sparse_many([f"slow {i}"], 1)
+    assert client.stats()["in_flight"] == 0
+    # Late replies for forgotten ids are dropped; the connection keeps working
+    time.sleep(0.5)
+    client.timeout = 5
+    assert client.sparse_many(["after"], 1) == [["AFTER"]]
+
+
+def test_unreachable_server_fails_fast(tmp_path):
+    client = rs.RetrievalClient(str(tmp_path / "missing.sock"), timeout=5)
+    with pytest.raises(rs.RetrievalServerError, match="cannot reach"):
+        client.server_stats()